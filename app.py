@@ -1,45 +1,321 @@
 import os
+import re
 import logging
 import json
 import uuid
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, send_file
+import time
+import hmac
+import hashlib
+import threading
+from datetime import datetime, timezone
+from flask import Flask, Response, render_template, request, jsonify, flash, redirect, url_for, send_file, stream_with_context
+from werkzeug.http import is_resource_modified
 from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.routing import BaseConverter
 from werkzeug.utils import secure_filename
-import zipfile
-import tempfile
-import shutil
-from file_processor import FileProcessor
+from archives import reader_for
+from downloads import artifact_name, build_downloads, load_manifest
+from session_diff import SessionDiff
+from workspace import WorkspaceManager, default_root as default_scratch_root
+from scheduler import JobScheduler
+from search_index import SearchIndex
+from logging_setup import configure_logging
+from database import db
 
-logging.basicConfig(level=logging.DEBUG)
+# Records below LOG_LEVEL are dropped at the call; the rest are written by a
+# background thread
+configure_logging(os.environ.get('LOG_LEVEL', 'INFO'))
 
 # create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# One reverse proxy in front: remote_addr is the client address it forwards
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
+
+# Session IDs are UUIDs in canonical form. Result files are named after them,
+# so anything else (such as "<id>.revisions") could name another session file
+SESSION_ID_PATTERN = r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+
+class SessionIdConverter(BaseConverter):
+    """Match only session IDs in URLs; other values get a 404"""
+    regex = SESSION_ID_PATTERN
+
+app.url_map.converters['session'] = SessionIdConverter
+
+def is_session_id(value):
+    return re.fullmatch(SESSION_ID_PATTERN, value) is not None
 
 # File upload configuration
 app.config['MAX_CONTENT_LENGTH'] = 100 * 1024 * 1024  # 100MB max file size
 app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['TEMP_FOLDER'] = 'temp'
 app.config['RESULTS_FOLDER'] = 'results'
+app.config['INDEX_FOLDER'] = os.environ.get('INDEX_FOLDER', 'index')
+app.config['SIMILARITY_DB'] = os.environ.get(
+    'SIMILARITY_DB', os.path.join(app.config['INDEX_FOLDER'], 'similarity.db'))
+
+# Uploads with the same content as an earlier one reuse its results
+app.config['REUSE_IDENTICAL_UPLOADS'] = os.environ.get('REUSE_IDENTICAL_UPLOADS', '1') != '0'
+
+# Job planning: jobs estimated above PLAN_BULK_COST_SECONDS of CPU time run
+# in the bulk lane
+app.config['PLAN_BULK_COST_SECONDS'] = float(os.environ.get('PLAN_BULK_COST_SECONDS', 30))
+
+# Job scheduling: worker threads, the most of them one client may hold at
+# once, and each lane's relative share of the workers
+app.config['SCHEDULER_WORKERS'] = int(os.environ.get('SCHEDULER_WORKERS', 4))
+app.config['CLIENT_TASK_LIMIT'] = int(os.environ.get('CLIENT_TASK_LIMIT', 2))
+# Clients are told apart by address. With CLIENT_ID_SECRET set, a trusted
+# proxy or gateway may name the client with X-Client-Id instead, signed in
+# X-Client-Signature as the hex HMAC-SHA256 of the id under the secret
+app.config['CLIENT_ID_SECRET'] = os.environ.get('CLIENT_ID_SECRET')
+app.config['LANE_WEIGHTS'] = {'interactive': 4, 'bulk': 1}
+
+# Results API pagination
+app.config['RESULTS_PAGE_SIZE'] = 50
+app.config['RESULTS_PAGE_LIMIT'] = 500
+
+# Session diffs: files per page of the diff view, and tokens shown per change
+# in the views (the diff download is always complete)
+app.config['DIFF_PAGE_SIZE'] = 20
+app.config['DIFF_VIEW_MAX_TOKENS'] = 500
+
+# Database: SQLite locally, Postgres through DATABASE_URL. Files are stored
+# DB_BATCH_SIZE rows per transaction
+database_url = os.environ.get('DATABASE_URL', 'sqlite:///tokenizer.db')
+if database_url.startswith('postgres://'):
+    # SQLAlchemy only accepts the postgresql:// scheme
+    database_url = 'postgresql://' + database_url[len('postgres://'):]
+app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_recycle': 300, 'pool_pre_ping': True}
+if database_url.startswith('sqlite'):
+    # Jobs finishing together wait for SQLite's write lock instead of failing
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {'timeout': 30}
+app.config['DB_BATCH_SIZE'] = int(os.environ.get('DB_BATCH_SIZE', 500))
+
+# Nested archives are opened this many levels deep, and an upload may expand
+# to this many bytes in total
+app.config['MAX_ARCHIVE_DEPTH'] = int(os.environ.get('MAX_ARCHIVE_DEPTH', 3))
+app.config['MAX_ARCHIVE_BYTES'] = int(os.environ.get('MAX_ARCHIVE_BYTES', 1024 * 1024 * 1024))
+
+# Scratch space for repository clones: tmpfs when one with room is mounted,
+# else TEMP_FOLDER. Quotas are in bytes; the total defaults to half the free space
+app.config['SCRATCH_ROOT'] = os.environ.get('SCRATCH_ROOT') or default_scratch_root(fallback=app.config['TEMP_FOLDER'])
+app.config['SCRATCH_JOB_BYTES'] = int(os.environ.get('SCRATCH_JOB_BYTES', 2 * 1024 * 1024 * 1024))
+app.config['SCRATCH_TOTAL_BYTES'] = int(os.environ['SCRATCH_TOTAL_BYTES']) if os.environ.get('SCRATCH_TOTAL_BYTES') else None
+app.config['SCRATCH_WAIT_SECONDS'] = float(os.environ.get('SCRATCH_WAIT_SECONDS', 60))
+
+# Most revisions one multi-revision job may tokenize
+app.config['MAX_REVISIONS'] = int(os.environ.get('MAX_REVISIONS', 50))
+
+# Where repositories may be cloned from, comma-separated. None keeps the
+# FileProcessor defaults, GitHub over HTTP(S); the load test adds a local git
+# daemon (git://127.0.0.1) or file://
+app.config['GIT_ALLOWED_HOSTS'] = os.environ['GIT_ALLOWED_HOSTS'].split(',') if os.environ.get('GIT_ALLOWED_HOSTS') else None
+app.config['GIT_ALLOWED_SCHEMES'] = os.environ['GIT_ALLOWED_SCHEMES'].split(',') if os.environ.get('GIT_ALLOWED_SCHEMES') else None
+
+# Cache lifetimes in seconds. Downloads never change once built; the results
+# page is revalidated after RESULTS_PAGE_MAX_AGE since a deploy may change it
+app.config['DOWNLOAD_MAX_AGE'] = int(os.environ.get('DOWNLOAD_MAX_AGE', 365 * 24 * 3600))
+app.config['RESULTS_PAGE_MAX_AGE'] = int(os.environ.get('RESULTS_PAGE_MAX_AGE', 24 * 3600))
+
+if db is not None:
+    db.init_app(app)
+
+    with app.app_context():
+        import models
+        db.create_all()
+
+    def dispose_engine_after_fork():
+        # A forked worker must not share the parent's pooled connections
+        with app.app_context():
+            db.engine.dispose(close=False)
+
+    os.register_at_fork(after_in_child=dispose_engine_after_fork)
+else:
+    logging.warning("Flask-SQLAlchemy is not installed; results are not stored in the database")
+    models = None
 
 # Ensure directories exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 os.makedirs(app.config['TEMP_FOLDER'], exist_ok=True)
 os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
 
-# Initialize file processor
-file_processor = FileProcessor()
+# Scratch directories left by crashed workers are removed in the background
+workspaces = WorkspaceManager(
+    root=app.config['SCRATCH_ROOT'],
+    job_quota=app.config['SCRATCH_JOB_BYTES'],
+    total_quota=app.config['SCRATCH_TOTAL_BYTES'],
+    wait_seconds=app.config['SCRATCH_WAIT_SECONDS']
+)
+
+# Shared scheduler for processing jobs; its workers start with the first job
+scheduler = JobScheduler(
+    workers=app.config['SCHEDULER_WORKERS'],
+    client_task_limit=app.config['CLIENT_TASK_LIMIT'],
+    lane_weights=app.config['LANE_WEIGHTS']
+)
+
+# Token search index over every processed upload
+search_index = SearchIndex(app.config['INDEX_FOLDER'])
+
+# The processing stack (tokenizers, archive planning, NumPy for near-duplicate
+# detection) is imported when the first job needs it, so serving results
+# doesn't wait on it. warm_up() loads it ahead of time: at import with
+# PRELOAD_PROCESSING=1, or in gunicorn's master before workers are forked
+_processing_lock = threading.Lock()
+_file_processor = None
+_similarity_index = None
+
+def get_file_processor():
+    """The shared FileProcessor, created on first use"""
+    global _file_processor
+    with _processing_lock:
+        if _file_processor is None:
+            from file_processor import FileProcessor
+            options = {}
+            if app.config['GIT_ALLOWED_HOSTS'] is not None:
+                options['git_hosts'] = [host.strip() for host in app.config['GIT_ALLOWED_HOSTS'] if host.strip()]
+            if app.config['GIT_ALLOWED_SCHEMES'] is not None:
+                options['git_schemes'] = [scheme.strip() for scheme in app.config['GIT_ALLOWED_SCHEMES'] if scheme.strip()]
+            _file_processor = FileProcessor(
+                bulk_cost_seconds=app.config['PLAN_BULK_COST_SECONDS'],
+                max_archive_depth=app.config['MAX_ARCHIVE_DEPTH'],
+                max_archive_bytes=app.config['MAX_ARCHIVE_BYTES'],
+                workspaces=workspaces,
+                **options
+            )
+        return _file_processor
+
+def get_similarity_index():
+    """The near-duplicate index across uploads, opened on first use"""
+    global _similarity_index
+    with _processing_lock:
+        if _similarity_index is None:
+            from similarity import SimilarityIndex, numpy_available
+            _similarity_index = SimilarityIndex(app.config['SIMILARITY_DB'])
+            if not numpy_available():
+                logging.warning("NumPy is not installed; only exact duplicate uploads are detected")
+        return _similarity_index
+
+def warm_up():
+    """Import the processing stack and build and run every tokenizer once"""
+    get_file_processor()
+    get_similarity_index()
+    import tokenizers
+    tokenizers.warm_up()
+
+if os.environ.get('PRELOAD_PROCESSING') == '1':
+    warm_up()
 
 # In-memory storage for current session results
 session_results = {}
 
+# Per-file fields that are too heavy for the results index; they stay in the
+# full results JSON used by the downloads
+HEAVY_FILE_FIELDS = ('tokens', 'full_token_string')
+
+# Non-code sections of tokenized_files, indexed alongside the code languages
+FILE_SECTIONS = ('image_files', 'document_files', 'config_files', 'other_files')
+
+def client_id_for_request():
+    """Identify the client a job is queued for, for per-client fairness"""
+    client_id = request.headers.get('X-Client-Id')
+    secret = app.config['CLIENT_ID_SECRET']
+    if client_id and secret:
+        expected = hmac.new(secret.encode('utf-8'), client_id.encode('latin-1'), hashlib.sha256).hexdigest()
+        # Header values are decoded as latin-1, so encoding them back can't fail
+        signature = request.headers.get('X-Client-Signature', '').encode('latin-1')
+        if hmac.compare_digest(expected.encode('ascii'), signature):
+            return f"id:{client_id}"
+    return request.remote_addr or 'anonymous'
+
+def submit_job(session_id, work, source_type, source_name, upload_path=None):
+    """Queue a processing job; its results are saved when it finishes"""
+    def on_done(job):
+        if upload_path:
+            # Clean up uploaded file
+            try:
+                os.remove(upload_path)
+            except OSError:
+                pass
+        
+        if job.cancel_requested:
+            return
+        
+        results = job.result
+        results['session_id'] = session_id
+        results['source_type'] = source_type
+        results['source_name'] = source_name
+        results['processed_at'] = datetime.now().isoformat()
+        results['processing_seconds'] = round(time.monotonic() - job.started_at, 3)
+        if results['success']:
+            results['similarity'] = report_similarity(session_id, source_name, job.work)
+        
+        # Save results
+        session_results[session_id] = results
+        save_results_to_file(session_id, results)
+        save_results_to_db(session_id, results)
+        if results['success']:
+            add_to_search_index(session_id, source_name, job.work.postings)
+            prebuild_downloads(session_id, results)
+    
+    return scheduler.submit(session_id, client_id_for_request(), work, on_done=on_done)
+
 def save_results_to_file(session_id, results):
     """Save processing results to a JSON file"""
     results_file = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.json")
     with open(results_file, 'w') as f:
         json.dump(results, f, indent=2, default=str)
+    save_results_index(session_id, results)
+
+def save_results_to_db(session_id, results):
+    """Store results in the database, if one is configured"""
+    if models is None:
+        return
+    try:
+        # Runs on a scheduler thread, outside any request
+        with app.app_context():
+            stored = models.store_results(results, batch_size=app.config['DB_BATCH_SIZE'])
+        logging.info(f"Stored {stored} files for session {session_id} in the database")
+    except Exception as e:
+        logging.error(f"Error saving results for session {session_id} to the database: {str(e)}")
+
+def find_prior_results(fingerprint):
+    """Saved results of the latest successful upload with this content fingerprint"""
+    if not app.config['REUSE_IDENTICAL_UPLOADS']:
+        return None
+    for prior_session_id in get_similarity_index().sessions_with_fingerprint(fingerprint):
+        results = load_results_from_file(prior_session_id)
+        if results and results.get('success'):
+            return results
+    return None
+
+def report_similarity(session_id, source_name, work):
+    """Find the nearest prior uploads and near-duplicate files, then index this upload"""
+    try:
+        fingerprint = work.plan.get('fingerprint') if work.plan else None
+        return get_similarity_index().add_upload(session_id, source_name, fingerprint, work.signatures)
+    except Exception as e:
+        logging.error(f"Error computing similarity for session {session_id}: {str(e)}")
+        return None
+
+def add_to_search_index(session_id, source_name, postings):
+    """Commit a job's token postings to the search index"""
+    try:
+        search_index.add_segment(session_id, source_name, postings)
+    except Exception as e:
+        logging.error(f"Error indexing session {session_id} for search: {str(e)}")
+
+def prebuild_downloads(session_id, results):
+    """Write a session's download files now, so downloading them is a plain file send"""
+    try:
+        build_downloads(downloads_dir(session_id), results)
+    except Exception as e:
+        logging.error(f"Error building downloads for session {session_id}: {str(e)}")
+
+def downloads_dir(session_id):
+    return os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.downloads")
 
 def load_results_from_file(session_id):
     """Load processing results from a JSON file"""
@@ -49,6 +325,146 @@ def load_results_from_file(session_id):
             return json.load(f)
     return None
 
+def save_results_index(session_id, results):
+    """Write the lightweight index that backs the results page and API
+
+    ``<session>.files.jsonl`` holds one record per file without the token
+    payload; ``<session>.index.json`` holds the summary plus, for each
+    language or section, the byte offset of each of its records so a page
+    of files can be read with a seek instead of parsing the full results.
+    ``<session>.tokens.jsonl`` holds each code file's token list, at the
+    offset in its record.
+    """
+    tokenized_files = results.get('tokenized_files') or {}
+    groups = [(language, 'code', files)
+              for language, files in (tokenized_files.get('code_files') or {}).items()]
+    groups += [(section, section, tokenized_files.get(section) or []) for section in FILE_SECTIONS]
+
+    index_groups = {}
+    files_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.files.jsonl")
+    tokens_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.tokens.jsonl")
+    with open(files_path, 'wb') as f, open(tokens_path, 'wb') as tokens_file:
+        for name, kind, files in groups:
+            offsets = []
+            for file_info in files:
+                offsets.append(f.tell())
+                record = {key: value for key, value in file_info.items() if key not in HEAVY_FILE_FIELDS}
+                if 'tokens' in file_info:
+                    # Token lists are stored apart so a diff reads only the changed files'
+                    record['tokens_offset'] = tokens_file.tell()
+                    if 'digest' not in file_info:
+                        from file_processor import token_digest
+                        record['digest'] = token_digest(file_info['tokens'])
+                    tokens_file.write(json.dumps(file_info['tokens']).encode('utf-8') + b'\n')
+                f.write(json.dumps(record, default=str).encode('utf-8') + b'\n')
+            index_groups[name] = {
+                'kind': kind,
+                'count': len(files),
+                'total_tokens': sum(file_info.get('total_tokens', 0) for file_info in files),
+                'offsets': offsets
+            }
+
+    index = {
+        'session_id': session_id,
+        'success': results.get('success', False),
+        'error': results.get('error'),
+        'source_type': results.get('source_type'),
+        'source_name': results.get('source_name'),
+        'processed_at': results.get('processed_at'),
+        'processing_seconds': results.get('processing_seconds'),
+        'plan': results.get('plan'),
+        'reused_from': results.get('reused_from'),
+        'similarity': results.get('similarity'),
+        'revisions': [summarize_revision_entry(entry) for entry in results.get('revisions') or []],
+        'groups': index_groups
+    }
+    if results.get('revisions'):
+        # Per-revision file lists and deltas are only read by the revisions API
+        revisions_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.revisions.json")
+        with open(revisions_path, 'w') as f:
+            json.dump(results['revisions'], f, default=str)
+    index_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.index.json")
+    data = json.dumps(index, default=str).encode('utf-8')
+    with open(index_path, 'wb') as f:
+        f.write(data)
+    # The results page's ETag: results never change once saved, so it is computed once here
+    with open(os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.etag"), 'w') as f:
+        f.write(hashlib.sha256(data).hexdigest())
+    return index
+
+def summarize_revision_entry(entry):
+    """A revision's summary with counts in place of its delta's file lists"""
+    delta = entry.get('delta')
+    return {
+        'revision': entry['revision'],
+        'commit': entry['commit'],
+        'summary': entry['summary'],
+        'changes': {
+            'added': len(delta['added']),
+            'removed': len(delta['removed']),
+            'modified': len(delta['modified']),
+            'unchanged': delta['unchanged'],
+            'token_delta': delta['token_delta']
+        } if delta else None
+    }
+
+def load_results_index(session_id):
+    """Load the results index, building it for results saved before indexing"""
+    index_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.index.json")
+    if os.path.exists(index_path):
+        with open(index_path, 'r') as f:
+            return json.load(f)
+
+    results = session_results.get(session_id) or load_results_from_file(session_id)
+    if not results:
+        return None
+    return save_results_index(session_id, results)
+
+def results_validators(session_id):
+    """The (digest, modification time) of a session's saved results, or None if there are none"""
+    index_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.index.json")
+    etag_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.etag")
+    try:
+        with open(etag_path, 'r') as f:
+            digest = f.read().strip()
+        modified = os.path.getmtime(index_path)
+    except OSError:
+        # Saved before digests were recorded, or not indexed yet
+        if not load_results_index(session_id):
+            return None
+        with open(index_path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        with open(etag_path, 'w') as f:
+            f.write(digest)
+        modified = os.path.getmtime(index_path)
+    return digest, datetime.fromtimestamp(int(modified), timezone.utc)
+
+def template_digest(name):
+    with open(os.path.join(app.root_path, app.template_folder, name), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+# Part of the results page's ETag, so a changed template isn't served from cache
+RESULTS_TEMPLATE_DIGEST = template_digest('results.html')
+DIFF_TEMPLATE_DIGEST = template_digest('diff.html')
+
+def cache_response(response, etag, last_modified):
+    """Mark a response derived from saved results as cacheable until RESULTS_PAGE_MAX_AGE"""
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = app.config['RESULTS_PAGE_MAX_AGE']
+    return response
+
+def read_indexed_files(session_id, offsets):
+    """Read the per-file records at the given byte offsets"""
+    files_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.files.jsonl")
+    files = []
+    with open(files_path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            files.append(json.loads(f.readline()))
+    return files
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -66,46 +482,38 @@ def upload_file():
                 flash('No file selected', 'error')
                 return redirect(url_for('index'))
             
-            if file and file.filename and file.filename.lower().endswith('.zip'):
-                filename = secure_filename(file.filename)
+            filename = secure_filename(file.filename)
+            if reader_for(filename) is not None:
                 file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}_{filename}")
                 file.save(file_path)
                 
-                # Process the ZIP file
-                results = file_processor.process_zip_file(file_path)
-                results['session_id'] = session_id
-                results['source_type'] = 'zip'
-                results['source_name'] = filename
-                results['processed_at'] = datetime.now().isoformat()
-                
-                # Save results
-                session_results[session_id] = results
-                save_results_to_file(session_id, results)
+                # Queue the archive; the uploaded file is removed when the job finishes
+                source_type = 'zip' if filename.lower().endswith('.zip') else 'archive'
+                submit_job(session_id, get_file_processor().archive_job(file_path, find_prior_results), source_type, filename,
+                           upload_path=file_path)
                 
-                # Clean up uploaded file
-                os.remove(file_path)
-                
-                return redirect(url_for('show_results', session_id=session_id))
+                return redirect(url_for('show_job', session_id=session_id))
             else:
-                flash('Please upload a ZIP file', 'error')
+                flash('Please upload a ZIP, tar or compressed tar archive', 'error')
                 return redirect(url_for('index'))
                 
         elif 'github_url' in request.form and request.form['github_url'].strip():
             # Handle GitHub URL
             github_url = request.form['github_url'].strip()
+            revisions = request.form.get('revisions', '').replace(',', ' ').split()
             
-            # Process the GitHub repository
-            results = file_processor.process_github_repo(github_url)
-            results['session_id'] = session_id
-            results['source_type'] = 'github'
-            results['source_name'] = github_url
-            results['processed_at'] = datetime.now().isoformat()
+            if len(revisions) > app.config['MAX_REVISIONS']:
+                flash(f"At most {app.config['MAX_REVISIONS']} revisions can be processed at once", 'error')
+                return redirect(url_for('index'))
             
-            # Save results
-            session_results[session_id] = results
-            save_results_to_file(session_id, results)
+            # Queue the GitHub repository, at each listed revision if any
+            if revisions:
+                work = get_file_processor().revisions_job(github_url, revisions)
+            else:
+                work = get_file_processor().github_job(github_url, find_prior_results)
+            submit_job(session_id, work, 'github', github_url)
             
-            return redirect(url_for('show_results', session_id=session_id))
+            return redirect(url_for('show_job', session_id=session_id))
         else:
             flash('Please provide either a ZIP file or GitHub URL', 'error')
             return redirect(url_for('index'))
@@ -115,117 +523,379 @@ def upload_file():
         flash(f'Error processing file: {str(e)}', 'error')
         return redirect(url_for('index'))
 
-@app.route('/results/<session_id>')
+def job_status(session_id):
+    """Status of a processing job, or None if it is unknown"""
+    job = scheduler.get(session_id)
+    if job is not None:
+        return job.status()
+    
+    # Jobs run by another process or pruned from the scheduler are done once
+    # their results are saved
+    if os.path.exists(os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.json")):
+        return {'job_id': session_id, 'state': 'done'}
+    return None
+
+@app.route('/jobs/<session:session_id>')
+def show_job(session_id):
+    """Display the progress of a queued or running job"""
+    status = job_status(session_id)
+    
+    if not status:
+        flash('Job not found or expired', 'error')
+        return redirect(url_for('index'))
+    
+    if status['state'] == 'done':
+        return redirect(url_for('show_results', session_id=session_id))
+    
+    return render_template('job.html', session_id=session_id, status=status)
+
+@app.route('/api/jobs/<session:session_id>')
+def api_job_status(session_id):
+    """Return the state and progress of a job"""
+    status = job_status(session_id)
+    if not status:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(status)
+
+@app.route('/api/jobs/<session:session_id>/cancel', methods=['POST'])
+def api_cancel_job(session_id):
+    """Cancel a queued or running job"""
+    if not scheduler.cancel(session_id):
+        return jsonify({'error': 'Job not found or already finished'}), 404
+    return jsonify({'job_id': session_id, 'cancelled': True})
+
+@app.route('/api/scheduler/stats')
+def api_scheduler_stats():
+    """Queue depth and wait-time percentiles per lane, and scratch space use"""
+    return jsonify(dict(scheduler.stats(), scratch=workspaces.stats()))
+
+@app.route('/results/<session:session_id>')
 def show_results(session_id):
     """Display processing results"""
-    # Try to get results from memory first, then from file
-    results = session_results.get(session_id)
-    if not results:
-        results = load_results_from_file(session_id)
+    validators = results_validators(session_id)
+    if not validators:
+        flash('Results not found or expired', 'error')
+        return redirect(url_for('index'))
     
-    if not results:
+    digest, last_modified = validators
+    etag = hashlib.sha256(f"{digest}:{RESULTS_TEMPLATE_DIGEST}".encode('utf-8')).hexdigest()
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        # The page only needs the summary; file cards are fetched per section
+        response = app.make_response(render_template('results.html', index=load_results_index(session_id)))
+    else:
+        response = app.response_class(status=304)
+    return cache_response(response, etag, last_modified)
+
+@app.route('/api/results/<session:session_id>/similarity')
+def api_result_similarity(session_id):
+    """Return the nearest prior uploads and near-duplicate files of a session"""
+    index = load_results_index(session_id)
+    if not index:
+        return jsonify({'error': 'Results not found'}), 404
+    return jsonify({
+        'session_id': session_id,
+        'reused_from': index.get('reused_from'),
+        'similarity': index.get('similarity')
+    })
+
+@app.route('/api/results/<session:session_id>/revisions')
+def api_result_revisions(session_id):
+    """Return each revision's summary and its delta against the revision before
+
+    With ``?files=<position>`` the full compact file list of that revision is
+    included as well.
+    """
+    revisions_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.revisions.json")
+    if not os.path.exists(revisions_path):
+        return jsonify({'error': 'Revision results not found'}), 404
+    with open(revisions_path, 'r') as f:
+        revisions = json.load(f)
+
+    response = {
+        'session_id': session_id,
+        'revisions': [{key: value for key, value in entry.items() if key != 'files'} for entry in revisions]
+    }
+    position = request.args.get('files', type=int)
+    if position is not None:
+        if not 0 <= position < len(revisions):
+            return jsonify({'error': f"No revision at position {position}"}), 404
+        from file_processor import revision_files
+        response['files'] = revision_files(revisions, position)
+    return jsonify(response)
+
+@app.route('/api/results/<session:session_id>/files')
+def api_result_files(session_id):
+    """Return one page of file records for a language or file section"""
+    index = load_results_index(session_id)
+    if not index:
+        return jsonify({'error': 'Results not found'}), 404
+
+    group_name = request.args.get('lang', '')
+    group = index['groups'].get(group_name)
+    if group is None:
+        return jsonify({'error': f"Unknown language or section: {group_name}"}), 404
+
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', app.config['RESULTS_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['RESULTS_PAGE_LIMIT'])
+
+    files = read_indexed_files(session_id, group['offsets'][offset:offset + limit])
+    return jsonify({
+        'session_id': session_id,
+        'lang': group_name,
+        'kind': group['kind'],
+        'offset': offset,
+        'limit': limit,
+        'total': group['count'],
+        'files': files
+    })
+
+def load_code_records(session_id):
+    """{path: record} for a session's code files, or None if it has no saved results"""
+    tokens_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.tokens.jsonl")
+    index = load_results_index(session_id)
+    if index and not os.path.exists(tokens_path):
+        # Indexed before token lists were stored apart
+        results = session_results.get(session_id) or load_results_from_file(session_id)
+        index = save_results_index(session_id, results) if results else None
+    if not index:
+        return None
+
+    offsets = [offset for group in index['groups'].values() if group['kind'] == 'code' for offset in group['offsets']]
+    return {record['path']: record for record in read_indexed_files(session_id, offsets)}
+
+def token_loader(session_id):
+    """Read a code file record's token list from the session's token store"""
+    tokens_path = os.path.join(app.config['RESULTS_FOLDER'], f"{session_id}.tokens.jsonl")
+    def load(record):
+        with open(tokens_path, 'rb') as f:
+            f.seek(record['tokens_offset'])
+            return json.loads(f.readline())
+    return load
+
+def open_diff(before_id, after_id, *variant):
+    """The diff between two sessions with its ETag and Last-Modified, or None if either is missing
+
+    Both sessions' results are immutable, so the ETag is derived from their
+    digests and ``variant``, whatever else selects the response.
+    """
+    validators = [results_validators(before_id), results_validators(after_id)]
+    if None in validators:
+        return None
+    key = ':'.join([digest for digest, modified in validators] + [str(part) for part in variant])
+    etag = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    last_modified = max(modified for digest, modified in validators)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None, etag, last_modified
+
+    diff = SessionDiff(load_code_records(before_id) or {}, load_code_records(after_id) or {},
+                       token_loader(before_id), token_loader(after_id))
+    return diff, etag, last_modified
+
+@app.route('/diff')
+def compare_sessions():
+    """Open the diff view for the session IDs given in the compare form"""
+    # A pasted results URL works as well as a bare session ID
+    before_id = request.args.get('before', '').strip().rstrip('/').rsplit('/', 1)[-1]
+    after_id = request.args.get('after', '').strip().rstrip('/').rsplit('/', 1)[-1]
+    if not before_id or not after_id:
+        flash('Enter two session IDs to compare', 'error')
+        return redirect(url_for('index'))
+    if not is_session_id(before_id) or not is_session_id(after_id):
+        flash('Enter the session IDs shown on two results pages', 'error')
+        return redirect(url_for('index'))
+    return redirect(url_for('show_diff', before_id=before_id, after_id=after_id))
+
+@app.route('/diff/<session:before_id>/<session:after_id>')
+def show_diff(before_id, after_id):
+    """Show one page of the token-level changes between two sessions"""
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    opened = open_diff(before_id, after_id, offset, DIFF_TEMPLATE_DIGEST)
+    if opened is None:
         flash('Results not found or expired', 'error')
         return redirect(url_for('index'))
+    diff, etag, last_modified = opened
+    if diff is None:
+        return cache_response(app.response_class(status=304), etag, last_modified)
+
+    limit = app.config['DIFF_PAGE_SIZE']
+    files = [diff.file_diff(entry, max_tokens=app.config['DIFF_VIEW_MAX_TOKENS'])
+             for entry in diff.entries[offset:offset + limit]]
+    page = render_template(
+        'diff.html',
+        before=load_results_index(before_id),
+        after=load_results_index(after_id),
+        summary=diff.summary(),
+        files=files,
+        offset=offset,
+        limit=limit,
+        total=len(diff.entries)
+    )
+    return cache_response(app.make_response(page), etag, last_modified)
+
+@app.route('/api/diff/<session:before_id>/<session:after_id>')
+def api_diff(before_id, after_id):
+    """Return the token-level changes between two sessions
+
+    Changed files are listed a page at a time with their hunks; each change
+    lists at most DIFF_VIEW_MAX_TOKENS tokens. With ``?path=<path>`` only
+    that file's diff is returned, in full.
+    """
+    path = request.args.get('path')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', app.config['RESULTS_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['RESULTS_PAGE_LIMIT'])
+
+    opened = open_diff(before_id, after_id, path, offset, limit)
+    if opened is None:
+        return jsonify({'error': 'Results not found'}), 404
+    diff, etag, last_modified = opened
+    if diff is None:
+        return cache_response(app.response_class(status=304), etag, last_modified)
+
+    response = {'before': before_id, 'after': after_id, 'summary': diff.summary()}
+    if path is not None:
+        entry = diff.find(path)
+        if entry is None:
+            return jsonify({'error': f"No changes to {path}"}), 404
+        response['file'] = diff.file_diff(entry)
+    else:
+        response.update({
+            'offset': offset,
+            'limit': limit,
+            'total': len(diff.entries),
+            'files': [diff.file_diff(entry, max_tokens=app.config['DIFF_VIEW_MAX_TOKENS'])
+                      for entry in diff.entries[offset:offset + limit]]
+        })
+    return cache_response(jsonify(response), etag, last_modified)
+
+@app.route('/download_diff/<session:before_id>/<session:after_id>')
+def download_diff(before_id, after_id):
+    """Stream the complete token diff between two sessions as text"""
+    opened = open_diff(before_id, after_id, 'text')
+    if opened is None:
+        flash('Results not found', 'error')
+        return redirect(url_for('index'))
+    diff, etag, last_modified = opened
+    if diff is None:
+        return cache_response(app.response_class(status=304), etag, last_modified)
+
+    before, after = load_results_index(before_id), load_results_index(after_id)
+    lines = diff.iter_text(f"{before.get('source_name')} ({before_id})", f"{after.get('source_name')} ({after_id})")
+    response = Response(stream_with_context(lines), mimetype='text/plain')
+    response.headers['Content-Disposition'] = f"attachment; filename=diff_{before_id[:8]}_{after_id[:8]}.txt"
+    return cache_response(response, etag, last_modified)
+
+@app.route('/api/history')
+def api_history():
+    """List processed sessions, most recent first"""
+    if models is None:
+        return jsonify({'error': 'Database is not configured'}), 503
+    
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', app.config['RESULTS_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['RESULTS_PAGE_LIMIT'])
+    
+    return jsonify({
+        'offset': offset,
+        'limit': limit,
+        'sessions': models.list_sessions(limit=limit, offset=offset)
+    })
+
+@app.route('/api/files')
+def api_files():
+    """Find stored files by source, language and session"""
+    if models is None:
+        return jsonify({'error': 'Database is not configured'}), 503
+    
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', app.config['RESULTS_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['RESULTS_PAGE_LIMIT'])
     
-    return render_template('results.html', results=results)
+    files = models.find_files(
+        source=request.args.get('source'),
+        language=request.args.get('language'),
+        session_id=request.args.get('session_id'),
+        limit=limit,
+        offset=offset
+    )
+    return jsonify({'offset': offset, 'limit': limit, 'files': files})
+
+@app.route('/search')
+def search():
+    """Find files containing every whitespace-separated token in q"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Missing query parameter q'}), 400
+    
+    limit = request.args.get('limit', app.config['RESULTS_PAGE_SIZE'], type=int)
+    limit = min(max(limit, 1), app.config['RESULTS_PAGE_LIMIT'])
+    
+    started = time.monotonic()
+    results = search_index.search(query, limit=limit)
+    results['query'] = query
+    results['took_ms'] = round((time.monotonic() - started) * 1000, 2)
+    return jsonify(results)
+
+def send_download(session_id, language, download_name):
+    """Send a prebuilt download, building the session's downloads first if needed
 
-@app.route('/download/<file_type>/<session_id>')
+    Downloads are sent with their content digest as a strong ETag and are
+    cacheable for DOWNLOAD_MAX_AGE. The gzipped copy is sent to clients
+    that accept gzip, except for range requests, which get the plain file.
+    """
+    directory = downloads_dir(session_id)
+    manifest = load_manifest(directory)
+    if manifest is None:
+        results = session_results.get(session_id) or load_results_from_file(session_id)
+        if not results:
+            return None
+        try:
+            manifest = build_downloads(directory, results)
+        except Exception as e:
+            logging.error(f"Error building downloads for session {session_id}: {str(e)}")
+            return None
+
+    name = artifact_name(language)
+    entry = manifest.get(name)
+    if entry is None:
+        return None
+
+    gzipped = request.accept_encodings['gzip'] > 0 and 'Range' not in request.headers
+    path = os.path.join(directory, name + ('.txt.gz' if gzipped else '.txt'))
+    response = send_file(
+        os.path.abspath(path),
+        as_attachment=True,
+        download_name=download_name,
+        mimetype='text/plain',
+        etag=entry['gzip_etag'] if gzipped else entry['etag'],
+        conditional=True,
+        max_age=app.config['DOWNLOAD_MAX_AGE']
+    )
+    if gzipped:
+        response.content_encoding = 'gzip'
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/download/<file_type>/<session:session_id>')
 def download_tokens(file_type, session_id):
     """Download tokenized content for a specific file type"""
-    # Get results
-    results = session_results.get(session_id)
-    if not results:
-        results = load_results_from_file(session_id)
-    
-    if not results or file_type not in results:
+    response = send_download(session_id, file_type, f"{file_type}_tokens.txt")
+    if response is None:
         flash('Results not found', 'error')
         return redirect(url_for('index'))
-    
-    # Create temporary file with tokenized content
-    temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False)
-    
-    try:
-        # Write header
-        temp_file.write(f"# Tokenized {file_type.upper()} Content\n")
-        temp_file.write(f"# Generated: {datetime.now().isoformat()}\n")
-        temp_file.write(f"# Source: {results.get('source_name', 'Unknown')}\n\n")
-        
-        # Write tokenized content for each file
-        for file_info in results[file_type]:
-            if 'full_token_string' in file_info:
-                temp_file.write(f"# File: {file_info['name']}\n")
-                temp_file.write(f"# Tokens: {file_info.get('total_tokens', 0)}\n")
-                temp_file.write(file_info['full_token_string'])
-                temp_file.write("\n\n" + "="*50 + "\n\n")
-        
-        temp_file.close()
-        
-        # Return file for download
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=f"{file_type}_tokens.txt",
-            mimetype='text/plain'
-        )
-        
-    except Exception as e:
-        logging.error(f"Download error: {str(e)}")
-        if os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
-        flash('Error creating download file', 'error')
-        return redirect(url_for('show_results', session_id=session_id))
+    return response
 
-@app.route('/download_all/<session_id>')
+@app.route('/download_all/<session:session_id>')
 def download_all_tokens(session_id):
     """Download all tokenized content as a single file"""
-    # Get results
-    results = session_results.get(session_id)
-    if not results:
-        results = load_results_from_file(session_id)
-    
-    if not results:
+    response = send_download(session_id, None, "all_tokens.txt")
+    if response is None:
         flash('Results not found', 'error')
         return redirect(url_for('index'))
-    
-    # Create temporary file with all tokenized content
-    temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False)
-    
-    try:
-        # Write header
-        temp_file.write(f"# All Tokenized Content\n")
-        temp_file.write(f"# Generated: {datetime.now().isoformat()}\n")
-        temp_file.write(f"# Source: {results.get('source_name', 'Unknown')}\n\n")
-        
-        # Write content for each file type
-        for file_type in ['python', 'javascript', 'java', 'html', 'css', 'other']:
-            if file_type in results and results[file_type]:
-                temp_file.write(f"\n{'='*60}\n")
-                temp_file.write(f"# {file_type.upper()} FILES\n")
-                temp_file.write(f"{'='*60}\n\n")
-                
-                for file_info in results[file_type]:
-                    if 'full_token_string' in file_info:
-                        temp_file.write(f"## File: {file_info['name']}\n")
-                        temp_file.write(f"## Tokens: {file_info.get('total_tokens', 0)}\n")
-                        temp_file.write(file_info['full_token_string'])
-                        temp_file.write("\n\n" + "-"*40 + "\n\n")
-        
-        temp_file.close()
-        
-        # Return file for download
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name=f"all_tokens.txt",
-            mimetype='text/plain'
-        )
-        
-    except Exception as e:
-        logging.error(f"Download all error: {str(e)}")
-        if os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
-        flash('Error creating download file', 'error')
-        return redirect(url_for('show_results', session_id=session_id))
+    return response
 
 @app.errorhandler(413)
 def too_large(e):
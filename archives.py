@@ -0,0 +1,207 @@
+import io
+import os
+import bz2
+import gzip
+import lzma
+import zlib
+import logging
+import posixpath
+import tarfile
+import zipfile
+from functools import partial
+from typing import BinaryIO, Callable, Iterator, List, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Archives inside archives are opened up to this many levels deep
+DEFAULT_MAX_DEPTH = 3
+
+# Uncompressed bytes an upload may expand to, nested archives included
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# Separates an inner archive's path from the path of a member inside it
+NESTED_SEPARATOR = '!/'
+
+# A reader takes an open archive and its name and yields (member name, size, open_member)
+# for each regular file, in archive order. Size is -1 when the format doesn't record it.
+# Members of streamed formats must be read before the next one is yielded.
+Member = Tuple[str, int, Callable[[], BinaryIO]]
+Reader = Callable[[BinaryIO, str], Iterator[Member]]
+
+_readers: List[Tuple[str, Reader]] = []
+
+# Readers that seek in their archive, as ZIP's does to its central directory
+_seeking_readers: List[Reader] = []
+
+# ZIP-format archives; planned and read from their central directory
+ZIP_SUFFIXES = ('.zip', '.jar', '.war')
+
+# Errors from a damaged or truncated archive at any level
+READ_ERRORS = (tarfile.TarError, zipfile.BadZipFile, OSError, EOFError, lzma.LZMAError, zlib.error)
+
+class ArchiveError(Exception):
+    """An archive that can't be read, or expands beyond the byte budget"""
+
+def register_reader(suffixes: Tuple[str, ...], reader: Reader, seeks: bool = False):
+    """Read files whose names end with any of ``suffixes`` with ``reader``
+
+    A reader that ``seeks`` is given nested archives buffered in memory.
+    """
+    _readers.extend((suffix, reader) for suffix in suffixes)
+    if seeks:
+        _seeking_readers.append(reader)
+    # Longest suffix first, so '.tar.gz' wins over '.gz'
+    _readers.sort(key=lambda entry: len(entry[0]), reverse=True)
+
+def reader_for(name: str) -> Optional[Reader]:
+    """The registered reader for an archive name, or None if it isn't an archive"""
+    lowered = name.lower()
+    for suffix, reader in _readers:
+        if lowered.endswith(suffix):
+            return reader
+    return None
+
+def supported_suffixes() -> List[str]:
+    return sorted({suffix for suffix, reader in _readers})
+
+def needs_seeking(reader: Reader) -> bool:
+    return reader in _seeking_readers
+
+def read_zip(fileobj: BinaryIO, name: str) -> Iterator[Member]:
+    if not (is_plain_file(fileobj) or isinstance(fileobj, io.BytesIO)):
+        # The central directory is at the end, and seeking back through a
+        # decompressing stream decompresses it again each time, outside the
+        # byte budget. ArchiveWalker buffers nested ZIPs first
+        raise ArchiveError(f"{name} must be read from disk or memory")
+    with zipfile.ZipFile(fileobj) as zip_ref:
+        for info in zip_ref.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size, partial(zip_ref.open, info)
+
+def read_tar(fileobj: BinaryIO, name: str, compression: str = '') -> Iterator[Member]:
+    # 'r|' reads the archive as a stream: no seeks, one pass, members in order
+    with tarfile.open(fileobj=fileobj, mode=f"r|{compression}") as tar:
+        for member in tar:
+            if member.isfile():
+                yield member.name, member.size, partial(tar.extractfile, member)
+
+def read_zstd_tar(fileobj: BinaryIO, name: str) -> Iterator[Member]:
+    with zstandard.ZstdDecompressor().stream_reader(fileobj, closefd=False) as stream:
+        yield from read_tar(stream, name)
+
+def read_compressed(fileobj: BinaryIO, name: str, opener: Callable[[BinaryIO], BinaryIO]) -> Iterator[Member]:
+    """A single compressed file, named after the archive without its suffix"""
+    yield posixpath.basename(clean_member_name(name)).rsplit('.', 1)[0], -1, partial(opener, fileobj)
+
+register_reader(ZIP_SUFFIXES, read_zip, seeks=True)
+register_reader(('.tar',), read_tar)
+register_reader(('.tar.gz', '.tgz'), partial(read_tar, compression='gz'))
+register_reader(('.tar.bz2', '.tbz2'), partial(read_tar, compression='bz2'))
+register_reader(('.tar.xz', '.txz'), partial(read_tar, compression='xz'))
+register_reader(('.gz',), partial(read_compressed, opener=lambda fileobj: gzip.GzipFile(fileobj=fileobj, mode='rb')))
+register_reader(('.bz2',), partial(read_compressed, opener=bz2.BZ2File))
+register_reader(('.xz',), partial(read_compressed, opener=lzma.LZMAFile))
+if zstandard is not None:
+    register_reader(('.tar.zst', '.tzst'), read_zstd_tar)
+
+class ArchiveWalker:
+    """Stream the files of an archive and of the archives nested in it
+
+    ``route`` maps a member path to a handler name, or None to skip the
+    member. Contents are read only for handlers in ``read_handlers``; other
+    members are reported with their size alone. Nested archives are opened
+    up to ``max_depth`` levels deep, and the walk fails once the members
+    seen add up to more than ``max_bytes`` uncompressed.
+    """
+
+    def __init__(self, route: Callable[[str], Optional[str]], read_handlers: Tuple[str, ...],
+                 max_depth: int = DEFAULT_MAX_DEPTH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.route = route
+        self.read_handlers = read_handlers
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self.bytes_seen = 0
+        self.nested_archives = 0
+
+    def walk(self, path: str) -> Iterator[Tuple[str, int, str, Optional[bytes]]]:
+        """Yield (member path, size, handler, content or None) for every routed member"""
+        reader = reader_for(path)
+        if reader is None:
+            raise ArchiveError(f"Unsupported archive type: {path}")
+        try:
+            with open(path, 'rb') as f:
+                yield from self._walk(reader, f, path, '', 0)
+        except READ_ERRORS as e:
+            raise ArchiveError(f"Could not read {os.path.basename(path)}: {str(e)}")
+
+    def _walk(self, reader: Reader, fileobj: BinaryIO, name: str, prefix: str,
+              depth: int) -> Iterator[Tuple[str, int, str, Optional[bytes]]]:
+        for member_name, size, open_member in reader(fileobj, name):
+            path = prefix + clean_member_name(member_name)
+            handler = self.route(path)
+            if handler is None:
+                continue
+
+            nested = reader_for(member_name) if depth < self.max_depth else None
+            if nested is not None:
+                try:
+                    with open_member() as member:
+                        if needs_seeking(nested):
+                            # Buffered within the byte budget, which also caps
+                            # a compressed member of unknown size
+                            member = io.BytesIO(self._read(member, size))
+                        else:
+                            self._charge(max(size, 0))
+                        yield from self._walk(nested, member, member_name, path + NESTED_SEPARATOR, depth + 1)
+                    self.nested_archives += 1
+                except READ_ERRORS as e:
+                    # A damaged inner archive is kept as a plain file instead of failing the upload
+                    logger.warning(f"Could not open nested archive {path}: {str(e)}")
+                    yield path, size, handler, None
+            elif handler in self.read_handlers:
+                try:
+                    with open_member() as member:
+                        content = self._read(member, size)
+                except (RuntimeError, NotImplementedError) as e:
+                    # Encrypted or unsupported ZIP entries
+                    logger.warning(f"Skipping unreadable member {path}: {str(e)}")
+                    continue
+                yield path, len(content), handler, content
+            else:
+                self._charge(max(size, 0))
+                yield path, size, handler, None
+
+    def _read(self, member: BinaryIO, size: int) -> bytes:
+        if size >= 0:
+            self._charge(size)
+            return member.read(size)
+        # Size unknown until decompressed: read no further than the budget allows
+        content = member.read(self.max_bytes - self.bytes_seen + 1)
+        self._charge(len(content))
+        return content
+
+    def _charge(self, size: int):
+        self.bytes_seen += size
+        if self.bytes_seen > self.max_bytes:
+            raise ArchiveError(f"Archive contents exceed the {self.max_bytes / (1024 * 1024):.1f} MB limit")
+
+def is_plain_file(fileobj: BinaryIO) -> bool:
+    """Whether ``fileobj`` reads a file on disk directly
+
+    Decompressors such as GzipFile report the fileno() of the file under
+    them, so the file object's type is checked instead.
+    """
+    raw = fileobj.raw if isinstance(fileobj, io.BufferedReader) else fileobj
+    return isinstance(raw, io.FileIO)
+
+def clean_member_name(name: str) -> str:
+    """Member name as a relative path: forward slashes, no leading './' or '/'"""
+    name = name.replace('\\', '/')
+    while name.startswith('./'):
+        name = name[2:]
+    return name.lstrip('/')
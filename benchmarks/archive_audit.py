@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Audit of archive planning and reading against crafted uploads.
+
+Builds small archives that look like one format from their bytes and
+another from their name, and checks that each is planned and read as the
+format its name says. Also checks that a ZIP inside a compressed file is
+charged to the byte budget as it is decompressed:
+
+    python benchmarks/archive_audit.py
+
+Exits non-zero if any check fails.
+"""
+
+import gzip
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archives import ArchiveError, ArchiveWalker
+from file_processor import FileProcessor
+from planner import plan_archive
+
+# Byte budget of the walks below, and what the bomb expands to
+BUDGET_BYTES = 8 * 1024 * 1024
+BOMB_BYTES = 64 * 1024 * 1024
+
+
+def write_zip(path, files):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for name, content in files.items():
+            zip_ref.writestr(name, content)
+
+
+def write_tar(path, files):
+    with tarfile.open(path, 'w') as tar:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content))
+
+
+def check_tar_ending_in_zip(directory, processor):
+    """A tar whose last member is a ZIP ends with the ZIP's central directory"""
+    inner = os.path.join(directory, 'inner.zip')
+    write_zip(inner, {'inner/app.py': b'print("inner")\n'})
+    with open(inner, 'rb') as f:
+        inner_bytes = f.read()
+    outer = os.path.join(directory, 'outer.tar')
+    write_tar(outer, {'outer/main.py': b'print("outer")\n', 'outer/inner.zip': inner_bytes})
+
+    inner_plan = plan_archive(inner, processor)
+    outer_plan = plan_archive(outer, processor)
+    paths = [entry['path'] for entry in outer_plan['manifest']]
+    return [
+        ('tar looks like a ZIP from its bytes', zipfile.is_zipfile(outer)),
+        ('tar is planned from its own members', 'outer/main.py' in paths),
+        ('tar plan leaves out the inner ZIP\'s entries', 'inner/app.py' not in paths),
+        ('tar and inner ZIP have different fingerprints', outer_plan['fingerprint'] != inner_plan['fingerprint']),
+    ]
+
+
+def walk(processor, path):
+    """Walk ``path`` under the budget; returns (member paths, bytes charged, error or None)"""
+    def route(member_path):
+        routed = processor.route_file(member_path)
+        return routed[0] if routed else None
+
+    walker = ArchiveWalker(route, ('code', 'config'), max_bytes=BUDGET_BYTES)
+    paths = []
+    try:
+        for member_path, size, handler, content in walker.walk(path):
+            paths.append(member_path)
+    except ArchiveError as e:
+        return paths, walker.bytes_seen, e
+    return paths, walker.bytes_seen, None
+
+
+def check_compressed_zip(directory, processor):
+    """A gzipped ZIP is read through a decompressor that can't seek cheaply"""
+    small = os.path.join(directory, 'small.zip')
+    write_zip(small, {'src/app.py': b'print("small")\n'})
+    with open(small, 'rb') as f, gzip.open(small + '.gz', 'wb') as out:
+        out.write(f.read())
+    paths, charged, error = walk(processor, small + '.gz')
+
+    # Stored, so the ZIP itself is large; its hidden member is skipped, so only
+    # decompressing the ZIP counts against the budget
+    bomb = os.path.join(directory, 'bomb.zip')
+    with zipfile.ZipFile(bomb, 'w', zipfile.ZIP_STORED) as zip_ref:
+        with zip_ref.open('.cache/zeros', 'w', force_zip64=True) as member:
+            for _ in range(BOMB_BYTES // (1024 * 1024)):
+                member.write(bytes(1024 * 1024))
+    with open(bomb, 'rb') as f, gzip.open(bomb + '.gz', 'wb') as out:
+        out.write(f.read())
+    bomb_paths, bomb_charged, bomb_error = walk(processor, bomb + '.gz')
+
+    return [
+        ('gzipped ZIP members are read', error is None and 'small.zip!/src/app.py' in paths),
+        ('gzipped ZIP is charged to the budget', charged > 0),
+        ('gzipped ZIP bomb is charged as it is decompressed', bomb_charged > BUDGET_BYTES),
+        ('gzipped ZIP bomb stops at the budget', isinstance(bomb_error, ArchiveError) and not bomb_paths),
+    ]
+
+
+def main():
+    processor = FileProcessor()
+    failures = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for check in (check_tar_ending_in_zip, check_compressed_zip):
+            print(check.__name__)
+            for description, ok in check(directory, processor):
+                print(f"  {'✓' if ok else '✗'} {description}")
+                failures += not ok
+    if failures:
+        print(f"{failures} check(s) failed")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for archive uploads.
+
+Packs a synthetic source tree (copies of this repository's Python and
+JavaScript files) as ZIP, tar.gz, tar.bz2 and tar.xz, then runs each through
+the job scheduler. For the ZIP it also times the previous approach of
+extracting to a temporary directory and processing the files from disk:
+
+    python benchmarks/bench_archives.py [--copies 40] [--workers 4]
+"""
+
+import argparse
+import glob
+import io
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_processor import FileProcessor
+from scheduler import JobScheduler
+from search_index import SegmentBuilder
+from similarity import SignatureSet, numpy_available
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def source_files(copies):
+    sources = sorted(glob.glob(os.path.join(ROOT, '*.py')) + glob.glob(os.path.join(ROOT, 'static', 'js', '*.js')))
+    contents = []
+    for path in sources:
+        with open(path, 'rb') as f:
+            contents.append((os.path.basename(path), f.read()))
+    for copy in range(copies):
+        for name, content in contents:
+            yield f"project/copy{copy}/{name}", content
+
+
+def build_archives(directory, copies):
+    files = list(source_files(copies))
+    paths = {}
+
+    paths['zip'] = os.path.join(directory, 'tree.zip')
+    with zipfile.ZipFile(paths['zip'], 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        for name, content in files:
+            zip_ref.writestr(name, content)
+
+    for suffix, mode in [('tar.gz', 'w:gz'), ('tar.bz2', 'w:bz2'), ('tar.xz', 'w:xz')]:
+        paths[suffix] = os.path.join(directory, f"tree.{suffix}")
+        with tarfile.open(paths[suffix], mode) as tar:
+            for name, content in files:
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+
+    return files, paths
+
+
+def run_scheduled(scheduler, job_id, work):
+    job = scheduler.submit(job_id, 'bench', work)
+    job.done.wait()
+    if not job.result['success']:
+        raise RuntimeError(job.result['error'])
+    return job.result
+
+
+def extract_and_process(processor, zip_path, workers):
+    """The previous ZIP path: extract everything, then tokenize from disk"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with zipfile.ZipFile(zip_path) as zip_ref:
+            zip_ref.extractall(temp_dir)
+        # Same work per file as a job: tokens, search postings and signatures
+        result = processor.new_result()
+        postings = SegmentBuilder()
+        signatures = SignatureSet() if numpy_available() else None
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda entry: processor.process_file(*entry, result, postings, signatures),
+                          processor.iter_directory(temp_dir)))
+        return result
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--copies', type=int, default=40, help='copies of the source tree to pack')
+    parser.add_argument('--workers', type=int, default=4, help='scheduler workers')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    processor = FileProcessor()
+    scheduler = JobScheduler(workers=args.workers, client_task_limit=args.workers)
+    scheduler.start()
+    try:
+        files, paths = build_archives(directory, args.copies)
+        total = sum(len(content) for name, content in files)
+        print(f"{len(files)} files, {total / 1024 / 1024:.1f} MB uncompressed, {args.workers} workers")
+
+        start = time.perf_counter()
+        extract_and_process(processor, paths['zip'], args.workers)
+        print(f"{'zip (extract to disk)':<24} {time.perf_counter() - start:7.2f}s")
+
+        for suffix, path in paths.items():
+            start = time.perf_counter()
+            result = run_scheduled(scheduler, suffix, processor.archive_job(path))
+            seconds = time.perf_counter() - start
+            code_files = sum(len(group) for group in result['tokenized_files']['code_files'].values())
+            print(f"{suffix + ' (streamed)':<24} {seconds:7.2f}s  {code_files} code files")
+    finally:
+        scheduler.shutdown()
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark for session diffs.
+
+Builds two synthetic sessions of --files code files, changes a few tokens
+in --changed of them, and times the complete text diff. For comparison it
+also times diffing every file's token list with difflib, which is what a
+diff without per-file digests or Myers' algorithm would do:
+
+    python benchmarks/bench_diff.py [--files 20000] [--changed 200] [--tokens 2000]
+"""
+
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_processor import token_digest
+from session_diff import SessionDiff
+
+VOCABULARY = ['def', 'return', 'if', 'else', '(', ')', ':', '=', '+', '.', ','] + [f"name{i}" for i in range(200)]
+
+
+def build_sessions(files, changed, tokens, seed=1):
+    rng = random.Random(seed)
+    before, after, store = {}, {}, {}
+    changed_paths = set(rng.sample(range(files), changed))
+    for number in range(files):
+        path = f"src/module{number // 100}/file{number}.py"
+        old = [rng.choice(VOCABULARY) for _ in range(tokens)]
+        new = list(old)
+        if number in changed_paths:
+            for _ in range(5):
+                position = rng.randrange(len(new))
+                new[position:position + 2] = [rng.choice(VOCABULARY)]
+        for side, session, token_list in (('before', before, old), ('after', after, new)):
+            store[(side, path)] = token_list
+            session[path] = {'path': path, 'language': 'Python', 'total_tokens': len(token_list),
+                             'digest': token_digest(token_list), 'side': side}
+    return before, after, store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=20000, help='code files per session')
+    parser.add_argument('--changed', type=int, default=200, help='files changed between the sessions')
+    parser.add_argument('--tokens', type=int, default=2000, help='tokens per file')
+    parser.add_argument('--baseline-files', type=int, default=500,
+                        help='files diffed with difflib; the total is extrapolated from them')
+    args = parser.parse_args()
+
+    before, after, store = build_sessions(args.files, args.changed, args.tokens)
+    load = lambda record: store[(record['side'], record['path'])]
+    print(f"{args.files} files of {args.tokens} tokens, {args.changed} changed")
+
+    start = time.perf_counter()
+    diff = SessionDiff(before, after, load, load)
+    size = sum(len(chunk) for chunk in diff.iter_text('before', 'after'))
+    seconds = time.perf_counter() - start
+    print(f"{'session diff':<28} {seconds:7.2f}s  {size / 1024:.0f} KB of diff")
+
+    paths = sorted(before)[:args.baseline_files]
+    start = time.perf_counter()
+    for path in paths:
+        list(difflib.unified_diff(store[('before', path)], store[('after', path)], lineterm=''))
+    seconds = (time.perf_counter() - start) * args.files / len(paths)
+    print(f"{'difflib, every file':<28} {seconds:7.2f}s  (extrapolated from {len(paths)} files)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the JavaScript lexer.
+
+Compares the state-machine JavaScriptTokenizer against the previous
+pattern-list lexer on synthetic minified bundles, or on bundles passed
+on the command line:
+
+    python benchmarks/bench_js_lexer.py [--size-mb 4] [bundle.js ...]
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizers import JavaScriptTokenizer
+
+# Pattern list used by JavaScriptTokenizer before the state-machine lexer
+LEGACY_PATTERNS = [
+    ('COMMENT', r'//.*?$|/\*.*?\*/'),
+    ('REGEX', r'/(?:[^/\\\n]|\\.)+/[gimuy]*'),
+    ('STRING', r'"([^"\\]|\\.)*"|\'([^\'\\]|\\.)*\'|`([^`\\]|\\.)*`'),
+    ('NUMBER', r'\b\d+\.?\d*([eE][+-]?\d+)?\b'),
+    ('KEYWORD', r'\b(async|await|break|case|catch|class|const|continue|debugger|default|delete|do|else|export|extends|finally|for|function|if|import|in|instanceof|let|new|return|super|switch|this|throw|try|typeof|var|void|while|with|yield)\b'),
+    ('BOOLEAN', r'\b(true|false)\b'),
+    ('NULL', r'\bnull\b'),
+    ('UNDEFINED', r'\bundefined\b'),
+    ('IDENTIFIER', r'\b[a-zA-Z_$]\w*\b'),
+    ('OPERATOR', r'[+\-*/%=<>!&|^~?:]+|===|!==|==|!=|<=|>=|&&|\|\||<<|>>|>>>|\+\+|--|\+=|-=|\*=|/=|%=|&=|\|=|\^=|<<=|>>=|>>>='),
+    ('DELIMITER', r'[(){}\[\];,.@]'),
+    ('WHITESPACE', r'\s+'),
+]
+
+
+def legacy_tokenize(content):
+    compiled = [(name, re.compile(pattern, re.MULTILINE | re.DOTALL))
+                for name, pattern in LEGACY_PATTERNS]
+    tokens = []
+    pos = 0
+    while pos < len(content):
+        for token_type, pattern in compiled:
+            match = pattern.match(content, pos)
+            if match:
+                if token_type != 'WHITESPACE' and match.group(0).strip():
+                    tokens.append(match.group(0))
+                pos = match.end()
+                break
+        else:
+            pos += 1
+    return tokens
+
+
+# Minified code the legacy lexer handles correctly, for a like-for-like comparison
+PLAIN_SNIPPET = (
+    'var e=function(t,n){return t*n-2},r=s.indexOf("ab")>-1;'
+    'function o(t){if(!t)return null;for(var n=0;n<t.length;n++)t[n]=t[n]*2+3;'
+    'return"item "+t.map(function(a){return a.id+":"+a.v}).join(",")}'
+    'const u={a:1,b:"two",c:\'three\',d:[1,2,3]},l=u.a&&u.b||0x1f;'
+    'exports.render=function(){return t.createElement("div",{className:"x"},"text")};'
+)
+
+# Division, regex literals and nested templates, which the legacy lexer mis-tokenizes
+AMBIGUOUS_SNIPPET = (
+    'var e=function(t,n){return t/n/2},r=/ab+c\\/d[/]x/gi.test(s);'
+    'function o(t){if(!t)return null;for(var n=0;n<t.length;n++)t[n]=t[n]*2/3;'
+    'return`item ${t.map(function(a){return`${a.id}:${a.v/2}`}).join(",")} done`}'
+    'const u={a:1,b:"two",c:\'three\',d:[1,2,3]},l=u.a?.b??0x1f;'
+    'exports.render=function(){return t.createElement("div",{className:"x"},"text")};'
+)
+
+
+def synthetic_bundle(snippet, size_bytes):
+    repeats = size_bytes // len(snippet) + 1
+    return (snippet * repeats)[:size_bytes]
+
+
+def measure(label, func, content):
+    start = time.perf_counter()
+    tokens = func(content)
+    elapsed = time.perf_counter() - start
+    throughput = len(content) / (1024 * 1024) / elapsed if elapsed else float('inf')
+    print(f"  {label:<14} {elapsed:8.3f}s  {throughput:7.2f} MB/s  {len(tokens):>9} tokens")
+    return elapsed, len(tokens)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('bundles', nargs='*', help='JavaScript files to lex instead of the synthetic bundle')
+    parser.add_argument('--size-mb', type=float, default=4.0, help='synthetic bundle size (default: 4)')
+    parser.add_argument('--skip-legacy', action='store_true', help='only time the current lexer')
+    args = parser.parse_args()
+
+    if args.bundles:
+        inputs = []
+        for path in args.bundles:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                inputs.append((path, f.read()))
+    else:
+        size = int(args.size_mb * 1024 * 1024)
+        inputs = [
+            (f"minified {args.size_mb:g} MB", synthetic_bundle(PLAIN_SNIPPET, size)),
+            (f"ambiguous {args.size_mb:g} MB", synthetic_bundle(AMBIGUOUS_SNIPPET, size)),
+        ]
+
+    tokenizer = JavaScriptTokenizer()
+    regressed = False
+
+    for label, content in inputs:
+        print(f"{label} ({len(content)} bytes)")
+        current, current_tokens = measure('state machine', lambda c: tokenizer.tokenize(c, label)['tokens'], content)
+        if not args.skip_legacy:
+            legacy, legacy_tokens = measure('legacy', legacy_tokenize, content)
+            print(f"  speedup        {legacy / current:8.2f}x")
+            # Only gate where both lexers roughly agree on the token stream;
+            # elsewhere the legacy lexer is fast because it swallows code as regex
+            if abs(current_tokens - legacy_tokens) <= 0.05 * legacy_tokens:
+                regressed = regressed or current > legacy
+            else:
+                print(f"  (token counts differ by {current_tokens - legacy_tokens:+d}; not gated)")
+
+    if regressed:
+        print("✗ state-machine lexer is slower than the legacy lexer")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Benchmark for app startup: import time and first-request latency.
+
+Each run starts a fresh interpreter in a scratch directory and, through
+Flask's test client, times importing the app, the first GET of the index
+page, the first archive upload from POST to a finished job, and a second
+upload. Three startup modes are compared:
+
+    lazy      the default: processing modules are imported by the first job
+    preload   PRELOAD_PROCESSING=1: imported and warmed up at startup
+    forked    a parent imports the app and calls warm_up(), then forks; the
+              child is timed, as a worker of gunicorn_preload.py would be
+
+    python benchmarks/bench_startup.py [--runs 5] [--files 40] [--modes lazy,preload,forked]
+
+Times are medians over --runs, in milliseconds.
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ('lazy', 'preload', 'forked')
+STEPS = ('import', 'index', 'first job', 'second job')
+
+# Seconds to wait for one job
+JOB_TIMEOUT = 120
+
+SOURCES = {
+    'py': "import os\n\ndef walk(path):\n    for name in os.listdir(path):\n        yield os.path.join(path, name)\n",
+    'js': "export function add(a, b) {\n  return a + b; // sum\n}\nconst x = `t ${add(1, 2)}`;\n",
+    'java': "public class Main {\n  public static void main(String[] args) { System.out.println(\"hi\"); }\n}\n",
+    'css': ".card { color: #fff; margin: 0 auto; }\n@media (max-width: 600px) { .card { margin: 0; } }\n",
+    'go': "package main\n\nimport \"fmt\"\n\nfunc main() { fmt.Println(\"hi\") }\n",
+    'rb': "class Greeter\n  def hi(name)\n    puts \"hi #{name}\"\n  end\nend\n"
+}
+
+
+def build_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        extensions = sorted(SOURCES)
+        for number in range(files):
+            extension = extensions[number % len(extensions)]
+            archive.writestr(f"bench/file{number}.{extension}", SOURCES[extension] * 20)
+    return buffer.getvalue()
+
+
+def run_job(client, content):
+    """Upload ``content`` and wait for its job; returns the seconds taken"""
+    started = time.perf_counter()
+    response = client.post('/upload', data={'file': (io.BytesIO(content), 'bench.zip')},
+                           content_type='multipart/form-data')
+    location = response.headers.get('Location', '')
+    if response.status_code != 302 or '/jobs/' not in location:
+        raise RuntimeError(f"Upload failed with status {response.status_code}")
+    session_id = location.rstrip('/').rsplit('/', 1)[-1]
+    while time.perf_counter() - started < JOB_TIMEOUT:
+        state = client.get(f"/api/jobs/{session_id}").get_json().get('state')
+        if state == 'done':
+            return time.perf_counter() - started
+        if state in ('failed', 'cancelled'):
+            raise RuntimeError(f"Job {state}")
+        time.sleep(0.005)
+    raise RuntimeError('Job timed out')
+
+
+def measure(app, import_seconds, content):
+    client = app.test_client()
+    times = {'import': import_seconds}
+    started = time.perf_counter()
+    client.get('/')
+    times['index'] = time.perf_counter() - started
+    times['first job'] = run_job(client, content)
+    times['second job'] = run_job(client, content)
+    return times
+
+
+def child(mode, files):
+    """Run one measurement in this fresh process and print it as JSON"""
+    sys.path.insert(0, ROOT)
+    content = build_zip(files)
+    if mode == 'forked':
+        import app as module
+        module.warm_up()
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            status = 0
+            try:
+                times = measure(module.app, 0.0, content)
+                os.write(write_end, json.dumps(times).encode())
+            except BaseException as e:
+                print(f"Forked run failed: {e}", file=sys.stderr)
+                status = 1
+            finally:
+                module.scheduler.shutdown()
+                os._exit(status)
+        os.close(write_end)
+        with os.fdopen(read_end, 'rb') as pipe:
+            data = pipe.read()
+        os.waitpid(pid, 0)
+        module.scheduler.shutdown()
+        if not data:
+            raise SystemExit(1)
+        print(data.decode())
+        return
+
+    started = time.perf_counter()
+    import app as module
+    import_seconds = time.perf_counter() - started
+    try:
+        print(json.dumps(measure(module.app, import_seconds, content)))
+    finally:
+        module.scheduler.shutdown()
+
+
+def run(mode, files):
+    with tempfile.TemporaryDirectory(prefix='bench-startup-') as workdir:
+        env = dict(
+            os.environ,
+            PYTHONPATH=ROOT,
+            DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+            INDEX_FOLDER=os.path.join(workdir, 'index'),
+            SCRATCH_ROOT=os.path.join(workdir, 'scratch'),
+            REUSE_IDENTICAL_UPLOADS='0',
+            LOG_LEVEL='WARNING',
+            PRELOAD_PROCESSING='1' if mode == 'preload' else '0'
+        )
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', mode, '--files', str(files)],
+                                cwd=workdir, env=env, capture_output=True, text=True)
+        if output.returncode != 0:
+            raise RuntimeError(f"{mode} run failed:\n{output.stderr}")
+        return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def parse_modes(text):
+    modes = [mode.strip() for mode in text.split(',') if mode.strip()]
+    for mode in modes:
+        if mode not in MODES:
+            raise argparse.ArgumentTypeError(f"Unknown mode {mode!r}; expected one of {', '.join(MODES)}")
+    return modes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh processes per mode')
+    parser.add_argument('--files', type=int, default=40, help='source files in the uploaded archive')
+    parser.add_argument('--modes', type=parse_modes, default=list(MODES), help='comma-separated startup modes')
+    parser.add_argument('--child', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.files)
+        return
+
+    print(f"{args.runs} runs per mode, archive of {args.files} files; median ms")
+    print(f"{'mode':<10}" + ''.join(f"{step:>12}" for step in STEPS) + f"{'to 1st job':>12}")
+    for mode in args.modes:
+        runs = [run(mode, args.files) for _ in range(args.runs)]
+        medians = {step: statistics.median(times[step] for times in runs) * 1000 for step in STEPS}
+        ready = statistics.median((times['import'] + times['index'] + times['first job']) for times in runs) * 1000
+        print(f"{mode:<10}" + ''.join(f"{medians[step]:>12.1f}" for step in STEPS) + f"{ready:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Load test for the web app, with a local git remote in place of GitHub.
+
+Starts the app in a scratch directory under Flask's development server or
+gunicorn, serves generated repositories with `git daemon` (or as file://
+URLs), and has --users concurrent clients run a weighted mix of operations
+for --duration seconds:
+
+    upload    POST an archive of one of --zip-sizes MB and wait for its job
+    repo      POST a repository of one of --repo-files files and wait for it
+    results   GET the results page of a finished session
+    download  GET /download_all of a finished session, gzipped half the time
+
+Reports throughput and p50/p95/p99 latency per operation, the peak RSS of
+the server's processes and the peak disk used by scratch space and results:
+
+    python benchmarks/loadtest.py --server gunicorn --users 16 --duration 120 \\
+        --mix upload=2,repo=1,results=4,download=4 --zip-sizes 0.5,5 --repo-files 100,1000
+
+Identical uploads are processed again rather than reused, unless --reuse.
+"""
+
+import argparse
+import glob
+import hashlib
+import hmac
+import io
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+import http.client
+from collections import defaultdict
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from workspace import disk_usage
+
+# Signs each client's X-Client-Id; every client connects from 127.0.0.1
+CLIENT_ID_SECRET = 'loadtest'
+
+# Seconds a client waits for one job before counting it as failed
+JOB_TIMEOUT = 600
+
+# How often clients poll job status and the sampler measures RSS and disk
+POLL_SECONDS = 0.2
+SAMPLE_SECONDS = 1.0
+
+OPERATIONS = ('upload', 'repo', 'results', 'download')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args[0]} exited with status {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def source_files():
+    """This repository's Python and JavaScript files, as (name, content)"""
+    sources = sorted(glob.glob(os.path.join(ROOT, '*.py')) + glob.glob(os.path.join(ROOT, 'static', 'js', '*.js')))
+    contents = []
+    for path in sources:
+        with open(path, 'rb') as f:
+            contents.append((os.path.basename(path), f.read()))
+    return contents
+
+
+def build_zip(path, size_mb, sources):
+    """A ZIP of copies of the source files adding up to about ``size_mb`` uncompressed"""
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        copy = 0
+        while written < target:
+            for name, content in sources:
+                zip_ref.writestr(f"project/copy{copy}/{name}", content)
+                written += len(content)
+                if written >= target:
+                    break
+            copy += 1
+
+
+def build_repo(base, name, files, sources):
+    """A bare repository at ``base/loadtest/<name>.git`` with ``files`` files"""
+    work_tree = os.path.join(base, 'work', name)
+    for number in range(files):
+        file_name, content = sources[number % len(sources)]
+        path = os.path.join(work_tree, f"dir{number // 100}", f"{number}_{file_name}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+    git = ['git', '-c', 'user.name=loadtest', '-c', 'user.email=loadtest@localhost', '-C', work_tree]
+    subprocess.run(git + ['init', '--quiet'], check=True)
+    subprocess.run(git + ['add', '-A'], check=True)
+    subprocess.run(git + ['commit', '--quiet', '-m', 'Load test fixture'], check=True)
+    bare = os.path.join(base, 'loadtest', f"{name}.git")
+    subprocess.run(['git', 'clone', '--quiet', '--bare', work_tree, bare], check=True)
+    shutil.rmtree(work_tree)
+    return bare
+
+
+def start_remote(kind, base):
+    """Serve the repositories under ``base``; returns (URL prefix, process or None)"""
+    if kind == 'file':
+        return f"file://{base}", None
+    port = free_port()
+    process = subprocess.Popen(
+        ['git', 'daemon', '--reuseaddr', '--export-all', f"--base-path={base}",
+         '--listen=127.0.0.1', f"--port={port}", base],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_for_port(port, process)
+    return f"git://127.0.0.1:{port}", process
+
+
+def start_server(kind, workdir, threads, reuse, preload=False):
+    """Start the app in ``workdir``; returns (port, process)"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        INDEX_FOLDER=os.path.join(workdir, 'index'),
+        SCRATCH_ROOT=os.path.join(workdir, 'scratch'),
+        REUSE_IDENTICAL_UPLOADS='1' if reuse else '0',
+        GIT_ALLOWED_HOSTS='127.0.0.1',
+        GIT_ALLOWED_SCHEMES='git,file',
+        CLIENT_ID_SECRET=CLIENT_ID_SECRET
+    )
+    if kind == 'gunicorn':
+        # One process, as the README recommends: the job queue is per process
+        config = ['-c', os.path.join(ROOT, 'gunicorn_preload.py')] if preload else []
+        command = [sys.executable, '-m', 'gunicorn', *config, '--workers', '1', '--threads', str(threads),
+                   '--bind', f"127.0.0.1:{port}", '--timeout', '300', 'main:app']
+    else:
+        command = [sys.executable, '-c',
+                   f"from app import app; app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    process = subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    wait_for_port(port, process, timeout=60)
+    return port, process
+
+
+def process_tree(pid):
+    """``pid`` and all its descendants"""
+    children = defaultdict(list)
+    for stat_path in glob.glob('/proc/[0-9]*/stat'):
+        try:
+            with open(stat_path, 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            children[int(fields[1])].append(int(stat_path.split('/')[2]))
+        except (OSError, IndexError, ValueError):
+            continue
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class Sampler(threading.Thread):
+    """Record the peak RSS of the server's processes and the peak disk use"""
+
+    def __init__(self, server_pid, workdir):
+        super().__init__(daemon=True)
+        self.server_pid = server_pid
+        self.workdir = workdir
+        self.stopped = threading.Event()
+        self.peak_rss_total = 0
+        self.peak_rss_process = 0
+        self.peak_scratch = 0
+        self.peak_results = 0
+
+    def run(self):
+        while not self.stopped.wait(SAMPLE_SECONDS):
+            self.sample()
+
+    def sample(self):
+        if self.server_pid is not None:
+            # git children are included: clones count against the server's memory
+            sizes = [rss_bytes(pid) for pid in process_tree(self.server_pid)]
+            self.peak_rss_total = max(self.peak_rss_total, sum(sizes))
+            self.peak_rss_process = max([self.peak_rss_process] + sizes)
+        if self.workdir is not None:
+            self.peak_scratch = max(self.peak_scratch, disk_usage(os.path.join(self.workdir, 'scratch')))
+            self.peak_results = max(self.peak_results, disk_usage(os.path.join(self.workdir, 'results')))
+
+
+class Recorder:
+    """Latencies, errors and bytes per operation, shared by the client threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+
+    def record(self, name, seconds, ok=True, size=0):
+        with self.lock:
+            if ok:
+                self.latencies[name].append(seconds)
+                self.bytes[name] += size
+            else:
+                self.errors[name] += 1
+
+    def report(self, elapsed):
+        rows = []
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            latencies = sorted(self.latencies[name])
+            rows.append({
+                'operation': name,
+                'count': len(latencies),
+                'errors': self.errors[name],
+                'per_second': round(len(latencies) / elapsed, 2),
+                'p50_ms': percentile_ms(latencies, 50),
+                'p95_ms': percentile_ms(latencies, 95),
+                'p99_ms': percentile_ms(latencies, 99),
+                'mb': round(self.bytes[name] / 1048576, 1)
+            })
+        return rows
+
+
+def percentile_ms(latencies, percent):
+    """Nearest-rank percentile of sorted latencies, in milliseconds"""
+    if not latencies:
+        return None
+    rank = max(int(round(percent / 100 * len(latencies) + 0.5)) - 1, 0)
+    return round(latencies[min(rank, len(latencies) - 1)] * 1000, 1)
+
+
+def multipart(field, filename, content):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{field}\"; "
+               f"filename=\"{filename}\"\r\nContent-Type: application/octet-stream\r\n\r\n".encode())
+    body.write(content)
+    body.write(f"\r\n--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    """One simulated user, with its own client ID for the scheduler's fairness"""
+
+    def __init__(self, number, port, recorder, sessions, zips, repos, weights, seed):
+        self.client_id = f"loadtest-{number}"
+        self.client_headers = {
+            'X-Client-Id': self.client_id,
+            'X-Client-Signature': hmac.new(CLIENT_ID_SECRET.encode(), self.client_id.encode(), hashlib.sha256).hexdigest()
+        }
+        self.port = port
+        self.recorder = recorder
+        self.sessions = sessions
+        self.zips = zips
+        self.repos = repos
+        self.weights = weights
+        self.random = random.Random(seed)
+
+    def request(self, method, path, body=None, headers=None):
+        """(status, headers, body) of one request on a new connection"""
+        connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=JOB_TIMEOUT)
+        try:
+            connection.request(method, path, body=body, headers=dict(headers or {}, **self.client_headers))
+            response = connection.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            connection.close()
+
+    def run(self, deadline):
+        names, weights = zip(*self.weights.items())
+        while time.monotonic() < deadline:
+            operation = self.random.choices(names, weights)[0]
+            if operation in ('results', 'download') and not self.sessions:
+                operation = 'upload'
+            try:
+                getattr(self, operation)()
+            except (OSError, http.client.HTTPException):
+                self.recorder.record(operation, 0, ok=False)
+
+    def upload(self):
+        size, path = self.random.choice(self.zips)
+        with open(path, 'rb') as f:
+            content = f.read()
+        # Identical archives are processed again: the server runs with REUSE_IDENTICAL_UPLOADS=0
+        body, content_type = multipart('file', f"loadtest-{uuid.uuid4().hex[:8]}.zip", content)
+        self.submit(f"upload {size}MB", body, content_type)
+
+    def repo(self):
+        files, url = self.random.choice(self.repos)
+        body = urlencode({'github_url': url}).encode()
+        self.submit(f"repo {files} files", body, 'application/x-www-form-urlencoded')
+
+    def submit(self, name, body, content_type):
+        started = time.monotonic()
+        status, headers, _ = self.request('POST', '/upload', body, {'Content-Type': content_type})
+        location = headers.get('Location', '')
+        if status != 302 or '/jobs/' not in location:
+            self.recorder.record(name, 0, ok=False)
+            return
+        self.recorder.record(f"{name} (request)", time.monotonic() - started)
+
+        session_id = location.rstrip('/').rsplit('/', 1)[-1]
+        while time.monotonic() - started < JOB_TIMEOUT:
+            status, headers, data = self.request('GET', f"/api/jobs/{session_id}")
+            state = json.loads(data).get('state') if status == 200 else None
+            if state == 'done':
+                self.recorder.record(name, time.monotonic() - started)
+                self.sessions.append(session_id)
+                return
+            if state in ('failed', 'cancelled'):
+                break
+            time.sleep(POLL_SECONDS)
+        self.recorder.record(name, 0, ok=False)
+
+    def results(self):
+        session_id = self.random.choice(self.sessions)
+        started = time.monotonic()
+        status, headers, data = self.request('GET', f"/results/{session_id}")
+        self.recorder.record('results', time.monotonic() - started, ok=status == 200, size=len(data))
+
+    def download(self):
+        session_id = self.random.choice(self.sessions)
+        gzipped = self.random.random() < 0.5
+        started = time.monotonic()
+        status, headers, data = self.request('GET', f"/download_all/{session_id}",
+                                             headers={'Accept-Encoding': 'gzip'} if gzipped else None)
+        name = 'download (gzip)' if gzipped else 'download'
+        self.recorder.record(name, time.monotonic() - started, ok=status == 200, size=len(data))
+
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; expected one of {', '.join(OPERATIONS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def parse_numbers(kind):
+    return lambda text: [kind(part) for part in text.split(',') if part.strip()]
+
+
+def print_report(report):
+    print(f"\n{report['users']} users, {report['seconds']}s, server: {report['server']}, remote: {report['remote']}")
+    print(f"{'operation':<28} {'count':>6} {'errors':>6} {'per s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'MB':>7}")
+    for row in report['operations']:
+        print(f"{row['operation']:<28} {row['count']:>6} {row['errors']:>6} {row['per_second']:>7} "
+              f"{row['p50_ms'] or '-':>9} {row['p95_ms'] or '-':>9} {row['p99_ms'] or '-':>9} {row['mb']:>7}")
+    resources = report['resources']
+    if resources['peak_rss_total_mb'] is not None:
+        print(f"peak RSS: {resources['peak_rss_total_mb']} MB total, "
+              f"{resources['peak_rss_process_mb']} MB largest process")
+    if resources['peak_scratch_mb'] is not None:
+        print(f"peak disk: {resources['peak_scratch_mb']} MB scratch, {resources['peak_results_mb']} MB results")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=['dev', 'gunicorn'], default='dev', help='how to run the app')
+    parser.add_argument('--url', help='test an app already running at http://127.0.0.1:<port> instead; '
+                                      'it must allow the --remote URLs (GIT_ALLOWED_HOSTS/GIT_ALLOWED_SCHEMES)')
+    parser.add_argument('--remote', choices=['daemon', 'file'], default='daemon',
+                        help='serve test repositories with git daemon or as file:// URLs')
+    parser.add_argument('--threads', type=int, default=16, help='gunicorn request threads')
+    parser.add_argument('--preload', action='store_true',
+                        help='start gunicorn with gunicorn_preload.py, warming up the app before forking')
+    parser.add_argument('--users', type=int, default=8, help='concurrent clients')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix('upload=3,repo=1,results=4,download=4'),
+                        help='relative weights of upload, repo, results and download')
+    parser.add_argument('--zip-sizes', type=parse_numbers(float), default=[0.1, 1, 5],
+                        help='uncompressed MB of the uploaded archives')
+    parser.add_argument('--repo-files', type=parse_numbers(int), default=[50, 500],
+                        help='files in the test repositories')
+    parser.add_argument('--reuse', action='store_true', help='let the app reuse results of identical uploads')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='also write the report to this file')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch directory and server log')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='fileextractor-loadtest-')
+    processes = []
+    try:
+        sources = source_files()
+        fixtures = os.path.join(workdir, 'fixtures')
+        os.makedirs(fixtures)
+        zips = []
+        for size in args.zip_sizes:
+            path = os.path.join(fixtures, f"{size}mb.zip")
+            build_zip(path, size, sources)
+            zips.append((size, path))
+
+        repo_base = os.path.join(workdir, 'remote')
+        repos = []
+        for files in args.repo_files:
+            build_repo(repo_base, f"repo{files}", files, sources)
+        if args.repo_files:
+            prefix, daemon = start_remote(args.remote, repo_base)
+            if daemon:
+                processes.append(daemon)
+            repos = [(files, f"{prefix}/loadtest/repo{files}.git") for files in args.repo_files]
+        else:
+            args.mix.pop('repo', None)
+
+        if args.url:
+            port = int(args.url.rstrip('/').rsplit(':', 1)[1])
+            sampler = Sampler(None, None)
+        else:
+            port, server = start_server(args.server, workdir, args.threads, args.reuse, args.preload)
+            processes.append(server)
+            sampler = Sampler(server.pid, workdir)
+        print(f"app on port {port}; fixtures: {', '.join(f'{size} MB' for size, path in zips)} archives, "
+              f"{', '.join(f'{files}-file' for files, url in repos) or 'no'} repositories")
+
+        recorder = Recorder()
+        sessions = []
+        clients = [Client(number, port, recorder, sessions, zips, repos, args.mix, args.seed + number)
+                   for number in range(args.users)]
+        sampler.start()
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [threading.Thread(target=client.run, args=(deadline,)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+        sampler.stopped.set()
+        sampler.sample()
+
+        measured = sampler.server_pid is not None
+        report = {
+            'server': 'external' if args.url else args.server,
+            'remote': args.remote,
+            'users': args.users,
+            'seconds': round(elapsed, 1),
+            'operations': recorder.report(elapsed),
+            'resources': {
+                'peak_rss_total_mb': round(sampler.peak_rss_total / 1048576, 1) if measured else None,
+                'peak_rss_process_mb': round(sampler.peak_rss_process / 1048576, 1) if measured else None,
+                'peak_scratch_mb': round(sampler.peak_scratch / 1048576, 1) if measured else None,
+                'peak_results_mb': round(sampler.peak_results / 1048576, 1) if measured else None
+            }
+        }
+        print_report(report)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if args.keep:
+            print(f"kept {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Regex audit harness for the tokenizers.
+
+Feeds every tokenizer adversarial and fuzzed inputs at doubling sizes and
+checks that tokenization time scales linearly with input size. Also checks
+that tokenize_with_watchdog returns within its budget:
+
+    python benchmarks/regex_audit.py [--base-kb 16] [--steps 4] [--only css]
+
+A series whose exponent is over the limit is timed again up to --confirm
+times and its lowest exponent kept, so one noisy run doesn't fail the audit
+while a genuinely super-linear pattern still does.
+
+Exits non-zero if any tokenizer/input pair scales super-linearly.
+"""
+
+import argparse
+import gc
+import logging
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tokenizers import FallbackTokenizer, get_tokenizer, tokenize_with_watchdog
+
+TOKENIZERS = {
+    'python': '.py',
+    'java': '.java',
+    'javascript': '.js',
+    'typescript': '.ts',
+    'html': '.html',
+    'css': '.css',
+    'generic': '.rb',
+}
+
+# Repeated units that exercise unterminated constructs and rescans
+ADVERSARIAL_UNITS = {
+    'unterminated block comments': '/*',
+    'unterminated html comments': '<!--',
+    'unterminated double quotes': '"a',
+    'unterminated single quotes': "'a",
+    'unterminated backticks': '`a',
+    'unclosed tags': '<a',
+    'unclosed doctype': '<!DOCTYPE ',
+    'dangling attributes': 'x="',
+    'selector list without brace': 'a,',
+    'words without brace': 'a ',
+    'text after gt': '>a',
+    'regex-position slashes': '=/',
+    'unterminated regex classes': '=/[',
+    'nested template substitutions': '`${',
+    'nested jsx elements': '<a>',
+    'open braces': '{',
+    'close braces': '}',
+    'property colons': 'a:',
+}
+
+FUZZ_ALPHABET = 'a1 _\n\t/*"\'`<>!-{}[]()=:;,.#$@\\'
+
+
+def long_word(size):
+    return 'a' * size
+
+
+def fuzz(size, seed=1234):
+    rng = random.Random(seed)
+    return ''.join(rng.choice(FUZZ_ALPHABET) for _ in range(size))
+
+
+def build_inputs():
+    inputs = {name: (lambda size, unit=unit: (unit * (size // len(unit) + 1))[:size])
+              for name, unit in ADVERSARIAL_UNITS.items()}
+    inputs['single long word'] = long_word
+    inputs['random fuzz'] = fuzz
+    return inputs
+
+
+def time_tokenize(tokenizer, content):
+    # Collections scale with everything allocated so far, not with this input
+    gc.collect()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        tokenizer.tokenize(content, 'audit')
+        return time.perf_counter() - start
+    finally:
+        gc.enable()
+
+
+def scaling_exponent(sizes, timings):
+    """Least-squares slope of log(time) against log(size)"""
+    xs = [math.log(s) for s in sizes]
+    ys = [math.log(max(t, 1e-6)) for t in timings]
+    mean_x = sum(xs) / len(xs)
+    mean_y = sum(ys) / len(ys)
+    num = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    den = sum((x - mean_x) ** 2 for x in xs)
+    return num / den if den else 0.0
+
+
+def audit(tokenizer, make_input, base_size, steps, max_seconds, repeat):
+    sizes, timings = [], []
+    for step in range(steps):
+        size = base_size * (2 ** step)
+        content = make_input(size)
+        # Best of several runs keeps scheduler noise out of the exponent
+        elapsed = time_tokenize(tokenizer, content)
+        for _ in range(repeat - 1):
+            if elapsed > max_seconds:
+                break
+            elapsed = min(elapsed, time_tokenize(tokenizer, content))
+        sizes.append(size)
+        timings.append(elapsed)
+        if elapsed > max_seconds:
+            # Far too slow to keep doubling; anything this slow is a failure
+            return sizes, timings, float('inf')
+    return sizes, timings, scaling_exponent(sizes, timings)
+
+
+def audit_confirmed(tokenizer, make_input, base_size, steps, max_seconds, repeat, max_exponent, confirm):
+    """Audit a series, re-timing it while it is over max_exponent; keeps the lowest exponent"""
+    best = audit(tokenizer, make_input, base_size, steps, max_seconds, repeat)
+    for _ in range(confirm):
+        if best[2] <= max_exponent or math.isinf(best[2]):
+            break
+        again = audit(tokenizer, make_input, base_size, steps, max_seconds, repeat)
+        if again[2] < best[2]:
+            best = again
+    return best
+
+
+def check_watchdog(tokenizer, content, budget):
+    start = time.perf_counter()
+    result = tokenize_with_watchdog(tokenizer, content, 'audit', budget=budget)
+    return time.perf_counter() - start, result.get('fallback', False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--base-kb', type=int, default=16, help='smallest input size in KB (default: 16)')
+    parser.add_argument('--steps', type=int, default=4, help='number of size doublings (default: 4)')
+    # Linear is 1.0 and quadratic 2.0; the headroom absorbs timing noise
+    parser.add_argument('--max-exponent', type=float, default=1.5,
+                        help='largest acceptable time-vs-size exponent (default: 1.5)')
+    parser.add_argument('--max-seconds', type=float, default=5.0,
+                        help='abort a series once one run takes this long (default: 5)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per size, best is kept (default: 3)')
+    parser.add_argument('--confirm', type=int, default=2,
+                        help='re-runs of a series over --max-exponent, lowest is kept (default: 2)')
+    parser.add_argument('--only', action='append', choices=sorted(TOKENIZERS) + ['fallback'],
+                        help='restrict to these tokenizers')
+    args = parser.parse_args()
+
+    # Adversarial inputs make tokenizers log errors and fallbacks by design
+    logging.disable(logging.CRITICAL)
+
+    tokenizers = {name: get_tokenizer(ext) for name, ext in TOKENIZERS.items()}
+    tokenizers['fallback'] = FallbackTokenizer()
+    if args.only:
+        tokenizers = {name: tokenizers[name] for name in args.only}
+
+    inputs = build_inputs()
+    base_size = args.base_kb * 1024
+    failures = []
+
+    for tokenizer_name, tokenizer in tokenizers.items():
+        print(f"{tokenizer_name}")
+        for input_name, make_input in inputs.items():
+            sizes, timings, exponent = audit_confirmed(tokenizer, make_input, base_size, args.steps,
+                                                     args.max_seconds, args.repeat, args.max_exponent,
+                                                     args.confirm)
+            ok = exponent <= args.max_exponent
+            mark = '✓' if ok else '✗'
+            print(f"  {mark} {input_name:<32} exponent {exponent:5.2f}  "
+                  f"{timings[-1]:7.3f}s at {sizes[-1] // 1024} KB")
+            if not ok:
+                failures.append((tokenizer_name, input_name, exponent))
+
+    # The watchdog must bound wall time even when the budget is tiny
+    print("watchdog")
+    budget = 0.05
+    for tokenizer_name, tokenizer in tokenizers.items():
+        elapsed, fell_back = check_watchdog(tokenizer, fuzz(base_size * 2 ** args.steps), budget)
+        ok = elapsed < budget + 1.0
+        mark = '✓' if ok else '✗'
+        print(f"  {mark} {tokenizer_name:<32} {elapsed:7.3f}s (budget {budget}s, fallback={fell_back})")
+        if not ok:
+            failures.append((tokenizer_name, 'watchdog', elapsed))
+
+    if failures:
+        print(f"\n✗ {len(failures)} super-linear or unbounded case(s):")
+        for tokenizer_name, input_name, value in failures:
+            print(f"  {tokenizer_name}: {input_name} ({value:.2f})")
+        sys.exit(1)
+    print("\n✓ all tokenizers scale linearly")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Audit of multi-revision repository jobs against a local repository.
+
+Creates a repository with `git init`, commits two revisions and runs a
+revisions job on it in place (allow_local), with no clone or network
+access. Checks the per-revision summaries and deltas, that the file list of
+each revision can be rebuilt from the deltas, and that a blob shared by
+several paths or revisions is tokenized once:
+
+    python benchmarks/revisions_audit.py
+
+Exits non-zero if any check fails.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from file_processor import FileProcessor, revision_files
+
+SHARED = "def shared(x):\n    return x * 2\n"
+
+FIRST = {
+    'app.py': "def main():\n    print('v1')\n",
+    'web/index.js': "export const answer = 42;\n",
+    'lib/shared.py': SHARED,
+    'vendor/shared.py': SHARED,
+    'setup.cfg': "[metadata]\nname = audit\n",
+}
+
+# app.py modified, web/index.js removed, lib/extra.py added, the rest unchanged
+SECOND = {
+    'app.py': "def main():\n    print('v2')\n    return main\n",
+    'lib/extra.py': "import os\n",
+    'lib/shared.py': SHARED,
+    'vendor/shared.py': SHARED,
+    'setup.cfg': "[metadata]\nname = audit\n",
+}
+
+
+def git(repo, *args):
+    subprocess.run(['git', '-C', repo, *args], check=True, capture_output=True)
+
+
+def commit_tree(repo, files, tag):
+    """Make the work tree hold exactly ``files``, commit it and tag the commit"""
+    git(repo, 'rm', '-r', '-q', '--ignore-unmatch', '.')
+    for path, content in files.items():
+        full_path = os.path.join(repo, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'w') as f:
+            f.write(content)
+    git(repo, 'add', '-A')
+    git(repo, '-c', 'user.name=audit', '-c', 'user.email=audit@localhost', 'commit', '-q', '-m', tag)
+    git(repo, 'tag', tag)
+
+
+def main():
+    processor = FileProcessor()
+    checks = []
+    with tempfile.TemporaryDirectory() as repo:
+        git(repo, 'init', '-q')
+        commit_tree(repo, FIRST, 'v1')
+        commit_tree(repo, SECOND, 'v2')
+        work = processor.revisions_job(repo, ['v1', 'v2'], allow_local=True)
+        result = processor.run_job(work)
+
+    checks.append(('job succeeds', bool(result.get('success'))))
+    if not result.get('success'):
+        print(f"  ✗ job succeeds: {result.get('error')}")
+        sys.exit(1)
+
+    first, second = result['revisions']
+    delta = second['delta']
+    expected_delta = sum(record['total_tokens'] for record in delta['modified']) \
+        - sum(record['tokens_before'] for record in delta['modified']) \
+        + sum(record['total_tokens'] for record in delta['added'] if record['handler'] == 'code') \
+        - sum(record['total_tokens'] for record in first['files'] if record['path'] in delta['removed'])
+    checks += [
+        ('first revision lists every file', [record['path'] for record in first['files']] == sorted(FIRST)),
+        ('first revision has no delta', first['delta'] is None),
+        ('added files', [record['path'] for record in delta['added']] == ['lib/extra.py']),
+        ('removed files', delta['removed'] == ['web/index.js']),
+        ('modified files', [record['path'] for record in delta['modified']] == ['app.py']),
+        ('unchanged files', delta['unchanged'] == 3),
+        ('token delta adds up', delta['token_delta'] == expected_delta),
+        ('summaries follow the deltas',
+         second['summary']['total_tokens'] - first['summary']['total_tokens'] == delta['token_delta']),
+        ('second revision rebuilt from the delta',
+         [record['path'] for record in revision_files(result['revisions'], 1)] == sorted(SECOND)),
+        ('last revision is the tokenized result',
+         sorted(file_info['path'] for files in result['tokenized_files']['code_files'].values() for file_info in files)
+         == ['app.py', 'lib/extra.py', 'lib/shared.py', 'vendor/shared.py']),
+    ]
+
+    # Code and config blobs: 4 distinct in v1 (the two shared.py paths hold one
+    # blob), plus app.py and lib/extra.py in v2; the rest are reused
+    distinct = len({content for content in list(FIRST.values()) + list(SECOND.values())})
+    checks += [
+        ('planned blobs are the distinct ones', work.plan['unique_blobs'] == distinct),
+        ('each distinct blob is tokenized once', len(work.blobs) == distinct),
+    ]
+
+    failures = 0
+    print('revisions')
+    for description, ok in checks:
+        print(f"  {'✓' if ok else '✗'} {description}")
+        failures += not ok
+    if failures:
+        print(f"{failures} check(s) failed")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+try:
+    from flask_sqlalchemy import SQLAlchemy
+    from sqlalchemy.orm import DeclarativeBase
+except ImportError:
+    # The database is optional; results are still kept as JSON files
+    SQLAlchemy = None
+
+# The one SQLAlchemy instance, shared by app.py and models.py. It lives here
+# rather than in app.py so that running `python app.py`, which loads app.py as
+# __main__, doesn't make models.py load it again with a second instance
+if SQLAlchemy is not None:
+    class Base(DeclarativeBase):
+        pass
+
+    db = SQLAlchemy(model_class=Base)
+else:
+    db = None
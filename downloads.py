@@ -0,0 +1,136 @@
+import os
+import gzip
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from typing import Dict, List, Any, Optional, TextIO
+
+logger = logging.getLogger(__name__)
+
+# gzip level for prebuilt downloads; token text compresses well at modest levels
+GZIP_LEVEL = 6
+
+MANIFEST = 'manifest.json'
+
+def artifact_name(language: Optional[str]) -> str:
+    """File name of a download: 'all', or the language name hex-encoded so 'C' and 'C++' differ"""
+    return 'all' if language is None else f"code-{language.encode('utf-8').hex()}"
+
+def write_language_tokens(out: TextIO, language: str, files: List[Dict[str, Any]], results: Dict[str, Any]):
+    out.write(f"# Tokenized {language.upper()} Content\n")
+    out.write(f"# Generated: {results.get('processed_at', 'Unknown')}\n")
+    out.write(f"# Source: {results.get('source_name', 'Unknown')}\n\n")
+
+    for file_info in files:
+        if 'full_token_string' in file_info:
+            out.write(f"# File: {file_info['name']}\n")
+            out.write(f"# Tokens: {file_info.get('total_tokens', 0)}\n")
+            out.write(file_info['full_token_string'])
+            out.write("\n\n" + "="*50 + "\n\n")
+
+def write_all_tokens(out: TextIO, code_files: Dict[str, List[Dict[str, Any]]], results: Dict[str, Any]):
+    out.write(f"# All Tokenized Content\n")
+    out.write(f"# Generated: {results.get('processed_at', 'Unknown')}\n")
+    out.write(f"# Source: {results.get('source_name', 'Unknown')}\n\n")
+
+    for file_type, files in code_files.items():
+        if files:
+            out.write(f"\n{'='*60}\n")
+            out.write(f"# {file_type.upper()} FILES\n")
+            out.write(f"{'='*60}\n\n")
+
+            for file_info in files:
+                if 'full_token_string' in file_info:
+                    out.write(f"## File: {file_info['name']}\n")
+                    out.write(f"## Tokens: {file_info.get('total_tokens', 0)}\n")
+                    out.write(file_info['full_token_string'])
+                    out.write("\n\n" + "-"*40 + "\n\n")
+
+class DigestWriter:
+    """Text sink that writes UTF-8 to a plain and a gzip file and hashes both as it goes"""
+
+    def __init__(self, path: str):
+        self.plain = open(path, 'wb')
+        self.compressed_file = _Hashing(open(path + '.gz', 'wb'))
+        # mtime=0 keeps the compressed bytes, and so their digest, reproducible
+        self.compressed = gzip.GzipFile(fileobj=self.compressed_file, mode='wb',
+                                        compresslevel=GZIP_LEVEL, mtime=0)
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, text: str):
+        data = text.encode('utf-8')
+        self.plain.write(data)
+        self.compressed.write(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+    def close(self) -> Dict[str, Any]:
+        self.plain.close()
+        self.compressed.close()
+        self.compressed_file.fileobj.close()
+        return {
+            'etag': self.digest.hexdigest(),
+            'gzip_etag': self.compressed_file.digest.hexdigest(),
+            'size': self.size
+        }
+
+class _Hashing:
+    """File wrapper that hashes what is written through it"""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.digest = hashlib.sha256()
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+def build_downloads(directory: str, results: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Write every download of a session, plain and gzipped, with their digests
+
+    Files are built in a temporary directory that replaces ``directory`` as a
+    whole, so readers see either no downloads or all of them. The manifest
+    maps artifact names to their content digests (used as ETags) and sizes.
+    """
+    code_files = (results.get('tokenized_files') or {}).get('code_files') or {}
+    parent = os.path.dirname(os.path.abspath(directory))
+    staging = tempfile.mkdtemp(prefix='.downloads-', dir=parent)
+
+    manifest = {}
+    try:
+        for language, files in [(None, None)] + list(code_files.items()):
+            name = artifact_name(language)
+            writer = DigestWriter(os.path.join(staging, name + '.txt'))
+            try:
+                if language is None:
+                    write_all_tokens(writer, code_files, results)
+                else:
+                    write_language_tokens(writer, language, files, results)
+            finally:
+                manifest[name] = writer.close()
+
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    try:
+        os.rename(staging, directory)
+    except OSError:
+        # Built concurrently by another request or process; theirs is identical
+        shutil.rmtree(staging, ignore_errors=True)
+    return load_manifest(directory) or manifest
+
+def load_manifest(directory: str) -> Optional[Dict[str, Dict[str, Any]]]:
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
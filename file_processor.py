@@ -1,20 +1,48 @@
 import os
-import zipfile
-import tempfile
+import queue
+import hashlib
 import shutil
 import logging
-from typing import Dict, List, Any
+import threading
+from collections import deque
+from functools import partial
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Tuple
 from urllib.parse import urlparse
 import mimetypes
 import subprocess
-from tokenizers import get_tokenizer
+from tokenizers import get_tokenizer, tokenize_with_watchdog
+from search_index import SegmentBuilder
+from similarity import SignatureSet, numpy_available
+from planner import DEFAULT_BULK_COST_SECONDS, plan_archive, plan_git_tree, build_plan, summarize_plan
+from workspace import WorkspaceManager, WorkspaceError, disk_usage
+from archives import ArchiveWalker, ArchiveError, DEFAULT_MAX_DEPTH, DEFAULT_MAX_BYTES, reader_for
+from git_blobs import CatFileBatch, GitObjectError, resolve_commit, list_tree
 
 logger = logging.getLogger(__name__)
 
+# Repository URLs accepted by default: HTTP(S) URLs on GitHub
+DEFAULT_GIT_HOSTS = ('github.com',)
+DEFAULT_GIT_SCHEMES = ('http', 'https')
+
 class FileProcessor:
     """Process zip files and GitHub repositories"""
     
-    def __init__(self):
+    def __init__(self, bulk_cost_seconds: float = DEFAULT_BULK_COST_SECONDS,
+                 max_archive_depth: int = DEFAULT_MAX_DEPTH, max_archive_bytes: int = DEFAULT_MAX_BYTES,
+                 workspaces: Optional[WorkspaceManager] = None,
+                 git_hosts: Iterable[str] = DEFAULT_GIT_HOSTS, git_schemes: Iterable[str] = DEFAULT_GIT_SCHEMES):
+        # Jobs whose plan estimates more CPU seconds than this go to the bulk lane
+        self.bulk_cost_seconds = bulk_cost_seconds
+        # How deep nested archives are opened, and how far an upload may expand
+        self.max_archive_depth = max_archive_depth
+        self.max_archive_bytes = max_archive_bytes
+        # Scratch directories for clones, with quotas and background deletion
+        self.workspaces = workspaces if workspaces is not None else WorkspaceManager()
+        # Hosts (and their subdomains) and URL schemes repositories may be
+        # cloned from; 'file' allows file:// URLs, which have no host
+        self.git_hosts = tuple(host.lower() for host in git_hosts)
+        self.git_schemes = tuple(scheme.lower() for scheme in git_schemes)
+
         self.supported_code_extensions = {
             '.py': 'Python',
             '.java': 'Java',
@@ -77,192 +105,808 @@ class FileProcessor:
         self.config_extensions = {
             '.json', '.xml', '.yaml', '.yml', '.toml', '.ini', '.conf', '.cfg'
         }
+        
+        # Build/cache directories skipped along with hidden ones
+        self.skipped_directories = {
+            'node_modules', '__pycache__', 'build', 'dist', 'target'
+        }
     
-    def process_zip_file(self, zip_path: str) -> Dict[str, Any]:
-        """Process a ZIP file and tokenize its contents"""
-        try:
-            temp_dir = tempfile.mkdtemp()
-            
-            try:
-                # Extract ZIP file
-                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                    zip_ref.extractall(temp_dir)
-                
-                # Process extracted files
-                result = self._process_directory(temp_dir)
-                
-                return {
-                    'success': True,
-                    'tokenized_files': result
-                }
-                
-            finally:
-                # Clean up temporary directory
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                
-        except Exception as e:
-            logger.error(f"Error processing ZIP file: {str(e)}")
-            return {
-                'success': False,
-                'error': f"Error processing ZIP file: {str(e)}"
-            }
+    def route_file(self, relative_path: str) -> Optional[Tuple[str, Optional[str]]]:
+        """Return the (handler, language) a file is routed to, or None if skipped
+
+        Handlers are 'code', 'image', 'document', 'config' and 'other';
+        language is only set for code files.
+        """
+        parts = relative_path.replace('\\', '/').strip('/').split('/')
+        if any(part.startswith('.') for part in parts):
+            return None
+        if any(part in self.skipped_directories for part in parts[:-1]):
+            return None
+        
+        file_ext = os.path.splitext(parts[-1])[1].lower()
+        if file_ext in self.supported_code_extensions:
+            return 'code', self.supported_code_extensions[file_ext]
+        elif file_ext in self.image_extensions:
+            return 'image', None
+        elif file_ext in self.document_extensions:
+            return 'document', None
+        elif file_ext in self.config_extensions:
+            return 'config', None
+        return 'other', None
     
-    def process_github_repo(self, github_url: str) -> Dict[str, Any]:
-        """Clone and process a GitHub repository"""
+    def archive_job(self, archive_path: str, find_prior_results: Optional[Callable[[str], Optional[Dict]]] = None) -> 'ProcessingJob':
+        """Create the step-by-step job for a ZIP, tar or compressed archive"""
+        return ArchiveJob(self, archive_path, find_prior_results)
+    
+    zip_job = archive_job
+    
+    def github_job(self, github_url: str, find_prior_results: Optional[Callable[[str], Optional[Dict]]] = None) -> 'ProcessingJob':
+        """Create the step-by-step job for a GitHub repository"""
+        return GitHubJob(self, github_url, find_prior_results)
+    
+    def revisions_job(self, source: str, revisions: List[str], allow_local: bool = False) -> 'ProcessingJob':
+        """Create the job that tokenizes a repository at several revisions
+
+        ``source`` is a GitHub URL, or with ``allow_local`` the path of a
+        repository on this machine.
+        """
+        return GitRevisionsJob(self, source, revisions, allow_local)
+    
+    def run_job(self, job: 'ProcessingJob', on_plan: Optional[Callable[[Dict], None]] = None) -> Dict[str, Any]:
+        """Run every step of a job in order on the calling thread
+
+        ``on_plan`` receives the job's cost plan before anything is extracted
+        or checked out; it may block to queue the job.
+        """
         try:
-            # Validate GitHub URL
-            if not self._is_valid_github_url(github_url):
-                return {
-                    'success': False,
-                    'error': "Invalid GitHub URL format"
-                }
+            plan = job.make_plan()
+            if on_plan:
+                on_plan(plan)
             
-            temp_dir = tempfile.mkdtemp()
+            pending = deque(job.prepare())
+            while pending:
+                cost, task, *is_step = pending.popleft()
+                follow_ups = task()
+                if is_step and is_step[0]:
+                    pending.extend(follow_ups or [])
+            
+            return job.finish()
             
-            try:
-                # Clone repository
-                result = subprocess.run([
-                    'git', 'clone', github_url, temp_dir
-                ], capture_output=True, text=True, timeout=300)
-                
-                if result.returncode != 0:
-                    return {
-                        'success': False,
-                        'error': f"Failed to clone repository: {result.stderr}"
-                    }
-                
-                # Process cloned repository
-                processed_result = self._process_directory(temp_dir)
-                
-                return {
-                    'success': True,
-                    'tokenized_files': processed_result
-                }
-                
-            finally:
-                # Clean up temporary directory
-                shutil.rmtree(temp_dir, ignore_errors=True)
-                
-        except subprocess.TimeoutExpired:
-            return {
-                'success': False,
-                'error': "Repository cloning timed out (5 minutes limit)"
-            }
         except Exception as e:
-            logger.error(f"Error processing GitHub repository: {str(e)}")
-            return {
-                'success': False,
-                'error': f"Error processing GitHub repository: {str(e)}"
-            }
+            return job.error_result(e)
+            
+        finally:
+            # Clean up temporary directory
+            job.cleanup()
+    
+    def process_zip_file(self, zip_path: str, on_plan: Optional[Callable[[Dict], None]] = None) -> Dict[str, Any]:
+        """Process a ZIP file and tokenize its contents"""
+        return self.run_job(self.zip_job(zip_path), on_plan)
+    
+    def process_github_repo(self, github_url: str, on_plan: Optional[Callable[[Dict], None]] = None) -> Dict[str, Any]:
+        """Clone and process a GitHub repository"""
+        return self.run_job(self.github_job(github_url), on_plan)
     
     def _is_valid_github_url(self, url: str) -> bool:
-        """Validate GitHub URL format"""
+        """Validate a repository URL: an allowed scheme and host, and an owner/name path"""
         try:
             parsed = urlparse(url)
-            return (
-                parsed.scheme in ['http', 'https'] and
-                'github.com' in parsed.netloc and
-                len(parsed.path.strip('/').split('/')) >= 2
-            )
-        except:
+            if parsed.scheme not in self.git_schemes:
+                return False
+            if parsed.scheme != 'file':
+                host = (parsed.hostname or '').lower()
+                if not any(host == allowed or host.endswith('.' + allowed) for allowed in self.git_hosts):
+                    return False
+            return len(parsed.path.strip('/').split('/')) >= 2
+        except ValueError:
             return False
     
-    def _process_directory(self, directory: str) -> Dict[str, List[Dict]]:
-        """Process all files in a directory and organize by type"""
-        result = {
+    def new_result(self) -> Dict[str, Any]:
+        """Empty result structure that process_file fills in"""
+        return {
             'code_files': {},
             'image_files': [],
             'document_files': [],
             'config_files': [],
             'other_files': []
         }
-        
+    
+    def iter_directory(self, directory: str) -> Iterator[Tuple[str, str, str]]:
+        """Yield (file_path, relative_path, handler) for every file to process"""
         for root, dirs, files in os.walk(directory):
             # Skip hidden directories and common build/cache directories
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'build', 'dist', 'target']]
+            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in self.skipped_directories]
             
             for file in files:
-                if file.startswith('.'):
-                    continue
-                    
                 file_path = os.path.join(root, file)
                 relative_path = os.path.relpath(file_path, directory)
-                file_ext = os.path.splitext(file)[1].lower()
+                route = self.route_file(relative_path)
+                if route is not None:
+                    yield file_path, relative_path, route[0]
+    
+    def process_file(self, file_path: str, relative_path: str, handler: str, result: Dict,
+                     postings: Optional[SegmentBuilder] = None, signatures: Optional[SignatureSet] = None):
+        """Process one file into ``result``; safe to call from several threads
+
+        Code files' term counts are also added to ``postings`` for the search
+        index, and their MinHash signatures to ``signatures``.
+        """
+        file = os.path.basename(file_path)
+        file_ext = os.path.splitext(file)[1].lower()
+        
+        try:
+            file_info = {
+                'name': file,
+                'path': relative_path,
+                'size': os.path.getsize(file_path),
+                'extension': file_ext
+            }
+            
+            # Process based on file type
+            if handler == 'code':
+                self._process_code_file(file_path, file_info, result, postings, signatures)
+            elif handler == 'image':
+                result['image_files'].append(file_info)
+            elif handler == 'document':
+                result['document_files'].append(file_info)
+            elif handler == 'config':
+                self._process_config_file(file_path, file_info, result)
+            else:
+                result['other_files'].append(file_info)
                 
-                try:
-                    file_info = {
-                        'name': file,
-                        'path': relative_path,
-                        'size': os.path.getsize(file_path),
-                        'extension': file_ext
-                    }
-                    
-                    # Process based on file type
-                    if file_ext in self.supported_code_extensions:
-                        self._process_code_file(file_path, file_info, result)
-                    elif file_ext in self.image_extensions:
-                        result['image_files'].append(file_info)
-                    elif file_ext in self.document_extensions:
-                        result['document_files'].append(file_info)
-                    elif file_ext in self.config_extensions:
-                        self._process_config_file(file_path, file_info, result)
-                    else:
-                        result['other_files'].append(file_info)
-                        
-                except Exception as e:
-                    logger.error(f"Error processing file {file_path}: {str(e)}")
-                    continue
+        except Exception as e:
+            logger.error(f"Error processing file {file_path}: {str(e)}")
+    
+    def process_content(self, relative_path: str, size: int, content: Optional[bytes], handler: str, result: Dict,
+                        postings: Optional[SegmentBuilder] = None, signatures: Optional[SignatureSet] = None):
+        """Like process_file, for a file already read into memory
+
+        ``content`` is only needed for code and config files.
+        """
+        file_info = {
+            'name': os.path.basename(relative_path),
+            'path': relative_path,
+            'size': size,
+            'extension': os.path.splitext(relative_path)[1].lower()
+        }
+        
+        try:
+            if handler == 'code':
+                if self.tokenize_content(decode_text(content), file_info):
+                    self._add_code_file(file_info, result, postings, signatures)
+            elif handler == 'config':
+                self.preview_config(decode_text(content), file_info)
+                result['config_files'].append(file_info)
+            else:
+                result[f"{handler}_files"].append(file_info)
+        except Exception as e:
+            logger.error(f"Error processing file {relative_path}: {str(e)}")
+    
+    def _process_directory(self, directory: str) -> Dict[str, List[Dict]]:
+        """Process all files in a directory and organize by type"""
+        result = self.new_result()
+        
+        for file_path, relative_path, handler in self.iter_directory(directory):
+            self.process_file(file_path, relative_path, handler, result)
         
         return result
     
-    def _process_code_file(self, file_path: str, file_info: Dict, result: Dict):
+    def _process_code_file(self, file_path: str, file_info: Dict, result: Dict,
+                           postings: Optional[SegmentBuilder] = None, signatures: Optional[SignatureSet] = None):
         """Process and tokenize a code file"""
         try:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 content = f.read()
             
-            file_ext = file_info['extension']
-            language = self.supported_code_extensions[file_ext]
-            
-            # Get appropriate tokenizer
-            tokenizer = get_tokenizer(file_ext)
-            tokenization_result = tokenizer.tokenize(content, file_info['name'])
-            
-            if tokenization_result['success']:
-                # Create tokenized text preview (actual token content)
-                token_preview = ' '.join(tokenization_result['tokens'][:200])
-                
-                file_info.update({
-                    'language': language,
-                    'tokens': tokenization_result['tokens'],
-                    'token_types': tokenization_result['token_types'],
-                    'total_tokens': tokenization_result['total_tokens'],
-                    'lines': len(content.splitlines()),
-                    'token_preview': token_preview,
-                    'full_token_string': ' '.join(tokenization_result['tokens'])
-                })
-                
-                if language not in result['code_files']:
-                    result['code_files'][language] = []
-                result['code_files'][language].append(file_info)
-            else:
-                logger.error(f"Tokenization failed for {file_path}: {tokenization_result.get('error', 'Unknown error')}")
+            if self.tokenize_content(content, file_info):
+                self._add_code_file(file_info, result, postings, signatures)
                 
         except Exception as e:
             logger.error(f"Error processing code file {file_path}: {str(e)}")
     
+    def _add_code_file(self, file_info: Dict, result: Dict,
+                       postings: Optional[SegmentBuilder] = None, signatures: Optional[SignatureSet] = None):
+        result['code_files'].setdefault(file_info['language'], []).append(file_info)
+        if postings is not None:
+            postings.add(file_info['path'], file_info['tokens'])
+        if signatures is not None:
+            signatures.add(file_info['path'], file_info['tokens'])
+    
+    def tokenize_content(self, content: str, file_info: Dict) -> bool:
+        """Tokenize a code file's content into ``file_info``; returns False on failure"""
+        file_ext = file_info['extension']
+        language = self.supported_code_extensions[file_ext]
+        
+        # Get appropriate tokenizer; the watchdog swaps in a linear-time
+        # lexer if a crafted file would pin the CPU
+        tokenizer = get_tokenizer(file_ext)
+        tokenization_result = tokenize_with_watchdog(tokenizer, content, file_info['name'])
+        
+        if not tokenization_result['success']:
+            logger.error(f"Tokenization failed for {file_info['path']}: {tokenization_result.get('error', 'Unknown error')}")
+            return False
+        
+        # Create tokenized text preview (actual token content)
+        token_preview = ' '.join(tokenization_result['tokens'][:200])
+        
+        file_info.update({
+            'language': language,
+            'tokens': tokenization_result['tokens'],
+            'token_types': tokenization_result['token_types'],
+            'total_tokens': tokenization_result['total_tokens'],
+            'lines': len(content.splitlines()),
+            'token_preview': token_preview,
+            'full_token_string': ' '.join(tokenization_result['tokens']),
+            'digest': token_digest(tokenization_result['tokens'])
+        })
+        if tokenization_result.get('fallback'):
+            file_info['tokenizer_fallback'] = True
+        return True
+    
     def _process_config_file(self, file_path: str, file_info: Dict, result: Dict):
         """Process configuration files"""
         try:
             with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
                 content = f.read()
             
-            file_info.update({
-                'content': content[:500] + '...' if len(content) > 500 else content,  # Preview
-                'lines': len(content.splitlines())
-            })
-            
+            self.preview_config(content, file_info)
             result['config_files'].append(file_info)
             
         except Exception as e:
             logger.error(f"Error processing config file {file_path}: {str(e)}")
+    
+    def preview_config(self, content: str, file_info: Dict):
+        """Add a configuration file's preview to ``file_info``"""
+        file_info.update({
+            'content': content[:500] + '...' if len(content) > 500 else content,  # Preview
+            'lines': len(content.splitlines())
+        })
+
+
+# Members read ahead of tokenization, and the most files one pump step hands out
+ARCHIVE_QUEUE_SIZE = 256
+PUMP_BATCH_SIZE = 64
+
+
+class ProcessingError(Exception):
+    """A job failure whose message is shown to the user as is"""
+
+
+class ProcessingJob:
+    """One upload split into steps so a scheduler can interleave its files
+
+    ``make_plan`` lists the job without materializing it, ``prepare`` puts the
+    files on disk and returns one (cost, task) pair per file, ``finish``
+    builds the result once every task has run and ``cleanup`` always runs
+    last. FileProcessor.run_job runs the steps in order on one thread.
+
+    ``prepare`` may also return (cost, task, True) entries: steps, whose
+    return value is a list of further entries, for jobs that discover their
+    files as they go.
+
+    If ``find_prior_results`` returns results for the plan's content
+    fingerprint, ``prepare`` skips extraction and tokenization and those
+    results are reused. Their tokens still go into the job's search postings
+    and signatures, so the new session is indexed like any other.
+    """
+
+    error_prefix = "Error processing job"
+
+    def __init__(self, processor: FileProcessor, source: str,
+                 find_prior_results: Optional[Callable[[str], Optional[Dict]]] = None):
+        self.processor = processor
+        self.source = source
+        self.find_prior_results = find_prior_results
+        self.plan = None
+        self.temp_dir = None
+        self.workspace = None
+        self.tokenized_files = processor.new_result()
+        self.postings = SegmentBuilder()
+        self.signatures = SignatureSet() if numpy_available() else None
+        # Results of an earlier upload with identical content, reused as is
+        self.reused = None
+        # Set by cancel(); long-running steps check it and stop early
+        self.cancelled = threading.Event()
+
+    def make_plan(self) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def materialize(self):
+        """Write the job's files into ``self.temp_dir``"""
+        raise NotImplementedError
+
+    def prepare(self) -> List[Tuple[int, Callable[[], Any]]]:
+        fingerprint = self.plan.get('fingerprint') if self.plan else None
+        if fingerprint and self.find_prior_results:
+            self.reused = self.find_prior_results(fingerprint)
+            if self.reused is not None:
+                logger.info(f"Reusing results of session {self.reused['session_id']} for {self.source}")
+                return []
+        
+        self.materialize()
+        tasks = []
+        for file_path, relative_path, handler in self.processor.iter_directory(self.temp_dir):
+            try:
+                cost = os.path.getsize(file_path)
+            except OSError:
+                cost = 0
+            task = partial(self.processor.process_file, file_path, relative_path, handler,
+                           self.tokenized_files, self.postings, self.signatures)
+            tasks.append((cost, task))
+        return tasks
+
+    def finish(self) -> Dict[str, Any]:
+        if self.reused is not None:
+            for files in self.reused['tokenized_files'].get('code_files', {}).values():
+                for file_info in files:
+                    if file_info.get('tokens'):
+                        self.postings.add(file_info['path'], file_info['tokens'])
+                        if self.signatures is not None:
+                            self.signatures.add(file_info['path'], file_info['tokens'])
+            return {
+                'success': True,
+                'tokenized_files': self.reused['tokenized_files'],
+                'plan': summarize_plan(self.plan),
+                'reused_from': self.reused['session_id']
+            }
+        
+        # Tasks may complete in any order, so sort for stable output
+        for files in self.tokenized_files['code_files'].values():
+            files.sort(key=lambda file_info: file_info['path'])
+        for key, files in self.tokenized_files.items():
+            if key != 'code_files':
+                files.sort(key=lambda file_info: file_info['path'])
+
+        return {
+            'success': True,
+            'tokenized_files': self.tokenized_files,
+            'plan': summarize_plan(self.plan) if self.plan else None
+        }
+
+    def cancel(self):
+        """Ask running steps to stop; called from another thread"""
+        self.cancelled.set()
+
+    def check_cancelled(self):
+        if self.cancelled.is_set():
+            raise ProcessingError("Job cancelled")
+
+    def error_result(self, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, ProcessingError):
+            message = str(error)
+        else:
+            message = f"{self.error_prefix}: {str(error)}"
+            logger.error(message)
+        return {
+            'success': False,
+            'error': message
+        }
+
+    def allocate_workspace(self):
+        """Take a scratch directory from the processor's workspaces as ``self.temp_dir``"""
+        try:
+            self.workspace = self.processor.workspaces.allocate(self.source)
+        except WorkspaceError as e:
+            raise ProcessingError(str(e))
+        self.temp_dir = self.workspace.path
+
+    def cleanup(self):
+        if self.workspace is not None:
+            # Deleted by the workspace reaper, off this thread
+            self.workspace.release()
+            self.workspace = None
+        elif self.temp_dir:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+        self.temp_dir = None
+
+
+class ArchiveJob(ProcessingJob):
+    """Tokenize an uploaded ZIP, tar or compressed archive without extracting it
+
+    A reader thread streams the members, opening nested archives too, into
+    a bounded queue. Pump steps take what has been read so far and turn it
+    into one task per file, so decompression (which releases the GIL)
+    overlaps with tokenization on the scheduler's workers.
+    """
+
+    error_prefix = "Error processing archive"
+
+    def __init__(self, processor: FileProcessor, source: str,
+                 find_prior_results: Optional[Callable[[str], Optional[Dict]]] = None):
+        super().__init__(processor, source, find_prior_results)
+        self.members = queue.Queue(maxsize=ARCHIVE_QUEUE_SIZE)
+        self.reader = None
+        self.walker = None
+        self._stop = threading.Event()
+
+    def make_plan(self) -> Dict[str, Any]:
+        if reader_for(self.source) is None:
+            raise ProcessingError("Unsupported archive type")
+        try:
+            self.plan = plan_archive(self.source, self.processor, self.processor.bulk_cost_seconds)
+        except Exception as e:
+            raise ProcessingError(f"Could not read archive: {str(e)}")
+        return self.plan
+
+    def prepare(self) -> List[Tuple]:
+        fingerprint = self.plan.get('fingerprint') if self.plan else None
+        if fingerprint and self.find_prior_results:
+            self.reused = self.find_prior_results(fingerprint)
+            if self.reused is not None:
+                logger.info(f"Reusing results of session {self.reused['session_id']} for {self.source}")
+                return []
+        
+        def route(path):
+            routed = self.processor.route_file(path)
+            return routed[0] if routed else None
+        
+        self.walker = ArchiveWalker(route, ('code', 'config'), self.processor.max_archive_depth,
+                                    self.processor.max_archive_bytes)
+        self.reader = threading.Thread(target=self._read_members, name='archive-reader', daemon=True)
+        self.reader.start()
+        return [(0, self._pump, True)]
+
+    def _read_members(self):
+        try:
+            for member in self.walker.walk(self.source):
+                if self.cancelled.is_set() or not self._put(member):
+                    return
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item) -> bool:
+        # Give up if the job is torn down or cancelled while the queue is full
+        while not (self._stop.is_set() or self.cancelled.is_set()):
+            try:
+                self.members.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _pump(self) -> List[Tuple]:
+        """Turn the members read so far into file tasks, then queue the next pump"""
+        # The reader stops putting members once the job is cancelled
+        while True:
+            self.check_cancelled()
+            try:
+                items = [self.members.get(timeout=0.5)]
+                break
+            except queue.Empty:
+                continue
+        while len(items) < PUMP_BATCH_SIZE:
+            try:
+                items.append(self.members.get_nowait())
+            except queue.Empty:
+                break
+        
+        tasks = []
+        for item in items:
+            self.check_cancelled()
+            if isinstance(item, ArchiveError):
+                raise ProcessingError(str(item))
+            if isinstance(item, Exception):
+                raise item
+            if item is None:
+                return tasks
+            path, size, handler, content = item
+            tasks.append((size, partial(self.processor.process_content, path, size, content, handler,
+                                        self.tokenized_files, self.postings, self.signatures), False))
+        tasks.append((0, self._pump, True))
+        return tasks
+
+    def finish(self) -> Dict[str, Any]:
+        results = super().finish()
+        if self.walker is not None:
+            results['archive'] = {
+                'bytes_read': self.walker.bytes_seen,
+                'nested_archives': self.walker.nested_archives
+            }
+        return results
+
+    def cleanup(self):
+        self._stop.set()
+        if self.reader is not None:
+            self.reader.join(timeout=10)
+            self.reader = None
+        super().cleanup()
+
+
+class GitHubJob(ProcessingJob):
+    """Clone and tokenize a GitHub repository
+
+    The clone is made without a checkout so the plan comes from
+    ``git ls-tree`` before the working tree is written.
+    """
+
+    error_prefix = "Error processing GitHub repository"
+
+    def make_plan(self) -> Dict[str, Any]:
+        # Validate GitHub URL
+        if not self.processor._is_valid_github_url(self.source):
+            raise ProcessingError("Invalid GitHub URL format")
+
+        self.allocate_workspace()
+        self._git(['clone', '--no-checkout', self.source, self.temp_dir], "Failed to clone repository")
+
+        self.plan = plan_git_tree(self.temp_dir, self.processor, bulk_cost_seconds=self.processor.bulk_cost_seconds)
+        self.plan['source'] = self.source
+
+        # Reserve room for the working tree before writing it
+        try:
+            self.workspace.reserve(disk_usage(self.temp_dir) + self.plan['total_bytes'])
+        except WorkspaceError as e:
+            raise ProcessingError(str(e))
+        return self.plan
+
+    def materialize(self):
+        self._git(['-C', self.temp_dir, 'checkout'], "Failed to check out repository")
+
+    def _git(self, args: List[str], failure: str):
+        try:
+            if self.workspace is not None:
+                # Killed if the clone outgrows the scratch quotas
+                result = self.workspace.run(['git'] + args, timeout=300, cancelled=self.cancelled)
+            else:
+                result = subprocess.run(['git'] + args, capture_output=True, text=True, timeout=300)
+        except subprocess.TimeoutExpired:
+            raise ProcessingError("Repository cloning timed out (5 minutes limit)")
+        except WorkspaceError as e:
+            raise ProcessingError(str(e))
+        
+        if result.returncode != 0:
+            raise ProcessingError(f"{failure}: {result.stderr}")
+
+
+
+class GitRevisionsJob(GitHubJob):
+    """Tokenize a repository at each of several revisions without checkouts
+
+    The repository is cloned bare (or a local one is used in place), each
+    revision is listed with ``git ls-tree`` and the code and config blobs are
+    read through one ``git cat-file --batch`` process. A blob shared by
+    several revisions is tokenized once.
+
+    The result holds the last revision's files as ``tokenized_files`` and a
+    ``revisions`` list: a summary per revision, the compact file list of the
+    first one and, for every later one, its delta against the revision before.
+    """
+
+    error_prefix = "Error processing repository revisions"
+
+    def __init__(self, processor: FileProcessor, source: str, revisions: List[str], allow_local: bool = False):
+        super().__init__(processor, source)
+        self.revisions = revisions
+        self.allow_local = allow_local
+        self.repo_dir = None
+        self.reader = None
+        # (revision, commit id, [(path, size, blob id, handler, language)]) per revision
+        self.trees = []
+        # (blob id, extension) -> (first path, size, handler) of each blob to read
+        self._unique = {}
+        # (blob id, extension) -> processed file_info, or None if it failed
+        self.blobs = {}
+
+    def make_plan(self) -> Dict[str, Any]:
+        if not self.revisions:
+            raise ProcessingError("No revisions given")
+
+        if self.allow_local and os.path.isdir(self.source):
+            self.repo_dir = self.source
+        else:
+            if not self.processor._is_valid_github_url(self.source):
+                raise ProcessingError("Invalid GitHub URL format")
+            self.allocate_workspace()
+            self._git(['clone', '--bare', '--quiet', self.source, self.temp_dir], "Failed to clone repository")
+            self.repo_dir = self.temp_dir
+
+        unique = {}
+        for revision in self.revisions:
+            self.check_cancelled()
+            try:
+                commit = resolve_commit(self.repo_dir, revision)
+                blobs = list_tree(self.repo_dir, commit)
+            except GitObjectError as e:
+                raise ProcessingError(str(e))
+
+            entries = []
+            for path, size, blob_id in blobs:
+                route = self.processor.route_file(path)
+                if route is None:
+                    continue
+                handler, language = route
+                entries.append((path, size, blob_id, handler, language))
+                if handler in ('code', 'config'):
+                    unique.setdefault(self.blob_key(path, blob_id), (path, size, handler))
+            self.trees.append((revision, commit, entries))
+
+        # Cost only what will actually be read: each distinct blob once
+        self.plan = build_plan(self.source, [(path, size) for path, size, handler in unique.values()],
+                               self.processor, self.processor.bulk_cost_seconds)
+        self.plan['revisions'] = [
+            {'revision': revision, 'commit': commit, 'files': len(entries)}
+            for revision, commit, entries in self.trees
+        ]
+        self.plan['unique_blobs'] = len(unique)
+        self._unique = unique
+        return self.plan
+
+    @staticmethod
+    def blob_key(path: str, blob_id: str) -> Tuple[str, str]:
+        # The tokenizer depends on the extension, so a blob is processed once per extension
+        return blob_id, os.path.splitext(path)[1].lower()
+
+    def prepare(self) -> List[Tuple[int, Callable[[], Any]]]:
+        self.reader = CatFileBatch(self.repo_dir)
+        return [(size, partial(self._process_blob, key, path, handler))
+                for key, (path, size, handler) in self._unique.items()]
+
+    def _process_blob(self, key: Tuple[str, str], path: str, handler: str):
+        blob_id, file_ext = key
+        try:
+            content = decode_text(self.reader.read(blob_id))
+
+            file_info = {
+                'name': os.path.basename(path),
+                'path': path,
+                'size': self._unique[key][1],
+                'extension': file_ext
+            }
+            if handler == 'code':
+                self.blobs[key] = file_info if self.processor.tokenize_content(content, file_info) else None
+            else:
+                self.processor.preview_config(content, file_info)
+                self.blobs[key] = file_info
+        except Exception as e:
+            logger.error(f"Error processing blob {blob_id} ({path}): {str(e)}")
+            self.blobs[key] = None
+
+    def finish(self) -> Dict[str, Any]:
+        self.close_reader()
+
+        revisions = []
+        previous = None
+        for revision, commit, entries in self.trees:
+            files = {}
+            for path, size, blob_id, handler, language in entries:
+                file_info = self.blobs.get(self.blob_key(path, blob_id)) if handler in ('code', 'config') else None
+                if handler == 'code' and file_info is None:
+                    # Failed to tokenize; left out as process_file would
+                    continue
+                files[path] = {
+                    'path': path,
+                    'blob': blob_id,
+                    'handler': handler,
+                    'language': language,
+                    'size': size,
+                    'total_tokens': file_info.get('total_tokens', 0) if file_info else 0,
+                    'lines': file_info.get('lines') if file_info else None
+                }
+
+            entry = {'revision': revision, 'commit': commit, 'summary': summarize_revision(files.values())}
+            if previous is None:
+                entry['files'] = sorted(files.values(), key=lambda record: record['path'])
+                entry['delta'] = None
+            else:
+                entry['delta'] = revision_delta(previous, files)
+            revisions.append(entry)
+            previous = files
+
+        self._collect_last_revision()
+        return {
+            'success': True,
+            'tokenized_files': self.tokenized_files,
+            'plan': summarize_plan(self.plan),
+            'revisions': revisions
+        }
+
+    def _collect_last_revision(self):
+        """Fill ``tokenized_files``, the search postings and signatures from the last revision"""
+        revision, commit, entries = self.trees[-1]
+        for path, size, blob_id, handler, language in entries:
+            if handler in ('code', 'config'):
+                processed = self.blobs.get(self.blob_key(path, blob_id))
+                if processed is None:
+                    continue
+                # Token lists are shared between paths holding the same blob
+                file_info = dict(processed, name=os.path.basename(path), path=path)
+            else:
+                file_info = {
+                    'name': os.path.basename(path),
+                    'path': path,
+                    'size': size,
+                    'extension': os.path.splitext(path)[1].lower()
+                }
+
+            if handler == 'code':
+                self.tokenized_files['code_files'].setdefault(language, []).append(file_info)
+                self.postings.add(path, file_info['tokens'])
+                if self.signatures is not None:
+                    self.signatures.add(path, file_info['tokens'])
+            else:
+                self.tokenized_files[f"{handler}_files"].append(file_info)
+
+        for files in self.tokenized_files['code_files'].values():
+            files.sort(key=lambda file_info: file_info['path'])
+        for key, files in self.tokenized_files.items():
+            if key != 'code_files':
+                files.sort(key=lambda file_info: file_info['path'])
+
+    def close_reader(self):
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def cleanup(self):
+        self.close_reader()
+        super().cleanup()
+
+
+def decode_text(content: bytes) -> str:
+    """Decode file content the way process_file reads it: UTF-8, universal newlines"""
+    return content.decode('utf-8', errors='ignore').replace('\r\n', '\n').replace('\r', '\n')
+
+def token_digest(tokens: List[str]) -> str:
+    """Digest of a token list; files with equal digests have identical tokens"""
+    digest = hashlib.sha256()
+    for token in tokens:
+        digest.update(token.encode('utf-8', 'surrogatepass'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def summarize_revision(files: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """File, token and line counts of one revision, in total and per language"""
+    summary = {'files': 0, 'code_files': 0, 'total_tokens': 0, 'lines': 0, 'languages': {}}
+    for record in files:
+        summary['files'] += 1
+        if record['handler'] != 'code':
+            continue
+        summary['code_files'] += 1
+        summary['total_tokens'] += record['total_tokens']
+        summary['lines'] += record['lines'] or 0
+        language = summary['languages'].setdefault(record['language'], {'files': 0, 'total_tokens': 0})
+        language['files'] += 1
+        language['total_tokens'] += record['total_tokens']
+    return summary
+
+def revision_delta(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict[str, Any]:
+    """Files added, removed and modified between two revisions' {path: record} maps"""
+    added = [after[path] for path in sorted(after.keys() - before.keys())]
+    removed = [before[path] for path in sorted(before.keys() - after.keys())]
+    modified = []
+    unchanged = 0
+    for path in sorted(after.keys() & before.keys()):
+        if after[path]['blob'] == before[path]['blob']:
+            unchanged += 1
+        else:
+            modified.append(dict(after[path], tokens_before=before[path]['total_tokens']))
+
+    languages = {}
+    for record, sign in [(record, 1) for record in added] + [(record, -1) for record in removed]:
+        if record['handler'] == 'code':
+            languages[record['language']] = languages.get(record['language'], 0) + sign * record['total_tokens']
+    for record in modified:
+        if record['handler'] == 'code':
+            change = record['total_tokens'] - record['tokens_before']
+            languages[record['language']] = languages.get(record['language'], 0) + change
+
+    return {
+        'added': added,
+        'removed': [record['path'] for record in removed],
+        'modified': modified,
+        'unchanged': unchanged,
+        'token_delta': sum(languages.values()),
+        'languages': {language: change for language, change in languages.items() if change}
+    }
+
+def revision_files(revisions: List[Dict[str, Any]], position: int) -> List[Dict[str, Any]]:
+    """Rebuild the compact file list of ``revisions[position]`` from the first list and the deltas"""
+    files = {record['path']: record for record in revisions[0]['files']}
+    for entry in revisions[1:position + 1]:
+        delta = entry['delta']
+        for path in delta['removed']:
+            files.pop(path, None)
+        for record in delta['added'] + delta['modified']:
+            files[record['path']] = {key: value for key, value in record.items() if key != 'tokens_before'}
+    return [files[path] for path in sorted(files)]
@@ -0,0 +1,85 @@
+import logging
+import threading
+import subprocess
+from typing import List, Tuple
+from planner import parse_ls_tree_blobs
+
+logger = logging.getLogger(__name__)
+
+class GitObjectError(Exception):
+    """A revision or object that the repository doesn't have"""
+
+def resolve_commit(repo_dir: str, revision: str) -> str:
+    """Commit id of a branch, tag or commit-ish"""
+    result = subprocess.run(
+        ['git', '-C', repo_dir, 'rev-parse', '--verify', '--quiet', '--end-of-options', f"{revision}^{{commit}}"],
+        capture_output=True, text=True, timeout=60
+    )
+    if result.returncode != 0:
+        raise GitObjectError(f"Unknown revision: {revision}")
+    return result.stdout.strip()
+
+def list_tree(repo_dir: str, revision: str) -> List[Tuple[str, int, str]]:
+    """(path, size, blob id) of every blob in a revision, without a checkout"""
+    result = subprocess.run(
+        ['git', '-C', repo_dir, 'ls-tree', '-r', '-l', '-z', revision],
+        capture_output=True, timeout=300
+    )
+    if result.returncode != 0:
+        raise GitObjectError(f"git ls-tree failed for {revision}: {result.stderr.decode('utf-8', 'replace')}")
+    return parse_ls_tree_blobs(result.stdout)
+
+class CatFileBatch:
+    """Read objects by id through one long-lived ``git cat-file --batch`` process
+
+    Each read writes an id and reads back the "<id> <type> <size>" header and
+    the object, so no working tree is needed. Reads are serialized, so one
+    instance can be shared by several threads.
+    """
+
+    def __init__(self, repo_dir: str):
+        self.process = subprocess.Popen(
+            ['git', '-C', repo_dir, 'cat-file', '--batch'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        self._lock = threading.Lock()
+
+    def read(self, object_id: str) -> bytes:
+        with self._lock:
+            if self.process.poll() is not None:
+                raise GitObjectError("git cat-file is no longer running")
+
+            self.process.stdin.write(object_id.encode('ascii') + b'\n')
+            self.process.stdin.flush()
+
+            header = self.process.stdout.readline()
+            if not header:
+                raise GitObjectError("git cat-file exited unexpectedly")
+            fields = header.split()
+            if len(fields) != 3:
+                # "<id> missing" or "<id> ambiguous"
+                raise GitObjectError(f"Object {object_id} is {fields[-1].decode('ascii', 'replace')}")
+
+            size = int(fields[2])
+            data = self.process.stdout.read(size)
+            # Each object is followed by a newline
+            self.process.stdout.read(1)
+            if len(data) != size:
+                raise GitObjectError(f"Short read for object {object_id}")
+            return data
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
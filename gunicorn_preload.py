@@ -0,0 +1,17 @@
+"""Gunicorn settings that load and warm the app once, before workers are forked
+
+    gunicorn -c gunicorn_preload.py --bind 0.0.0.0:5000 main:app
+
+The app, the processing modules and every tokenizer are loaded in the
+master process. Workers, including ones restarted after a crash or
+--max-requests, are forked from it and start warm instead of paying for the
+imports on their first job. Anything not set here comes from the command line.
+"""
+
+preload_app = True
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker is forked
+    from app import warm_up
+    warm_up()
+    server.log.info("Processing modules and tokenizers warmed up")
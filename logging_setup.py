@@ -0,0 +1,49 @@
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+from typing import Optional
+
+LOG_FORMAT = '%(levelname)s:%(name)s:%(message)s'
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+def configure_logging(level: str = 'INFO'):
+    """Log through a queue to a background thread that writes to stderr
+
+    Records below ``level`` are dropped by the loggers before any message is
+    built. Records at or above it are put on a queue, so the worker threads
+    tokenizing files never wait on the stream. A forked child starts its own
+    writer thread.
+    """
+    global _queue_handler
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    if _queue_handler is not None:
+        return
+
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    root.addHandler(_queue_handler)
+    _start_listener()
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_after_fork)
+
+def _start_listener():
+    global _listener
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+def _stop_listener():
+    # Writes out whatever is still queued
+    if _listener is not None:
+        _listener.stop()
+
+def _after_fork():
+    # The writer thread doesn't survive a fork: give the child a fresh queue and thread
+    _queue_handler.queue = queue.SimpleQueue()
+    _start_listener()
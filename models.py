@@ -1,25 +1,223 @@
-from app import db
+import json
+import zlib
 from datetime import datetime
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+from sqlalchemy import insert, delete, select
+from database import db
+
+# Rows inserted per transaction when storing a job's files
+DEFAULT_BATCH_SIZE = 500
+
+# zlib level for token payloads; higher levels cost CPU for little gain on token lists
+TOKEN_COMPRESSION_LEVEL = 6
+
+class ProcessingSession(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(36), unique=True, nullable=False)
+    source_type = db.Column(db.String(20), nullable=False)  # 'zip', 'archive' or 'github'
+    source_url = db.Column(db.Text)
+    success = db.Column(db.Boolean, default=True)
+    error = db.Column(db.Text)
+    total_files = db.Column(db.Integer, default=0)
+    tokens_count = db.Column(db.Integer, default=0)
+    processing_seconds = db.Column(db.Float)
+    processed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'session_id': self.session_id,
+            'source_type': self.source_type,
+            'source_name': self.source_url,
+            'success': self.success,
+            'error': self.error,
+            'total_files': self.total_files,
+            'total_tokens': self.tokens_count,
+            'processing_seconds': self.processing_seconds,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
+    def __repr__(self):
+        return f'<ProcessingSession {self.session_id}>'
 
 class ProcessedFile(db.Model):
+    # "All Python files from repository X" is served by the composite index
+    __table_args__ = (
+        db.Index('ix_processed_file_source_language', 'source_url', 'language'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.String(36), db.ForeignKey('processing_session.session_id'), nullable=False, index=True)
     filename = db.Column(db.String(255), nullable=False)
-    file_type = db.Column(db.String(50), nullable=False)
-    source_type = db.Column(db.String(20), nullable=False)  # 'zip' or 'github'
+    path = db.Column(db.Text, nullable=False)
+    file_type = db.Column(db.String(50), nullable=False)  # 'code', 'image', 'document', 'config' or 'other'
+    language = db.Column(db.String(50), index=True)
+    extension = db.Column(db.String(50))
+    file_size = db.Column(db.BigInteger, default=0)
+    lines = db.Column(db.Integer)
+    source_type = db.Column(db.String(20), nullable=False)  # 'zip', 'archive' or 'github'
     source_url = db.Column(db.Text)
     tokens_count = db.Column(db.Integer, default=0)
-    processed_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
+    processed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'name': self.filename,
+            'path': self.path,
+            'file_type': self.file_type,
+            'language': self.language,
+            'extension': self.extension,
+            'size': self.file_size,
+            'lines': self.lines,
+            'source_type': self.source_type,
+            'source_name': self.source_url,
+            'total_tokens': self.tokens_count,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
     def __repr__(self):
         return f'<ProcessedFile {self.filename}>'
 
 class TokenizedContent(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    processed_file_id = db.Column(db.Integer, db.ForeignKey('processed_file.id'), nullable=False)
-    tokens = db.Column(db.Text, nullable=False)
+    processed_file_id = db.Column(db.Integer, db.ForeignKey('processed_file.id'), nullable=False, index=True)
+    tokens = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON list of tokens
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
+
     processed_file = db.relationship('ProcessedFile', backref=db.backref('tokenized_content', lazy=True))
-    
+
+    @property
+    def token_list(self) -> List[str]:
+        return decompress_tokens(self.tokens)
+
     def __repr__(self):
         return f'<TokenizedContent {self.id}>'
+
+def compress_tokens(tokens: List[str]) -> bytes:
+    return zlib.compress(json.dumps(tokens, separators=(',', ':')).encode('utf-8'), TOKEN_COMPRESSION_LEVEL)
+
+def decompress_tokens(data: bytes) -> List[str]:
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+def iter_file_rows(results: Dict[str, Any], processed_at: datetime) -> Iterator[Tuple[Dict[str, Any], Optional[List[str]]]]:
+    """Yield a ProcessedFile row and its tokens (None for non-code files) per result file"""
+    tokenized_files = results.get('tokenized_files') or {}
+
+    for section, files in tokenized_files.items():
+        file_type = section[:-len('_files')] if section.endswith('_files') else section
+        if isinstance(files, dict):
+            # code_files is grouped by language
+            files = [file_info for group in files.values() for file_info in group]
+
+        for file_info in files:
+            row = {
+                'session_id': results['session_id'],
+                'filename': file_info['name'][:255],
+                'path': file_info['path'],
+                'file_type': file_type,
+                'language': file_info.get('language'),
+                'extension': file_info.get('extension'),
+                'file_size': file_info.get('size', 0),
+                'lines': file_info.get('lines'),
+                'source_type': results.get('source_type', 'zip'),
+                'source_url': results.get('source_name'),
+                'tokens_count': file_info.get('total_tokens', 0),
+                'processed_at': processed_at
+            }
+            yield row, file_info.get('tokens')
+
+def store_results(results: Dict[str, Any], batch_size: int = DEFAULT_BATCH_SIZE) -> int:
+    """Persist a finished job and return the number of files stored
+
+    Files are written with multi-row INSERTs, ``batch_size`` files and their
+    token payloads per transaction, instead of one ORM object per row. If a
+    batch fails, the rows already written for the session are removed.
+    """
+    session_id = results['session_id']
+    processed_at = datetime.fromisoformat(results['processed_at']) if results.get('processed_at') else datetime.utcnow()
+    tokenized_files = results.get('tokenized_files') or {}
+    code_files = tokenized_files.get('code_files', {})
+
+    db.session.add(ProcessingSession(
+        session_id=session_id,
+        source_type=results.get('source_type', 'zip'),
+        source_url=results.get('source_name'),
+        success=results.get('success', False),
+        error=results.get('error'),
+        total_files=sum(len(files) for files in code_files.values()) + sum(
+            len(files) for section, files in tokenized_files.items() if section != 'code_files'),
+        tokens_count=sum(file_info.get('total_tokens', 0) for files in code_files.values() for file_info in files),
+        processing_seconds=results.get('processing_seconds'),
+        processed_at=processed_at
+    ))
+    db.session.commit()
+
+    stored = 0
+    try:
+        batch = []
+        for entry in iter_file_rows(results, processed_at):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                stored += _insert_file_batch(batch)
+                batch = []
+        if batch:
+            stored += _insert_file_batch(batch)
+    except Exception:
+        db.session.rollback()
+        delete_results(session_id)
+        raise
+
+    return stored
+
+def _insert_file_batch(batch: List[Tuple[Dict[str, Any], Optional[List[str]]]]) -> int:
+    # RETURNING in parameter order pairs each new id with its tokens
+    file_ids = db.session.scalars(
+        insert(ProcessedFile).returning(ProcessedFile.id, sort_by_parameter_order=True),
+        [row for row, tokens in batch]
+    ).all()
+
+    created_at = datetime.utcnow()
+    contents = [
+        {'processed_file_id': file_id, 'tokens': compress_tokens(tokens), 'created_at': created_at}
+        for file_id, (row, tokens) in zip(file_ids, batch) if tokens is not None
+    ]
+    if contents:
+        db.session.execute(insert(TokenizedContent), contents)
+
+    db.session.commit()
+    return len(file_ids)
+
+def delete_results(session_id: str):
+    """Remove a session and everything stored for it"""
+    file_ids = select(ProcessedFile.id).where(ProcessedFile.session_id == session_id)
+    db.session.execute(delete(TokenizedContent).where(TokenizedContent.processed_file_id.in_(file_ids)))
+    db.session.execute(delete(ProcessedFile).where(ProcessedFile.session_id == session_id))
+    db.session.execute(delete(ProcessingSession).where(ProcessingSession.session_id == session_id))
+    db.session.commit()
+
+def list_sessions(limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    """Most recent sessions first, from the processed_at index"""
+    query = (select(ProcessingSession)
+             .order_by(ProcessingSession.processed_at.desc())
+             .limit(limit).offset(offset))
+    return [session.to_dict() for session in db.session.scalars(query)]
+
+def find_files(source: Optional[str] = None, language: Optional[str] = None, session_id: Optional[str] = None,
+               limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+    """Files matching every given filter, most recent first"""
+    query = select(ProcessedFile)
+    if source is not None:
+        query = query.where(ProcessedFile.source_url == source)
+    if language is not None:
+        query = query.where(ProcessedFile.language == language)
+    if session_id is not None:
+        query = query.where(ProcessedFile.session_id == session_id)
+
+    query = query.order_by(ProcessedFile.processed_at.desc(), ProcessedFile.id).limit(limit).offset(offset)
+    return [processed_file.to_dict() for processed_file in db.session.scalars(query)]
+
+def load_file_tokens(file_id: int) -> Optional[List[str]]:
+    """Decompressed tokens of a stored code file, or None"""
+    data = db.session.scalar(select(TokenizedContent.tokens).where(TokenizedContent.processed_file_id == file_id))
+    return decompress_tokens(data) if data is not None else None
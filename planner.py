@@ -0,0 +1,225 @@
+import os
+import zlib
+import zipfile
+import tarfile
+import hashlib
+import logging
+import subprocess
+from typing import Dict, List, Any, Iterable, Tuple
+from archives import ZIP_SUFFIXES, clean_member_name
+
+logger = logging.getLogger(__name__)
+
+# Measured tokenizer cost per language: (throughput in KB/s, tokens per byte).
+# Figures come from running each tokenizer over representative sources.
+LANGUAGE_COSTS = {
+    'Python': (1300, 0.125),
+    'Java': (550, 0.27),
+    'JavaScript': (2150, 0.17),
+    'React JSX': (2150, 0.17),
+    'TypeScript': (2150, 0.17),
+    'React TSX': (2150, 0.17),
+    'HTML': (4500, 0.037),
+    'CSS': (870, 0.147),
+    'SCSS': (870, 0.147),
+    'SASS': (870, 0.147),
+    'LESS': (870, 0.147),
+}
+
+# Every other language goes through GenericTokenizer
+GENERIC_COST = (480, 0.39)
+
+# Config files are read for a preview but not tokenized
+CONFIG_THROUGHPUT_KBPS = 50000
+
+# Fixed cost per file for stat/open/read and result bookkeeping, in seconds
+PER_FILE_OVERHEAD = 0.0002
+
+# Extracting a ZIP or checking out a tree, in KB/s of uncompressed data
+EXTRACT_THROUGHPUT_KBPS = 50000
+
+# Assumed expansion of compressed tarballs, whose sizes are only known once decompressed
+COMPRESSION_RATIO_ESTIMATE = 4
+
+# Jobs estimated above this many seconds are scheduled on the bulk lane
+DEFAULT_BULK_COST_SECONDS = 30.0
+
+def plan_zip_file(zip_path: str, processor, bulk_cost_seconds: float = DEFAULT_BULK_COST_SECONDS) -> Dict[str, Any]:
+    """Plan a ZIP job from its central directory, without extracting anything
+
+    The fingerprint does read every entry, to hash it. A ZIP that would
+    expand past the processor's ``max_archive_bytes``, or whose entries can't
+    be read, gets no fingerprint and is never matched with another upload.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        infos = [info for info in zip_ref.infolist() if not info.is_dir()]
+        plan = build_plan(os.path.basename(zip_path), [(info.filename, info.file_size) for info in infos],
+                          processor, bulk_cost_seconds)
+
+        plan['fingerprint'] = None
+        if sum(info.file_size for info in infos) <= processor.max_archive_bytes:
+            try:
+                plan['fingerprint'] = zip_fingerprint(zip_ref, infos)
+            except (RuntimeError, NotImplementedError, zipfile.BadZipFile, zlib.error, EOFError, OSError) as e:
+                # Encrypted, unsupported or damaged entries
+                logger.warning(f"Could not fingerprint {os.path.basename(zip_path)}: {str(e)}")
+    return plan
+
+def plan_archive(archive_path: str, processor, bulk_cost_seconds: float = DEFAULT_BULK_COST_SECONDS) -> Dict[str, Any]:
+    """Plan an uploaded archive without decompressing it
+
+    ZIPs are planned from their central directory and plain tars from their
+    headers. Compressed tars only list their members once decompressed, so
+    they are planned as generic code of ``COMPRESSION_RATIO_ESTIMATE`` times
+    the compressed size. Archives nested inside are not counted. The format
+    is taken from the name, as it is when the archive is read: a tar whose
+    last member is a ZIP also looks like a ZIP from its trailing bytes.
+    """
+    name = os.path.basename(archive_path)
+    lowered = name.lower()
+    if lowered.endswith(ZIP_SUFFIXES):
+        return plan_zip_file(archive_path, processor, bulk_cost_seconds)
+
+    if lowered.endswith('.tar'):
+        with tarfile.open(archive_path, 'r:') as tar:
+            entries = [(clean_member_name(member.name), member.size) for member in tar.getmembers() if member.isfile()]
+        plan = build_plan(name, entries, processor, bulk_cost_seconds)
+    else:
+        plan = build_plan(name, [], processor, bulk_cost_seconds)
+        estimated_bytes = os.path.getsize(archive_path) * COMPRESSION_RATIO_ESTIMATE
+        kbps, tokens_per_byte = GENERIC_COST
+        seconds = estimated_bytes / (kbps * 1024) + estimated_bytes / (EXTRACT_THROUGHPUT_KBPS * 1024)
+        plan.update({
+            'total_files': None,
+            'total_bytes': estimated_bytes,
+            'estimated_tokens': int(estimated_bytes * tokens_per_byte),
+            'estimated_seconds': round(seconds, 3),
+            'lane': 'bulk' if seconds > bulk_cost_seconds else 'interactive',
+            'estimated_from_size': True
+        })
+
+    plan['fingerprint'] = file_fingerprint(archive_path)
+    return plan
+
+def file_fingerprint(path: str) -> str:
+    """Content fingerprint of a file from its bytes"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+def zip_fingerprint(zip_ref: zipfile.ZipFile, infos: Iterable[zipfile.ZipInfo]) -> str:
+    """Content fingerprint of a ZIP from the paths, sizes and SHA-256 of its entries
+
+    Re-zipping the same files gives the same fingerprint, since timestamps
+    and compression settings are left out. Entries are hashed from their
+    bytes: their CRC-32s can be forged to match another upload's.
+    """
+    digest = hashlib.sha256()
+    for info in sorted(infos, key=lambda info: info.filename):
+        content = hashlib.sha256()
+        with zip_ref.open(info) as member:
+            for chunk in iter(lambda: member.read(1024 * 1024), b''):
+                content.update(chunk)
+        digest.update(f"{info.filename}\0{info.file_size}\0{content.hexdigest()}\n".encode('utf-8', 'surrogateescape'))
+    return f"zip-sha256:{digest.hexdigest()}"
+
+def plan_git_tree(repo_dir: str, processor, revision: str = 'HEAD',
+                  bulk_cost_seconds: float = DEFAULT_BULK_COST_SECONDS) -> Dict[str, Any]:
+    """Plan a repository job from ``git ls-tree -r -l``, without a checkout"""
+    result = subprocess.run(
+        ['git', '-C', repo_dir, 'ls-tree', '-r', '-l', '-z', revision],
+        capture_output=True, timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"git ls-tree failed: {result.stderr.decode('utf-8', 'replace')}")
+
+    plan = build_plan(revision, parse_ls_tree(result.stdout), processor, bulk_cost_seconds)
+
+    result = subprocess.run(
+        ['git', '-C', repo_dir, 'rev-parse', f"{revision}^{{tree}}"],
+        capture_output=True, text=True, timeout=60
+    )
+    # The tree hash identifies the content regardless of commit history
+    plan['fingerprint'] = f"git:{result.stdout.strip()}" if result.returncode == 0 else None
+    return plan
+
+def parse_ls_tree(output: bytes) -> List[Tuple[str, int]]:
+    """Parse ``git ls-tree -r -l -z`` output into (path, size) pairs for blobs"""
+    return [(path, size) for path, size, blob_id in parse_ls_tree_blobs(output)]
+
+def parse_ls_tree_blobs(output: bytes) -> List[Tuple[str, int, str]]:
+    """Parse ``git ls-tree -r -l -z`` output into (path, size, blob id) for blobs"""
+    entries = []
+    for record in output.split(b'\0'):
+        if not record:
+            continue
+        meta, _, path = record.partition(b'\t')
+        fields = meta.split()
+        # Submodules show up as 'commit' entries with no size
+        if len(fields) != 4 or fields[1] != b'blob':
+            continue
+        entries.append((path.decode('utf-8', 'replace'), int(fields[3]), fields[2].decode('ascii')))
+    return entries
+
+def build_plan(source: str, entries: Iterable[Tuple[str, int]], processor,
+               bulk_cost_seconds: float = DEFAULT_BULK_COST_SECONDS) -> Dict[str, Any]:
+    """Route each (path, size) entry and estimate tokens and CPU time for the job
+
+    ``processor`` is the FileProcessor whose routing rules the job will use.
+    """
+    manifest = []
+    handlers = {}
+    languages = {}
+    total_bytes = 0
+    estimated_tokens = 0
+    estimated_seconds = 0.0
+
+    for path, size in entries:
+        route = processor.route_file(path)
+        if route is None:
+            continue
+        handler, language = route
+
+        manifest.append({'path': path, 'size': size, 'handler': handler, 'language': language})
+        handlers[handler] = handlers.get(handler, 0) + 1
+        total_bytes += size
+        seconds = PER_FILE_OVERHEAD + size / (EXTRACT_THROUGHPUT_KBPS * 1024)
+
+        if handler == 'code':
+            kbps, tokens_per_byte = LANGUAGE_COSTS.get(language, GENERIC_COST)
+            tokens = int(size * tokens_per_byte)
+            seconds += size / (kbps * 1024)
+
+            stats = languages.setdefault(language, {
+                'files': 0, 'bytes': 0, 'estimated_tokens': 0, 'estimated_seconds': 0.0
+            })
+            stats['files'] += 1
+            stats['bytes'] += size
+            stats['estimated_tokens'] += tokens
+            stats['estimated_seconds'] += seconds
+            estimated_tokens += tokens
+        elif handler == 'config':
+            seconds += size / (CONFIG_THROUGHPUT_KBPS * 1024)
+
+        estimated_seconds += seconds
+
+    for stats in languages.values():
+        stats['estimated_seconds'] = round(stats['estimated_seconds'], 3)
+
+    return {
+        'source': source,
+        'total_files': len(manifest),
+        'total_bytes': total_bytes,
+        'handlers': handlers,
+        'languages': languages,
+        'estimated_tokens': estimated_tokens,
+        'estimated_seconds': round(estimated_seconds, 3),
+        'lane': 'bulk' if estimated_seconds > bulk_cost_seconds else 'interactive',
+        'manifest': manifest
+    }
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the plan without its per-file manifest, for storing with results"""
+    return {key: value for key, value in plan.items() if key != 'manifest'}
@@ -0,0 +1,352 @@
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lanes in priority order; the weight is a lane's relative share of workers
+DEFAULT_LANE_WEIGHTS = {'interactive': 4, 'bulk': 1}
+
+# Cost charged per task on top of its file size, so many tiny files still count
+TASK_BASE_COST = 4096
+
+# Cost charged for a job's plan and prepare steps
+STEP_COST = 65536
+
+# Job wait-time samples kept per lane for the percentiles in stats()
+WAIT_SAMPLES = 1000
+
+# Finished jobs kept around for status queries
+FINISHED_JOBS_KEPT = 1000
+
+FINAL_STATES = ('done', 'failed', 'cancelled')
+
+class ScheduledJob:
+    """Scheduler bookkeeping for one ProcessingJob"""
+
+    def __init__(self, job_id: str, client_id: str, lane: str, work, on_done: Optional[Callable] = None):
+        self.id = job_id
+        self.client_id = client_id
+        self.lane = lane
+        self.work = work
+        self.on_done = on_done
+        self.pending = deque()
+        self.in_flight = 0
+        self.tasks_total = 0
+        self.tasks_done = 0
+        self.state = 'queued'
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.finalizing = False
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            'job_id': self.id,
+            'client_id': self.client_id,
+            'lane': self.lane,
+            'state': self.state,
+            'tasks_total': self.tasks_total,
+            'tasks_done': self.tasks_done,
+            'wait_seconds': round((self.started_at or now) - self.submitted_at, 3),
+            'run_seconds': round((self.finished_at or now) - self.started_at, 3) if self.started_at else None,
+            'error': (self.result or {}).get('error') if self.state in FINAL_STATES else None
+        }
+
+class JobScheduler:
+    """Run FileProcessor jobs on a worker pool with priority lanes and per-client fairness
+
+    A job (see file_processor.ProcessingJob) is dispatched one step at a
+    time: plan, prepare, then one task per file. Each (client, lane) pair is
+    a flow, and flows are served by start-time weighted fair queuing: a
+    task's cost is its file size, divided by its lane's weight, so a small
+    interactive job is interleaved with bulk jobs instead of waiting behind
+    them. Jobs within a flow take turns, and no client may occupy more than
+    ``client_task_limit`` workers at once.
+    """
+
+    def __init__(self, workers: int = 4, client_task_limit: int = 2,
+                 lane_weights: Optional[Dict[str, float]] = None):
+        self.workers = workers
+        self.client_task_limit = client_task_limit
+        self.lane_weights = dict(lane_weights or DEFAULT_LANE_WEIGHTS)
+        self._lane_order = {lane: order for order, lane in enumerate(self.lane_weights)}
+
+        self._cond = threading.Condition()
+        self._jobs = {}
+        self._finished = deque()
+        # (client_id, lane) -> jobs with pending tasks, served round-robin
+        self._flows = {}
+        # (client_id, lane) -> virtual time at which the flow's next task starts
+        self._vtime = {}
+        self._virtual_now = 0.0
+        self._client_running = {}
+        self._waits = {lane: deque(maxlen=WAIT_SAMPLES) for lane in self.lane_weights}
+        self._completed = {state: 0 for state in FINAL_STATES}
+        self._threads = []
+        self._stopping = False
+
+    def start(self):
+        """Start the worker threads; called lazily by submit()"""
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"scheduler-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers once their current tasks finish"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def submit(self, job_id: str, client_id: str, work, lane: str = 'interactive',
+               on_done: Optional[Callable[[ScheduledJob], None]] = None) -> ScheduledJob:
+        """Queue a ProcessingJob
+
+        The job moves to the lane its plan selects once the plan step has
+        run. ``on_done`` is called with the job after its result is set and
+        before its final state is published.
+        """
+        job = ScheduledJob(job_id, client_id, lane, work, on_done)
+        job.pending.append((STEP_COST, lambda: self._plan_step(job), True))
+        job.tasks_total = 1
+
+        with self._cond:
+            self._jobs[job_id] = job
+            self._activate(job)
+            self._cond.notify()
+
+        self.start()
+        return job
+
+    def get(self, job_id: str) -> Optional[ScheduledJob]:
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        """Drop a job's queued tasks and ask its running ones to stop, then clean it up
+
+        Work with a ``cancel`` method is told to stop, so a long step such as
+        a clone ends early instead of holding its worker until it finishes.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINAL_STATES or job.cancel_requested:
+                return False
+
+            job.cancel_requested = True
+            job.pending.clear()
+            self._deactivate(job)
+            finalize = job.in_flight == 0 and not job.finalizing
+            if finalize:
+                job.finalizing = True
+
+        stop = getattr(job.work, 'cancel', None)
+        if stop is not None:
+            stop()
+        if finalize:
+            self._finalize(job)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running work and job wait-time percentiles per lane"""
+        with self._cond:
+            lanes = {lane: {'queued_jobs': 0, 'running_jobs': 0, 'pending_tasks': 0}
+                     for lane in self.lane_weights}
+            for job in self._jobs.values():
+                if job.state in FINAL_STATES:
+                    continue
+                lane = lanes.setdefault(job.lane, {'queued_jobs': 0, 'running_jobs': 0, 'pending_tasks': 0})
+                lane['queued_jobs' if job.state == 'queued' else 'running_jobs'] += 1
+                lane['pending_tasks'] += len(job.pending)
+
+            for lane, samples in self._waits.items():
+                lanes[lane]['wait_seconds'] = percentiles(list(samples))
+
+            return {
+                'workers': self.workers,
+                'busy_workers': sum(self._client_running.values()),
+                'queue_depth': sum(lane['pending_tasks'] for lane in lanes.values()),
+                'lanes': lanes,
+                'completed': dict(self._completed)
+            }
+
+    # Pending entries are (cost, task, is_step); only steps return more entries
+
+    def _plan_step(self, job: ScheduledJob) -> List[Tuple[int, Callable, bool]]:
+        plan = job.work.make_plan()
+        # The job has no pending tasks while this runs, so it is in no flow
+        job.lane = plan.get('lane', job.lane)
+        return [(STEP_COST, lambda: self._prepare_step(job), True)]
+
+    def _prepare_step(self, job: ScheduledJob) -> List[Tuple[int, Callable, bool]]:
+        # Work may return (cost, task) pairs or its own (cost, task, is_step) steps
+        return [(entry[0], entry[1], len(entry) > 2 and entry[2]) for entry in job.work.prepare()]
+
+    def _activate(self, job: ScheduledJob):
+        key = (job.client_id, job.lane)
+        jobs = self._flows.get(key)
+        if jobs is None:
+            jobs = self._flows[key] = deque()
+            # A flow that was idle starts at the current virtual time, so it
+            # can't bank credit while idle but keeps any debt it ran up
+            self._vtime[key] = max(self._vtime.get(key, 0.0), self._virtual_now)
+            if len(self._vtime) > 10000:
+                self._prune_vtime()
+        if job not in jobs:
+            jobs.append(job)
+
+    def _deactivate(self, job: ScheduledJob):
+        key = (job.client_id, job.lane)
+        jobs = self._flows.get(key)
+        if jobs is not None and job in jobs:
+            jobs.remove(job)
+            if not jobs:
+                del self._flows[key]
+
+    def _prune_vtime(self):
+        for key in [key for key, vtime in self._vtime.items()
+                    if key not in self._flows and vtime <= self._virtual_now]:
+            del self._vtime[key]
+
+    def _pick(self) -> Optional[Tuple[ScheduledJob, Callable, bool]]:
+        best_key = None
+        best_rank = None
+        for key in self._flows:
+            client_id, lane = key
+            if self._client_running.get(client_id, 0) >= self.client_task_limit:
+                continue
+            rank = (self._vtime[key], self._lane_order.get(lane, len(self._lane_order)))
+            if best_rank is None or rank < best_rank:
+                best_key, best_rank = key, rank
+
+        if best_key is None:
+            return None
+
+        jobs = self._flows[best_key]
+        job = jobs[0]
+        jobs.rotate(-1)
+        cost, task, is_step = job.pending.popleft()
+        if not job.pending:
+            self._deactivate(job)
+
+        self._virtual_now = self._vtime[best_key]
+        self._vtime[best_key] += (TASK_BASE_COST + cost) / self.lane_weights.get(best_key[1], 1)
+        return job, task, is_step
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                picked = None
+                while not self._stopping:
+                    picked = self._pick()
+                    if picked is not None:
+                        break
+                    self._cond.wait()
+                if picked is None:
+                    return
+
+                job, task, is_step = picked
+                job.in_flight += 1
+                self._client_running[job.client_id] = self._client_running.get(job.client_id, 0) + 1
+                if job.started_at is None:
+                    job.started_at = time.monotonic()
+                    job.state = 'running'
+
+            follow_ups, error = None, None
+            try:
+                follow_ups = task()
+                if not is_step:
+                    follow_ups = None
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                job.in_flight -= 1
+                job.tasks_done += 1
+                if job.tasks_done == 1:
+                    # Recorded once the plan has put the job in its lane
+                    self._waits.setdefault(job.lane, deque(maxlen=WAIT_SAMPLES)).append(
+                        job.started_at - job.submitted_at)
+                running = self._client_running[job.client_id] - 1
+                if running:
+                    self._client_running[job.client_id] = running
+                else:
+                    del self._client_running[job.client_id]
+
+                if error is not None:
+                    # Fail fast: drop the rest of the job
+                    if job.error is None:
+                        job.error = error
+                    job.pending.clear()
+                    self._deactivate(job)
+                elif follow_ups and not job.cancel_requested and job.error is None:
+                    job.pending.extend(follow_ups)
+                    job.tasks_total += len(follow_ups)
+                    self._activate(job)
+
+                finalize = job.in_flight == 0 and not job.pending and not job.finalizing
+                if finalize:
+                    job.finalizing = True
+                self._cond.notify_all()
+
+            if finalize:
+                self._finalize(job)
+
+    def _finalize(self, job: ScheduledJob):
+        if job.cancel_requested:
+            result, state = {'success': False, 'error': 'Job cancelled'}, 'cancelled'
+        elif job.error is not None:
+            result, state = job.work.error_result(job.error), 'failed'
+        else:
+            try:
+                result, state = job.work.finish(), 'done'
+            except Exception as e:
+                result, state = job.work.error_result(e), 'failed'
+
+        try:
+            job.work.cleanup()
+        except Exception as e:
+            logger.error(f"Error cleaning up job {job.id}: {str(e)}")
+
+        job.result = result
+        if job.on_done:
+            try:
+                job.on_done(job)
+            except Exception as e:
+                logger.error(f"Error in completion callback for job {job.id}: {str(e)}")
+
+        with self._cond:
+            job.state = state
+            job.finished_at = time.monotonic()
+            self._completed[state] += 1
+            self._finished.append(job.id)
+            while len(self._finished) > FINISHED_JOBS_KEPT:
+                self._jobs.pop(self._finished.popleft(), None)
+        job.done.set()
+
+def percentiles(samples: List[float]) -> Dict[str, Any]:
+    """Nearest-rank p50/p95/p99 of a list of durations in seconds"""
+    if not samples:
+        return {'count': 0, 'p50': None, 'p95': None, 'p99': None}
+    samples = sorted(samples)
+
+    def rank(p):
+        return round(samples[min(len(samples) - 1, max(0, int(-(-p * len(samples) // 100)) - 1))], 3)
+
+    return {'count': len(samples), 'p50': rank(50), 'p95': rank(95), 'p99': rank(99)}
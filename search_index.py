@@ -0,0 +1,514 @@
+import os
+import re
+import json
+import mmap
+import glob
+import heapq
+import shutil
+import bisect
+import logging
+import weakref
+import argparse
+import threading
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock (Windows) only one process may write to an index
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Only tokens with a word character are indexed; punctuation would only add
+# huge postings lists nobody searches for
+INDEXABLE_TOKEN = re.compile(r'\w')
+MAX_TERM_LENGTH = 128
+
+# One sparse term index entry is kept in memory per TERM_INDEX_INTERVAL terms
+TERM_INDEX_INTERVAL = 64
+
+# Once there are more than MAX_SEGMENTS segments, the MERGE_FACTOR smallest
+# are merged into one
+MAX_SEGMENTS = 10
+MERGE_FACTOR = 8
+
+# A postings list this many times longer than the current matches is probed
+# by binary search instead of being loaded into a dict
+PROBE_RATIO = 16
+
+MANIFEST_FILE = 'manifest.json'
+
+# Held by the process that is adding or merging segments
+WRITE_LOCK_FILE = 'write.lock'
+
+def encode_term(term: str) -> str:
+    """Sort and lookup key of a term; ASCII-only, so it never contains a tab or newline"""
+    return json.dumps(term)
+
+def indexable_counts(tokens: Iterable[str]) -> Counter:
+    return Counter(token for token in tokens
+                   if len(token) <= MAX_TERM_LENGTH and INDEXABLE_TOKEN.search(token))
+
+class SegmentBuilder:
+    """Per-file term counts for one job, collected until the job is committed"""
+
+    def __init__(self):
+        self.docs = []
+        self._lock = threading.Lock()
+
+    def add(self, path: str, tokens: Iterable[str]):
+        counts = indexable_counts(tokens)
+        if counts:
+            with self._lock:
+                self.docs.append((path, counts))
+
+class SegmentWriter:
+    """Write one segment directory; it only appears under its name once closed
+
+    A segment holds:
+    - docs.jsonl / docs.idx: [session_id, path] per document, and line offsets
+    - terms.tsv: sorted "<term key>\\t<postings offset>\\t<doc count>" lines
+    - terms.idx.json: every TERM_INDEX_INTERVAL-th term key and its line offset
+    - postings.bin: per term, doc ids then counts, as native uint32 arrays
+    - meta.json: document and term counts and the sessions in the segment
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+
+        self._docs = open(os.path.join(self.tmp_path, 'docs.jsonl'), 'wb')
+        self._terms = open(os.path.join(self.tmp_path, 'terms.tsv'), 'wb')
+        self._postings = open(os.path.join(self.tmp_path, 'postings.bin'), 'wb')
+        self._doc_offsets = array('Q')
+        self._term_index = []
+        self._postings_offset = 0
+        self.doc_count = 0
+        self.term_count = 0
+
+    def add_doc(self, session_id: str, path: str) -> int:
+        return self.add_doc_line((json.dumps([session_id, path]) + '\n').encode('utf-8'))
+
+    def add_doc_line(self, line: bytes) -> int:
+        self._doc_offsets.append(self._docs.tell())
+        self._docs.write(line)
+        self.doc_count += 1
+        return self.doc_count - 1
+
+    def add_term(self, key: str, doc_ids: array, counts: array):
+        """Add a term's postings; terms must arrive in key order"""
+        if self.term_count % TERM_INDEX_INTERVAL == 0:
+            self._term_index.append([key, self._terms.tell()])
+        self._terms.write(f"{key}\t{self._postings_offset}\t{len(doc_ids)}\n".encode('ascii'))
+        doc_ids.tofile(self._postings)
+        counts.tofile(self._postings)
+        self._postings_offset += (len(doc_ids) + len(counts)) * doc_ids.itemsize
+        self.term_count += 1
+
+    def close(self, sessions: Dict[str, Optional[str]]):
+        for f in (self._docs, self._terms, self._postings):
+            f.close()
+        with open(os.path.join(self.tmp_path, 'docs.idx'), 'wb') as f:
+            self._doc_offsets.tofile(f)
+        with open(os.path.join(self.tmp_path, 'terms.idx.json'), 'w') as f:
+            json.dump(self._term_index, f)
+        with open(os.path.join(self.tmp_path, 'meta.json'), 'w') as f:
+            json.dump({'docs': self.doc_count, 'terms': self.term_count, 'sessions': sessions}, f)
+        os.rename(self.tmp_path, self.path)
+
+def _close_segment_files(postings, files):
+    if isinstance(postings, mmap.mmap):
+        postings.close()
+    for f in files:
+        f.close()
+
+class Segment:
+    """A read-only segment opened for queries and merges"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(path, 'terms.idx.json')) as f:
+            self._term_index = json.load(f)
+        self._index_keys = [key for key, offset in self._term_index]
+
+        self._doc_offsets = array('Q')
+        with open(os.path.join(path, 'docs.idx'), 'rb') as f:
+            self._doc_offsets.frombytes(f.read())
+
+        # Opened up front so a merge removing the directory can't break readers
+        self._terms = open(os.path.join(path, 'terms.tsv'), 'rb')
+        self._docs = open(os.path.join(path, 'docs.jsonl'), 'rb')
+        self._postings_file = open(os.path.join(path, 'postings.bin'), 'rb')
+        size = os.fstat(self._postings_file.fileno()).st_size
+        self._postings = mmap.mmap(self._postings_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._lock = threading.Lock()
+        # Searches may still hold a segment the manifest has dropped, so its
+        # files are closed once the last reference goes, or by close()
+        self._closer = weakref.finalize(self, _close_segment_files, self._postings,
+                                        (self._terms, self._docs, self._postings_file))
+
+    @property
+    def doc_count(self) -> int:
+        return self.meta['docs']
+
+    def close(self):
+        self._closer()
+
+    def postings(self, offset: int, doc_count: int) -> Tuple[array, array]:
+        doc_ids, counts = array('I'), array('I')
+        size = doc_count * doc_ids.itemsize
+        doc_ids.frombytes(self._postings[offset:offset + size])
+        counts.frombytes(self._postings[offset + size:offset + 2 * size])
+        return doc_ids, counts
+
+    def lookup(self, term: str) -> Optional[Tuple[array, array]]:
+        """Sorted doc ids and counts of a term, or None if it isn't in this segment"""
+        key = encode_term(term)
+        block = bisect.bisect_right(self._index_keys, key) - 1
+        if block < 0:
+            return None
+
+        with self._lock:
+            self._terms.seek(self._term_index[block][1])
+            for _ in range(TERM_INDEX_INTERVAL):
+                line = self._terms.readline()
+                if not line:
+                    break
+                line_key, offset, doc_count = line.decode('ascii').rstrip('\n').split('\t')
+                if line_key == key:
+                    return self.postings(int(offset), int(doc_count))
+                if line_key > key:
+                    break
+        return None
+
+    def iter_terms(self) -> Iterator[Tuple[str, int, int]]:
+        """(key, postings offset, doc count) for every term, in key order"""
+        with open(os.path.join(self.path, 'terms.tsv'), 'rb') as f:
+            for line in f:
+                key, offset, doc_count = line.decode('ascii').rstrip('\n').split('\t')
+                yield key, int(offset), int(doc_count)
+
+    def iter_doc_lines(self) -> Iterator[bytes]:
+        with open(os.path.join(self.path, 'docs.jsonl'), 'rb') as f:
+            yield from f
+
+    def doc(self, doc_id: int) -> Tuple[str, str]:
+        """(session_id, path) of a document"""
+        with self._lock:
+            self._docs.seek(self._doc_offsets[doc_id])
+            session_id, path = json.loads(self._docs.readline())
+        return session_id, path
+
+    def search(self, terms: List[str], limit: int) -> Tuple[int, List[Tuple[int, int, List[int]]]]:
+        """Count the documents containing all terms and return the top (score, doc id, counts)"""
+        postings = []
+        for term in terms:
+            found = self.lookup(term)
+            if found is None:
+                return 0, []
+            postings.append(found)
+
+        # Start from the rarest term. Much longer lists are probed by binary
+        # search; comparable ones are intersected as dicts, which runs in C
+        order = sorted(range(len(terms)), key=lambda i: len(postings[i][0]))
+        count_maps = [None] * len(terms)
+        count_maps[order[0]] = dict(zip(*postings[order[0]]))
+        matched = count_maps[order[0]].keys()
+
+        for i in order[1:]:
+            doc_ids, counts = postings[i]
+            if len(doc_ids) > PROBE_RATIO * len(matched):
+                found = {}
+                low = 0
+                for doc_id in sorted(matched):
+                    low = bisect.bisect_left(doc_ids, doc_id, low)
+                    if low < len(doc_ids) and doc_ids[low] == doc_id:
+                        found[doc_id] = counts[low]
+            else:
+                found = dict(zip(doc_ids, counts))
+            count_maps[i] = found
+            matched = matched & found.keys()
+            if not matched:
+                return 0, []
+
+        if len(count_maps) == 1:
+            score = count_maps[0].__getitem__
+        else:
+            def score(doc_id):
+                return sum(count_map[doc_id] for count_map in count_maps)
+
+        top = heapq.nlargest(limit, matched, key=score)
+        return len(matched), [(score(doc_id), doc_id, [count_map[doc_id] for count_map in count_maps])
+                              for doc_id in top]
+
+def write_segment(path: str, session_id: str, source_name: Optional[str], builder: SegmentBuilder) -> int:
+    """Invert a job's term counts into a new segment and return its document count"""
+    writer = SegmentWriter(path)
+    postings = {}
+    keys = {}
+
+    for file_path, counts in sorted(builder.docs, key=lambda doc: doc[0]):
+        doc_id = writer.add_doc(session_id, file_path)
+        for term, count in counts.items():
+            key = keys.get(term)
+            if key is None:
+                key = keys[term] = encode_term(term)
+            entry = postings.get(key)
+            if entry is None:
+                entry = postings[key] = (array('I'), array('I'))
+            entry[0].append(doc_id)
+            entry[1].append(count)
+
+    for key in sorted(postings):
+        writer.add_term(key, *postings[key])
+
+    writer.close({session_id: source_name})
+    return writer.doc_count
+
+def merge_segments(sources: List[Segment], path: str) -> int:
+    """Stream several segments into one and return its document count
+
+    Terms are k-way merged from the sorted term files; each source's doc ids
+    are shifted by the documents before it, so postings stay sorted.
+    """
+    writer = SegmentWriter(path)
+    bases = []
+    sessions = {}
+    for segment in sources:
+        bases.append(writer.doc_count)
+        for line in segment.iter_doc_lines():
+            writer.add_doc_line(line)
+        sessions.update(segment.meta['sessions'])
+
+    def tagged_terms(number, segment):
+        for key, offset, doc_count in segment.iter_terms():
+            yield key, number, offset, doc_count
+
+    current_key = None
+    doc_ids, counts = array('I'), array('I')
+    for key, number, offset, doc_count in heapq.merge(*(tagged_terms(n, s) for n, s in enumerate(sources))):
+        if key != current_key:
+            if current_key is not None:
+                writer.add_term(current_key, doc_ids, counts)
+            current_key = key
+            doc_ids, counts = array('I'), array('I')
+
+        source_ids, source_counts = sources[number].postings(offset, doc_count)
+        base = bases[number]
+        if base:
+            doc_ids.extend(doc_id + base for doc_id in source_ids)
+        else:
+            doc_ids.extend(source_ids)
+        counts.extend(source_counts)
+
+    if current_key is not None:
+        writer.add_term(current_key, doc_ids, counts)
+
+    writer.close(sessions)
+    return writer.doc_count
+
+class SearchIndex:
+    """Segmented on-disk inverted index from token to (session, file, count) postings
+
+    Every committed job becomes a small immutable segment listed in
+    manifest.json, which is replaced atomically. Segments are merged in the
+    background of commits once there are too many, and ``compact`` merges
+    them all into one. Writers in other processes, such as other gunicorn
+    workers or the command line, wait on a lock file in the directory.
+    """
+
+    def __init__(self, directory: str, max_segments: int = MAX_SEGMENTS, merge_factor: int = MERGE_FACTOR):
+        self.directory = directory
+        self.max_segments = max_segments
+        self.merge_factor = merge_factor
+        os.makedirs(directory, exist_ok=True)
+
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._segments = {}
+        self._loaded_manifest = None
+
+    @contextmanager
+    def _writing(self):
+        """Hold the write lock of this process and, where flock exists, of the directory"""
+        with self._write_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(self.directory, WRITE_LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'generation': 0, 'segments': []}
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    def _next_segment_path(self, manifest: Dict[str, Any]) -> str:
+        manifest['generation'] += 1
+        return os.path.join(self.directory, f"seg-{manifest['generation']:08d}")
+
+    def add_segment(self, session_id: str, source_name: Optional[str], builder: SegmentBuilder) -> Optional[str]:
+        """Commit one job's postings as a new segment, merging if needed"""
+        if not builder.docs:
+            return None
+
+        with self._writing():
+            manifest = self._read_manifest()
+            path = self._next_segment_path(manifest)
+            doc_count = write_segment(path, session_id, source_name, builder)
+            manifest['segments'].append({'name': os.path.basename(path), 'docs': doc_count})
+            self._write_manifest(manifest)
+
+            if len(manifest['segments']) > self.max_segments:
+                smallest = sorted(manifest['segments'], key=lambda entry: entry['docs'])[:self.merge_factor]
+                self._merge(manifest, smallest)
+
+        return os.path.basename(path)
+
+    def compact(self):
+        """Merge every segment into one"""
+        with self._writing():
+            manifest = self._read_manifest()
+            if len(manifest['segments']) > 1:
+                self._merge(manifest, manifest['segments'])
+
+    def _merge(self, manifest: Dict[str, Any], entries: List[Dict[str, Any]]):
+        names = {entry['name'] for entry in entries}
+        # Keep commit order so older sessions come first in the merged segment
+        sources = [Segment(os.path.join(self.directory, entry['name']))
+                   for entry in manifest['segments'] if entry['name'] in names]
+        try:
+            path = self._next_segment_path(manifest)
+            doc_count = merge_segments(sources, path)
+        finally:
+            for segment in sources:
+                segment.close()
+
+        manifest['segments'] = [entry for entry in manifest['segments'] if entry['name'] not in names]
+        manifest['segments'].append({'name': os.path.basename(path), 'docs': doc_count})
+        self._write_manifest(manifest)
+        logger.info(f"Merged {len(sources)} search index segments into {os.path.basename(path)}")
+
+        for name in names:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def segments(self) -> List[Segment]:
+        """Open segments of the current manifest, reusing ones already open"""
+        with self._read_lock:
+            for attempt in range(3):
+                manifest = self._read_manifest()
+                if manifest == self._loaded_manifest:
+                    break
+                try:
+                    names = [entry['name'] for entry in manifest['segments']]
+                    segments = {name: self._segments.get(name) or Segment(os.path.join(self.directory, name))
+                                for name in names}
+                except FileNotFoundError:
+                    # A merge replaced the manifest while we read it
+                    continue
+
+                # Dropped segments aren't closed here: searches in other
+                # threads may still be reading them
+                self._segments = segments
+                self._loaded_manifest = manifest
+                break
+
+            return list(self._segments.values())
+
+    def indexed_sessions(self) -> Dict[str, Optional[str]]:
+        sessions = {}
+        for segment in self.segments():
+            sessions.update(segment.meta['sessions'])
+        return sessions
+
+    def search(self, query: str, limit: int = 50) -> Dict[str, Any]:
+        """Files containing every whitespace-separated term, most occurrences first"""
+        terms = list(dict.fromkeys(query.split()))
+        if not terms:
+            return {'terms': [], 'total': 0, 'hits': []}
+
+        total = 0
+        matches = []
+        for segment in self.segments():
+            count, top = segment.search(terms, limit)
+            total += count
+            matches.extend((score, segment, doc_id, counts) for score, doc_id, counts in top)
+
+        hits = []
+        for score, segment, doc_id, counts in heapq.nlargest(limit, matches, key=lambda match: match[0]):
+            session_id, path = segment.doc(doc_id)
+            hits.append({
+                'session_id': session_id,
+                'source_name': segment.meta['sessions'].get(session_id),
+                'path': path,
+                'score': score,
+                'counts': dict(zip(terms, counts))
+            })
+
+        return {'terms': terms, 'total': total, 'hits': hits}
+
+def backfill(index: SearchIndex, results_folder: str) -> int:
+    """Index saved results that aren't in the index yet; returns sessions added"""
+    indexed = index.indexed_sessions()
+    added = 0
+
+    for results_file in sorted(glob.glob(os.path.join(results_folder, '*.json'))):
+        # Results are <session_id>.json; sidecars such as <session_id>.index.json
+        # and <session_id>.revisions.json are skipped
+        if '.' in os.path.basename(results_file)[:-len('.json')]:
+            continue
+        with open(results_file, 'r') as f:
+            results = json.load(f)
+        if not isinstance(results, dict):
+            continue
+        session_id = results.get('session_id')
+        if not results.get('success') or not session_id or session_id in indexed:
+            continue
+
+        builder = SegmentBuilder()
+        for files in results['tokenized_files'].get('code_files', {}).values():
+            for file_info in files:
+                builder.add(file_info['path'], file_info.get('tokens', []))
+        if index.add_segment(session_id, results.get('source_name'), builder):
+            added += 1
+
+    return added
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain the token search index")
+    parser.add_argument('--index', default='index', help="Index directory (default: index)")
+    parser.add_argument('--backfill', metavar='RESULTS_FOLDER', help="Index saved results missing from the index")
+    parser.add_argument('--compact', action='store_true', help="Merge all segments into one")
+    args = parser.parse_args()
+
+    search_index = SearchIndex(args.index)
+    if args.backfill:
+        print(f"Indexed {backfill(search_index, args.backfill)} sessions")
+    if args.compact:
+        search_index.compact()
+        print(f"Compacted into {len(search_index.segments())} segment(s)")
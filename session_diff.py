@@ -0,0 +1,295 @@
+import logging
+from typing import Dict, List, Any, Callable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Unchanged tokens shown around each change
+DEFAULT_CONTEXT = 5
+
+# Edit distance past which a file's token diff stops searching and reports
+# the rest as one replacement. Myers' time grows with (tokens x edits) and
+# its trace with edits squared, so a rewritten file can't stall a request
+MAX_EDIT_DISTANCE = 2000
+
+# Opcodes as difflib's: (tag, before start, before end, after start, after end)
+Opcode = Tuple[str, int, int, int, int]
+
+# Status of a file between two sessions
+ADDED = 'added'
+REMOVED = 'removed'
+MODIFIED = 'modified'
+
+def intern_tokens(tokens: List[str], ids: Dict[str, int]) -> List[int]:
+    """Map tokens to integer ids shared by both sides, so comparisons are int compares"""
+    return [ids.setdefault(token, len(ids)) for token in tokens]
+
+def myers_opcodes(a: List[int], b: List[int], max_distance: int = MAX_EDIT_DISTANCE) -> Tuple[List[Opcode], bool]:
+    """Shortest edit script from ``a`` to ``b`` as opcodes, and whether it was cut short
+
+    The common prefix and suffix are trimmed first, so a small change to a
+    large file only searches the part that differs.
+    """
+    start = 0
+    end_a, end_b = len(a), len(b)
+    while start < end_a and start < end_b and a[start] == b[start]:
+        start += 1
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+
+    edits = _shortest_edit(a[start:end_a], b[start:end_b], max_distance)
+    approximate = edits is None
+    if approximate:
+        edits = []
+        if end_a > start:
+            edits.append(('delete', 0, end_a - start, 0, 0))
+        if end_b > start:
+            edits.append(('insert', end_a - start, end_a - start, 0, end_b - start))
+
+    opcodes = []
+    if start:
+        opcodes.append(('equal', 0, start, 0, start))
+    for tag, i1, i2, j1, j2 in edits:
+        _append(opcodes, (tag, i1 + start, i2 + start, j1 + start, j2 + start))
+    if end_a < len(a):
+        _append(opcodes, ('equal', end_a, len(a), end_b, len(b)))
+    return opcodes, approximate
+
+def _shortest_edit(a: List[int], b: List[int], max_distance: int) -> Optional[List[Opcode]]:
+    """Myers' O((N+M)D) greedy algorithm; None if the distance exceeds ``max_distance``"""
+    n, m = len(a), len(b)
+    if not n or not m:
+        return ([('delete', 0, n, 0, 0)] if n else []) + ([('insert', 0, 0, 0, m)] if m else [])
+
+    limit = min(n + m, max_distance)
+    offset = limit + 1
+    v = [0] * (2 * offset + 1)
+    # trace[d] holds v[-d..d] after step d, enough to walk the path back
+    trace = []
+    for d in range(limit + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _backtrack(trace, n, m)
+        trace.append(v[offset - d:offset + d + 1])
+    return None
+
+def _backtrack(trace: List[List[int]], n: int, m: int) -> List[Opcode]:
+    steps = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        previous = trace[d - 1]
+        k = x - y
+        if k == -d or (k != d and previous[k - 1 + d - 1] < previous[k + 1 + d - 1]):
+            prev_k = k + 1
+            prev_x = previous[prev_k + d - 1]
+            prev_y = prev_x - prev_k
+            mid_x, mid_y = prev_x, prev_y + 1
+            edit = ('insert', prev_x, prev_x, prev_y, prev_y + 1)
+        else:
+            prev_k = k - 1
+            prev_x = previous[prev_k + d - 1]
+            prev_y = prev_x - prev_k
+            mid_x, mid_y = prev_x + 1, prev_y
+            edit = ('delete', prev_x, prev_x + 1, prev_y, prev_y)
+        if x > mid_x:
+            steps.append(('equal', mid_x, x, mid_y, y))
+        steps.append(edit)
+        x, y = prev_x, prev_y
+    if x:
+        steps.append(('equal', 0, x, 0, y))
+
+    opcodes = []
+    for step in reversed(steps):
+        _append(opcodes, step)
+    return opcodes
+
+def _append(opcodes: List[Opcode], opcode: Opcode):
+    """Append, merging runs of one tag and adjacent deletes and inserts into replaces"""
+    tag, i1, i2, j1, j2 = opcode
+    if opcodes:
+        last_tag, li1, li2, lj1, lj2 = opcodes[-1]
+        if last_tag == tag or (last_tag in ('delete', 'insert', 'replace') and tag in ('delete', 'insert', 'replace')):
+            merged = tag if last_tag == tag else 'replace'
+            opcodes[-1] = (merged, li1, i2, lj1, j2)
+            return
+    opcodes.append(opcode)
+
+def group_opcodes(opcodes: List[Opcode], context: int = DEFAULT_CONTEXT) -> List[List[Opcode]]:
+    """Split opcodes into hunks with up to ``context`` equal tokens around each change
+
+    The same grouping as difflib.SequenceMatcher.get_grouped_opcodes.
+    """
+    if not opcodes or all(opcode[0] == 'equal' for opcode in opcodes):
+        return []
+    opcodes = list(opcodes)
+    tag, i1, i2, j1, j2 = opcodes[0]
+    if tag == 'equal':
+        opcodes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    tag, i1, i2, j1, j2 = opcodes[-1]
+    if tag == 'equal':
+        opcodes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    groups = []
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal' and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            groups.append(group)
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        groups.append(group)
+    return groups
+
+def common_root(paths: List[str]) -> str:
+    """The top-level directory every path is under, with its slash, or ''"""
+    root = None
+    for path in paths:
+        head = path.split('/', 1)[0] + '/' if '/' in path else ''
+        if not head or (root is not None and head != root):
+            return ''
+        root = head
+    return root or ''
+
+class SessionDiff:
+    """Token-level differences between the code files of two sessions
+
+    ``before`` and ``after`` map paths to file records carrying a token
+    ``digest``; ``load_before`` and ``load_after`` return a record's tokens.
+    Files are matched by path, after stripping a top-level directory that
+    differs between the two sessions (``project-v1/`` and ``project-v2/``).
+    Records with equal digests are skipped without reading their tokens, and
+    token diffs are only computed when a file's entry is asked for.
+    """
+
+    def __init__(self, before: Dict[str, Dict], after: Dict[str, Dict],
+                 load_before: Callable[[Dict], List[str]], load_after: Callable[[Dict], List[str]],
+                 context: int = DEFAULT_CONTEXT):
+        before_root, after_root = common_root(list(before)), common_root(list(after))
+        if before_root != after_root:
+            before = {path[len(before_root):]: record for path, record in before.items()}
+            after = {path[len(after_root):]: record for path, record in after.items()}
+        self.load_before = load_before
+        self.load_after = load_after
+        self.context = context
+
+        self.entries: List[Tuple[str, str, Optional[Dict], Optional[Dict]]] = []
+        self.unchanged = 0
+        for path in sorted(before.keys() | after.keys()):
+            old, new = before.get(path), after.get(path)
+            if old is None:
+                self.entries.append((path, ADDED, None, new))
+            elif new is None:
+                self.entries.append((path, REMOVED, old, None))
+            elif old.get('digest') is None or old.get('digest') != new.get('digest'):
+                self.entries.append((path, MODIFIED, old, new))
+            else:
+                self.unchanged += 1
+
+    def summary(self) -> Dict[str, Any]:
+        counts = {ADDED: 0, REMOVED: 0, MODIFIED: 0}
+        token_delta = 0
+        for path, status, old, new in self.entries:
+            counts[status] += 1
+            token_delta += (new or {}).get('total_tokens', 0) - (old or {}).get('total_tokens', 0)
+        return dict(counts, unchanged=self.unchanged, token_delta=token_delta)
+
+    def find(self, path: str) -> Optional[Tuple[str, str, Optional[Dict], Optional[Dict]]]:
+        for entry in self.entries:
+            if entry[0] == path:
+                return entry
+        return None
+
+    def file_diff(self, entry: Tuple[str, str, Optional[Dict], Optional[Dict]],
+                  max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """A file's token diff as hunks of [op, tokens] changes, op being ' ', '-' or '+'
+
+        With ``max_tokens``, each change lists at most that many tokens and
+        records how many it left out.
+        """
+        path, status, old, new = entry
+        before = self.load_before(old) if old is not None else []
+        after = self.load_after(new) if new is not None else []
+        ids = {}
+        opcodes, approximate = myers_opcodes(intern_tokens(before, ids), intern_tokens(after, ids))
+
+        hunks = []
+        added = removed = 0
+        for group in group_opcodes(opcodes, self.context):
+            changes = []
+            for tag, i1, i2, j1, j2 in group:
+                if tag == 'equal':
+                    changes.append(_change(' ', before[i1:i2], max_tokens))
+                    continue
+                if i2 > i1:
+                    changes.append(_change('-', before[i1:i2], max_tokens))
+                    removed += i2 - i1
+                if j2 > j1:
+                    changes.append(_change('+', after[j1:j2], max_tokens))
+                    added += j2 - j1
+            first, last = group[0], group[-1]
+            before_count, after_count = last[2] - first[1], last[4] - first[3]
+            # As in unified diffs, an empty side starts at the token before the hunk
+            hunks.append({
+                'before_start': first[1] + 1 if before_count else first[1],
+                'before_count': before_count,
+                'after_start': first[3] + 1 if after_count else first[3],
+                'after_count': after_count,
+                'changes': changes
+            })
+
+        record = new or old
+        return {
+            'path': path,
+            'status': status,
+            'language': record.get('language'),
+            'tokens_before': len(before),
+            'tokens_after': len(after),
+            'tokens_added': added,
+            'tokens_removed': removed,
+            'approximate': approximate,
+            'hunks': hunks
+        }
+
+    def iter_text(self, before_name: str, after_name: str) -> Iterator[str]:
+        """The whole diff as text, one token per line in unified diff style"""
+        yield f"# Token diff\n# Before: {before_name}\n# After: {after_name}\n"
+        summary = self.summary()
+        yield (f"# {summary[ADDED]} added, {summary[REMOVED]} removed, {summary[MODIFIED]} modified, "
+               f"{summary['unchanged']} unchanged files\n")
+        for entry in self.entries:
+            path, status, old, new = entry
+            diff = self.file_diff(entry)
+            lines = [f"\ndiff --tokens a/{path} b/{path}\n",
+                     '--- /dev/null\n' if status == ADDED else f"--- a/{path}\n",
+                     '+++ /dev/null\n' if status == REMOVED else f"+++ b/{path}\n"]
+            if diff['approximate']:
+                lines.append('# Too many changes for a minimal diff; shown as a replacement\n')
+            for hunk in diff['hunks']:
+                lines.append(f"@@ -{hunk['before_start']},{hunk['before_count']} "
+                             f"+{hunk['after_start']},{hunk['after_count']} @@\n")
+                for op, tokens in ((change['op'], change['tokens']) for change in hunk['changes']):
+                    lines.extend(f"{op}{escape_token(token)}\n" for token in tokens)
+            yield ''.join(lines)
+
+def _change(op: str, tokens: List[str], max_tokens: Optional[int]) -> Dict[str, Any]:
+    change = {'op': op, 'tokens': tokens}
+    if max_tokens is not None and len(tokens) > max_tokens:
+        change['tokens'] = tokens[:max_tokens]
+        change['omitted'] = len(tokens) - max_tokens
+    return change
+
+def escape_token(token: str) -> str:
+    """A token on one line: backslashes and newlines escaped"""
+    return token.replace('\\', '\\\\').replace('\n', '\\n')
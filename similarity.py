@@ -0,0 +1,324 @@
+import os
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    # Without NumPy only exact-match detection is available
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Tokens per shingle; 5 keeps renamed variables from hiding a copied function
+SHINGLE_SIZE = 5
+
+# MinHash signature length, split into LSH_BANDS bands of NUM_PERM / LSH_BANDS
+# rows. 32 bands of 4 rows make pairs above ~0.42 Jaccard likely candidates
+NUM_PERM = 128
+LSH_BANDS = 32
+
+# Candidate files at or above this estimated Jaccard similarity are near-duplicates
+NEAR_DUPLICATE_THRESHOLD = 0.8
+
+# Prior uploads listed in a report, and near-duplicate files listed with their matches
+REPORTED_UPLOADS = 5
+REPORTED_FILES = 100
+MATCHES_PER_FILE = 3
+
+# LSH buckets holding more signatures than this are skipped: they come from
+# boilerplate (empty modules, licence headers) found in most uploads, and
+# would pair every new file with every earlier copy
+MAX_BUCKET_REFS = 200
+
+# Candidates verified per file or upload, those sharing the most bands first
+CANDIDATES_PER_ROW = 50
+
+# Shingles hashed per MinHash step, bounding the (NUM_PERM x chunk) buffer to 1 MB
+MINHASH_CHUNK = 1024
+
+KIND_UPLOAD = 0
+KIND_FILE = 1
+
+if np is not None:
+    # Multiply-shift hash family: h_i(x) = (a_i * x + b_i) >> 32, with odd a_i
+    _rng = np.random.default_rng(0x5EED)
+    _PERM_A = _rng.integers(1, 2 ** 63, size=(NUM_PERM, 1), dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    _PERM_B = _rng.integers(0, 2 ** 63, size=(NUM_PERM, 1), dtype=np.uint64)
+    _SHINGLE_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+    _BAND_MULTIPLIER = np.uint64(0xC2B2AE3D27D4EB4F)
+
+def numpy_available() -> bool:
+    return np is not None
+
+def shingle_hashes(tokens: List[str]) -> 'np.ndarray':
+    """Distinct 64-bit hashes of every run of SHINGLE_SIZE consecutive tokens"""
+    count = len(tokens)
+    # Hash each distinct token once; most tokens in a file are repeats
+    table = {token: zlib.crc32(token.encode('utf-8', 'surrogatepass')) for token in dict.fromkeys(tokens)}
+    token_hashes = np.fromiter(map(table.__getitem__, tokens), dtype=np.uint64, count=count)
+    if count <= SHINGLE_SIZE:
+        # Short files are a single shingle
+        width = 1
+        windows = count
+    else:
+        width = count - SHINGLE_SIZE + 1
+        windows = SHINGLE_SIZE
+
+    shingles = np.zeros(width, dtype=np.uint64)
+    for offset in range(windows):
+        shingles = shingles * _SHINGLE_MULTIPLIER + token_hashes[offset:offset + width]
+    # splitmix64 finalizer, so neighbouring shingles don't hash alike
+    shingles ^= shingles >> np.uint64(30)
+    shingles *= np.uint64(0xBF58476D1CE4E5B9)
+    shingles ^= shingles >> np.uint64(27)
+    return np.unique(shingles)
+
+def minhash(shingles: 'np.ndarray') -> 'np.ndarray':
+    """NUM_PERM-value MinHash signature (uint32) of a set of shingle hashes"""
+    signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+    buffer = np.empty((NUM_PERM, min(len(shingles), MINHASH_CHUNK)), dtype=np.uint64)
+    for start in range(0, len(shingles), MINHASH_CHUNK):
+        chunk = shingles[start:start + MINHASH_CHUNK]
+        hashed = buffer[:, :len(chunk)]
+        np.multiply(_PERM_A, chunk, out=hashed)
+        hashed += _PERM_B
+        np.minimum(signature, hashed.min(axis=1), out=signature)
+    # The shift is monotonic, so it can be applied to the minimums only
+    return (signature >> np.uint64(32)).astype(np.uint32)
+
+def band_keys(signatures: 'np.ndarray') -> 'np.ndarray':
+    """(n, LSH_BANDS) int64 bucket keys of an (n, NUM_PERM) signature matrix"""
+    rows = signatures.reshape(len(signatures), LSH_BANDS, NUM_PERM // LSH_BANDS).astype(np.uint64)
+    keys = np.zeros(rows.shape[:2], dtype=np.uint64)
+    for row in range(rows.shape[2]):
+        keys = keys * _BAND_MULTIPLIER + rows[:, :, row]
+    return keys.view(np.int64)
+
+def estimate_similarity(signature: 'np.ndarray', others: 'np.ndarray') -> 'np.ndarray':
+    """Estimated Jaccard similarity between one signature and each row of ``others``"""
+    return (others == signature).mean(axis=1)
+
+class SignatureSet:
+    """MinHash signatures of one job's code files, collected as they are tokenized"""
+
+    def __init__(self):
+        self.paths = []
+        self.signatures = []
+        self._lock = threading.Lock()
+
+    def add(self, path: str, tokens: List[str]):
+        if not tokens:
+            return
+        signature = minhash(shingle_hashes(tokens))
+        with self._lock:
+            self.paths.append(path)
+            self.signatures.append(signature)
+
+    def matrix(self) -> 'np.ndarray':
+        with self._lock:
+            if not self.signatures:
+                return np.zeros((0, NUM_PERM), dtype=np.uint32)
+            return np.vstack(self.signatures)
+
+    def upload_signature(self) -> Optional['np.ndarray']:
+        """Signature of the whole upload: the MinHash of a union is the minimum of the parts"""
+        matrix = self.matrix()
+        return matrix.min(axis=0) if len(matrix) else None
+
+class SimilarityIndex:
+    """LSH index of upload and file signatures across sessions, in SQLite
+
+    Each upload is stored with its content fingerprint (for exact matches)
+    and its upload signature; each code file with its own signature. Every
+    signature is bucketed under LSH_BANDS band keys, so finding candidates is
+    an indexed lookup per band rather than a comparison with every upload.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS uploads (
+                    id INTEGER PRIMARY KEY,
+                    session_id TEXT UNIQUE NOT NULL,
+                    source_name TEXT,
+                    fingerprint TEXT,
+                    signature BLOB,
+                    created_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS ix_uploads_fingerprint ON uploads (fingerprint);
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    upload_id INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    signature BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS buckets (
+                    kind INTEGER NOT NULL,
+                    band INTEGER NOT NULL,
+                    key INTEGER NOT NULL,
+                    ref INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS ix_buckets_lookup ON buckets (kind, band, key);
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def sessions_with_fingerprint(self, fingerprint: str) -> List[str]:
+        """Prior sessions whose upload had exactly this content, most recent first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT session_id FROM uploads WHERE fingerprint = ? ORDER BY id DESC", (fingerprint,)
+            ).fetchall()
+        return [session_id for (session_id,) in rows]
+
+    def add_upload(self, session_id: str, source_name: Optional[str], fingerprint: Optional[str],
+                   signatures: Optional[SignatureSet]) -> Dict[str, Any]:
+        """Report the upload's nearest prior uploads and near-duplicate files, then index it"""
+        started = time.monotonic()
+        exact = self.sessions_with_fingerprint(fingerprint) if fingerprint else []
+
+        upload_signature = None
+        matrix = None
+        if signatures is not None and np is not None:
+            matrix = signatures.matrix()
+            upload_signature = signatures.upload_signature()
+
+        with self._connect() as conn:
+            similar = self._similar_uploads(conn, upload_signature) if upload_signature is not None else []
+            duplicates = self._near_duplicate_files(conn, signatures.paths, matrix) if matrix is not None else []
+
+        with self._write_lock, self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO uploads (session_id, source_name, fingerprint, signature, created_at) VALUES (?, ?, ?, ?, ?)",
+                (session_id, source_name, fingerprint,
+                 upload_signature.tobytes() if upload_signature is not None else None, time.time())
+            )
+            upload_id = cursor.lastrowid
+            if upload_signature is not None:
+                self._insert_buckets(conn, KIND_UPLOAD, [upload_id], upload_signature[np.newaxis, :])
+            if matrix is not None and len(matrix):
+                conn.executemany("INSERT INTO files (upload_id, path, signature) VALUES (?, ?, ?)",
+                                 ((upload_id, path, signature.tobytes())
+                                  for path, signature in zip(signatures.paths, matrix)))
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                self._insert_buckets(conn, KIND_FILE, range(last_id - len(matrix) + 1, last_id + 1), matrix)
+
+        duplicates.sort(key=lambda entry: -entry['matches'][0]['similarity'])
+        return {
+            'exact_matches': exact,
+            'similar_uploads': similar,
+            'near_duplicate_file_count': len(duplicates),
+            'near_duplicate_files': duplicates[:REPORTED_FILES],
+            'seconds': round(time.monotonic() - started, 3)
+        }
+
+    def _insert_buckets(self, conn: sqlite3.Connection, kind: int, refs: Iterable[int], matrix: 'np.ndarray'):
+        keys = band_keys(matrix)
+        conn.executemany(
+            "INSERT INTO buckets (kind, band, key, ref) VALUES (?, ?, ?, ?)",
+            ((kind, band, int(key), ref) for ref, row in zip(refs, keys) for band, key in enumerate(row))
+        )
+
+    def _candidates(self, conn: sqlite3.Connection, kind: int, matrix: 'np.ndarray') -> List[Tuple[int, int]]:
+        """(row in matrix, ref) pairs sharing an LSH bucket, at most CANDIDATES_PER_ROW per row
+
+        Buckets with more than MAX_BUCKET_REFS entries are left out, so the
+        pairs stay bounded however many earlier uploads share a file.
+        """
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS query_bands (row INTEGER, band INTEGER, key INTEGER)")
+        conn.execute("DELETE FROM query_bands")
+        keys = band_keys(matrix)
+        conn.executemany("INSERT INTO query_bands (row, band, key) VALUES (?, ?, ?)",
+                         ((row, band, int(key)) for row, keys_row in enumerate(keys)
+                          for band, key in enumerate(keys_row)))
+        conn.execute("""
+            DELETE FROM query_bands WHERE EXISTS (
+                SELECT 1 FROM buckets b WHERE b.kind = ? AND b.band = query_bands.band AND b.key = query_bands.key
+                LIMIT 1 OFFSET ?
+            )
+        """, (kind, MAX_BUCKET_REFS))
+        return conn.execute("""
+            SELECT row, ref FROM (
+                SELECT q.row, b.ref,
+                       ROW_NUMBER() OVER (PARTITION BY q.row ORDER BY COUNT(*) DESC, b.ref DESC) AS rank
+                FROM query_bands q
+                JOIN buckets b ON b.kind = ? AND b.band = q.band AND b.key = q.key
+                GROUP BY q.row, b.ref
+            ) WHERE rank <= ?
+        """, (kind, CANDIDATES_PER_ROW)).fetchall()
+
+    def _similar_uploads(self, conn: sqlite3.Connection, signature: 'np.ndarray') -> List[Dict[str, Any]]:
+        refs = [ref for row, ref in self._candidates(conn, KIND_UPLOAD, signature[np.newaxis, :])]
+        if not refs:
+            return []
+
+        rows = conn.execute(
+            f"SELECT session_id, source_name, signature FROM uploads WHERE id IN ({','.join('?' * len(refs))})", refs
+        ).fetchall()
+        others = np.vstack([np.frombuffer(blob, dtype=np.uint32) for _, _, blob in rows])
+        scores = estimate_similarity(signature, others)
+
+        ranked = sorted(zip(scores, rows), key=lambda entry: -entry[0])[:REPORTED_UPLOADS]
+        return [{'session_id': session_id, 'source_name': source_name, 'similarity': round(float(score), 3)}
+                for score, (session_id, source_name, blob) in ranked]
+
+    def _near_duplicate_files(self, conn: sqlite3.Connection, paths: List[str],
+                              matrix: 'np.ndarray') -> List[Dict[str, Any]]:
+        if not len(matrix):
+            return []
+        pairs = self._candidates(conn, KIND_FILE, matrix)
+        if not pairs:
+            return []
+
+        # Verify every candidate pair at once against its signature
+        refs = sorted({ref for row, ref in pairs})
+        stored = {}
+        for start in range(0, len(refs), 500):
+            batch = refs[start:start + 500]
+            for file_id, session_id, source_name, path, blob in conn.execute(f"""
+                SELECT f.id, u.session_id, u.source_name, f.path, f.signature
+                FROM files f JOIN uploads u ON u.id = f.upload_id
+                WHERE f.id IN ({','.join('?' * len(batch))})
+            """, batch):
+                stored[file_id] = (session_id, source_name, path, blob)
+
+        rows = np.array([row for row, ref in pairs])
+        others = np.vstack([np.frombuffer(stored[ref][3], dtype=np.uint32) for row, ref in pairs])
+        scores = (matrix[rows] == others).mean(axis=1)
+
+        matches = {}
+        for (row, ref), score in zip(pairs, scores):
+            if score >= NEAR_DUPLICATE_THRESHOLD:
+                session_id, source_name, path, blob = stored[ref]
+                matches.setdefault(row, []).append({
+                    'session_id': session_id,
+                    'source_name': source_name,
+                    'path': path,
+                    'similarity': round(float(score), 3)
+                })
+
+        duplicates = []
+        for row, found in matches.items():
+            found.sort(key=lambda match: -match['similarity'])
+            duplicates.append({'path': paths[row], 'matches': found[:MATCHES_PER_FILE]})
+        return duplicates
@@ -9,6 +9,14 @@ document.addEventListener('DOMContentLoaded', function() {
     const githubForm = document.getElementById('githubForm');
     const githubSubmitBtn = document.getElementById('githubSubmitBtn');
     const githubUrl = document.getElementById('github_url');
+    // Upload types the server can read; see archives.py
+    const ARCHIVE_SUFFIXES = ['.zip', '.jar', '.war', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2',
+                              '.tar.xz', '.txz', '.tar.zst', '.tzst', '.gz', '.bz2', '.xz'];
+
+    // The results page shares this script but has no upload form
+    if (!dropZone) {
+        return;
+    }
 
     // Drag and drop functionality
     dropZone.addEventListener('click', () => fileInput.click());
@@ -30,10 +38,10 @@ document.addEventListener('DOMContentLoaded', function() {
         const files = e.dataTransfer.files;
         if (files.length > 0) {
             const file = files[0];
-            if (file.name.toLowerCase().endsWith('.zip')) {
+            if (ARCHIVE_SUFFIXES.some(suffix => file.name.toLowerCase().endsWith(suffix))) {
                 handleFileSelection(file);
             } else {
-                showAlert('Please select a ZIP file.', 'error');
+                showAlert('Please select a ZIP, tar or compressed tar archive.', 'error');
             }
         }
     });
@@ -84,11 +92,11 @@ document.addEventListener('DOMContentLoaded', function() {
     document.getElementById('zipForm').addEventListener('submit', function(e) {
         if (!fileInput.files[0]) {
             e.preventDefault();
-            showAlert('Please select a ZIP file first.', 'error');
+            showAlert('Please select an archive first.', 'error');
             return;
         }
         
-        showProcessingState(zipSubmitBtn, 'Processing ZIP file...');
+        showProcessingState(zipSubmitBtn, 'Processing archive...');
     });
 
     githubForm.addEventListener('submit', function(e) {
@@ -176,3 +184,238 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 });
+
+// Results page: language and file sections are fetched from the results API
+// only when expanded, one page at a time
+document.addEventListener('DOMContentLoaded', function() {
+    const resultsPage = document.getElementById('resultsPage');
+    if (!resultsPage) {
+        return;
+    }
+
+    const filesUrl = resultsPage.dataset.filesUrl;
+    const pageSize = 50;
+
+    document.querySelectorAll('[data-results-group]').forEach(section => {
+        const group = section.dataset.resultsGroup;
+        const total = parseInt(section.dataset.total, 10);
+        const toggle = section.querySelector('.results-toggle');
+        const body = section.querySelector('.results-body');
+        const list = section.querySelector('.results-files');
+        const more = section.querySelector('.results-more');
+        let loaded = 0;
+        let loading = false;
+
+        toggle.addEventListener('click', () => {
+            const hidden = body.style.display === 'none';
+            body.style.display = hidden ? 'block' : 'none';
+            if (hidden && loaded === 0) {
+                loadPage();
+            }
+        });
+
+        more.addEventListener('click', loadPage);
+
+        function loadPage() {
+            if (loading || (loaded > 0 && loaded >= total)) {
+                return;
+            }
+            loading = true;
+            more.disabled = true;
+
+            const params = new URLSearchParams({lang: group, offset: loaded, limit: pageSize});
+            fetch(`${filesUrl}?${params}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    data.files.forEach(file => list.appendChild(renderFile(file, data.kind)));
+                    loaded += data.files.length;
+                    more.style.display = loaded < data.total ? 'inline-block' : 'none';
+                })
+                .catch(error => {
+                    const message = document.createElement('div');
+                    message.className = 'text-danger small';
+                    message.textContent = `Could not load files: ${error.message}`;
+                    list.appendChild(message);
+                })
+                .finally(() => {
+                    loading = false;
+                    more.disabled = false;
+                });
+        }
+    });
+
+    function element(tag, className, text) {
+        const el = document.createElement(tag);
+        if (className) {
+            el.className = className;
+        }
+        if (text !== undefined) {
+            el.textContent = text;
+        }
+        return el;
+    }
+
+    function renderFile(file, kind) {
+        if (kind === 'code') {
+            return renderCodeFile(file);
+        }
+
+        const column = element('div', kind === 'config_files' ? 'col-md-6 mb-3' : 'col-md-4 mb-3');
+        const card = element('div', 'card');
+        const body = element('div', 'card-body');
+        body.appendChild(element('h6', 'card-title', file.name));
+
+        const details = element('small', 'text-muted');
+        details.textContent = kind === 'config_files'
+            ? `Size: ${file.size} bytes | Lines: ${file.lines} | Path: ${file.path}`
+            : `Size: ${file.size} bytes | Path: ${file.path}`;
+        const text = element('p', 'card-text');
+        text.appendChild(details);
+        body.appendChild(text);
+
+        if (kind === 'config_files' && file.content) {
+            const pre = element('pre', 'bg-secondary p-2 rounded');
+            pre.style.maxHeight = '150px';
+            pre.style.overflowY = 'auto';
+            pre.appendChild(element('code', null, file.content));
+            body.appendChild(pre);
+        }
+
+        card.appendChild(body);
+        column.appendChild(card);
+        return column;
+    }
+
+    function renderCodeFile(file) {
+        const column = element('div', 'col-xl-6 mb-3');
+        const card = element('div', 'card bg-dark');
+
+        const header = element('div', 'card-header');
+        const title = element('h6', 'mb-0');
+        title.appendChild(element('i', 'fas fa-file me-2'));
+        title.appendChild(document.createTextNode(file.path || file.name));
+        title.appendChild(element('small', 'text-muted ms-2', `(${file.size} bytes, ${file.lines} lines)`));
+        header.appendChild(title);
+        card.appendChild(header);
+
+        const body = element('div', 'card-body');
+        const stats = element('div', 'mb-3');
+        stats.appendChild(element('h6', null, 'Token Statistics:'));
+        const tokenTypes = file.token_types || {};
+        const counts = element('div', 'row');
+        const totalCol = element('div', 'col-6');
+        totalCol.appendChild(element('small', 'text-info', `Total Tokens: ${file.total_tokens}`));
+        const typesCol = element('div', 'col-6');
+        typesCol.appendChild(element('small', 'text-warning', `Types: ${Object.keys(tokenTypes).length}`));
+        counts.appendChild(totalCol);
+        counts.appendChild(typesCol);
+        stats.appendChild(counts);
+
+        const badges = element('div', 'mt-2');
+        Object.entries(tokenTypes).forEach(([type, count]) => {
+            badges.appendChild(element('span', 'badge bg-secondary me-1', `${type}: ${count}`));
+        });
+        stats.appendChild(badges);
+        body.appendChild(stats);
+
+        const preview = element('div');
+        preview.appendChild(element('h6', null, 'Tokenized Text Preview:'));
+        const container = element('div', 'token-container bg-dark p-3 rounded');
+        container.style.maxHeight = '300px';
+        container.style.overflowY = 'auto';
+        const pre = element('pre', 'text-info mb-0', file.token_preview || '');
+        pre.style.whiteSpace = 'pre-wrap';
+        pre.style.fontFamily = 'monospace';
+        pre.style.fontSize = '0.85rem';
+        container.appendChild(pre);
+        preview.appendChild(container);
+        preview.appendChild(element('small', 'text-muted mt-2 d-block',
+            'Showing first 200 tokens. Download full tokenized text using the button above.'));
+        body.appendChild(preview);
+
+        card.appendChild(body);
+        column.appendChild(card);
+        return column;
+    }
+});
+
+// Job page: poll the job until it finishes, then open its results
+document.addEventListener('DOMContentLoaded', function() {
+    const jobPage = document.getElementById('jobPage');
+    if (!jobPage) {
+        return;
+    }
+
+    const state = document.getElementById('jobState');
+    const lane = document.getElementById('jobLane');
+    const progress = document.getElementById('jobProgress');
+    const detail = document.getElementById('jobDetail');
+    const error = document.getElementById('jobError');
+    const cancel = document.getElementById('jobCancel');
+
+    function showError(message) {
+        error.textContent = message;
+        error.style.display = 'block';
+        cancel.disabled = true;
+        progress.classList.remove('progress-bar-animated');
+    }
+
+    function render(status) {
+        state.textContent = status.state;
+        if (status.lane) {
+            lane.textContent = status.lane + ' lane';
+        }
+
+        if (status.state === 'done' || status.state === 'failed') {
+            // Failed jobs still have a results page explaining the error
+            window.location.href = jobPage.dataset.resultsUrl;
+            return false;
+        }
+        if (status.state === 'cancelled') {
+            showError('The job was cancelled.');
+            return false;
+        }
+
+        if (status.state === 'queued') {
+            detail.textContent = `Waiting for a worker (${status.wait_seconds}s)...`;
+        } else if (status.tasks_total > 0) {
+            const percent = Math.round(100 * status.tasks_done / status.tasks_total);
+            progress.style.width = percent + '%';
+            detail.textContent = `${status.tasks_done} of ${status.tasks_total} tasks done`;
+        }
+        return true;
+    }
+
+    function poll() {
+        fetch(jobPage.dataset.statusUrl)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('Job not found or expired');
+                }
+                return response.json();
+            })
+            .then(status => {
+                if (render(status)) {
+                    setTimeout(poll, 1000);
+                }
+            })
+            .catch(err => showError(err.message));
+    }
+
+    cancel.addEventListener('click', () => {
+        cancel.disabled = true;
+        fetch(jobPage.dataset.cancelUrl, { method: 'POST' })
+            .then(response => {
+                if (!response.ok) {
+                    cancel.disabled = false;
+                }
+            });
+    });
+
+    poll();
+});
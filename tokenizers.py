@@ -1,82 +1,60 @@
 import tokenize
 import io
 import re
+import time
 import logging
-from typing import Dict, List, Any
+from collections import Counter
+from typing import Dict, List, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# Tokenizer loops compare against their deadline once per this many tokens
+DEADLINE_CHECK_INTERVAL = 1024
+
+# Default watchdog budget: a fixed allowance plus seconds per MB of input
+DEFAULT_TIME_BUDGET = 2.0
+TIME_BUDGET_PER_MB = 10.0
+
+class TokenizationTimeout(Exception):
+    """Raised when a tokenizer runs past its watchdog deadline"""
+
 class CodeTokenizer:
     """Base class for code tokenizers"""
     
-    def tokenize(self, content: str, filename: str) -> Dict[str, Any]:
-        """Tokenize content and return structured data"""
+    def tokenize(self, content: str, filename: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Tokenize content and return structured data
+
+        ``deadline`` is a ``time.monotonic()`` timestamp; once it has passed
+        the tokenizer raises TokenizationTimeout instead of finishing.
+        """
         raise NotImplementedError
 
-class PythonTokenizer(CodeTokenizer):
-    """Python code tokenizer using built-in tokenize module"""
-    
-    def tokenize(self, content: str, filename: str) -> Dict[str, Any]:
-        try:
-            tokens = []
-            token_types = {}
-            
-            # Create a StringIO object from the content
-            content_io = io.StringIO(content)
-            
-            # Tokenize the Python code
-            for tok in tokenize.generate_tokens(content_io.readline):
-                # Only keep the actual token string, not the type
-                if tok.string.strip():  # Skip empty/whitespace-only tokens
-                    tokens.append(tok.string)
-                
-                # Count token types for statistics
-                token_type = tokenize.tok_name[tok.type]
-                token_types[token_type] = token_types.get(token_type, 0) + 1
-            
-            return {
-                'success': True,
-                'tokens': tokens,
-                'token_types': token_types,
-                'total_tokens': len(tokens),
-                'filename': filename
-            }
-            
-        except Exception as e:
-            logger.error(f"Error tokenizing Python file {filename}: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'filename': filename
-            }
+class RegexTokenizer(CodeTokenizer):
+    """Tokenizer that tries an ordered list of regex patterns at each position
+
+    Subclasses provide ``token_patterns``. Each pattern must either match or
+    fail within a bounded scan so the overall pass stays linear.
+    """
+
+    language = ''
+    token_patterns: List = []
 
-class JavaTokenizer(CodeTokenizer):
-    """Java code tokenizer using regex patterns"""
-    
     def __init__(self):
-        # Java token patterns
-        self.token_patterns = [
-            ('COMMENT', r'//.*?$|/\*.*?\*/'),
-            ('STRING', r'"([^"\\]|\\.)*"'),
-            ('CHAR', r"'([^'\\]|\\.)*'"),
-            ('NUMBER', r'\b\d+\.?\d*\b'),
-            ('KEYWORD', r'\b(abstract|assert|boolean|break|byte|case|catch|char|class|const|continue|default|do|double|else|enum|extends|final|finally|float|for|goto|if|implements|import|instanceof|int|interface|long|native|new|null|package|private|protected|public|return|short|static|strictfp|super|switch|synchronized|this|throw|throws|transient|try|void|volatile|while)\b'),
-            ('IDENTIFIER', r'\b[a-zA-Z_]\w*\b'),
-            ('OPERATOR', r'[+\-*/%=<>!&|^~?:]+'),
-            ('DELIMITER', r'[(){}\[\];,.@]'),
-            ('WHITESPACE', r'\s+'),
-        ]
-        
-        self.compiled_patterns = [(name, re.compile(pattern, re.MULTILINE | re.DOTALL)) 
+        self.compiled_patterns = [(name, re.compile(pattern, re.MULTILINE | re.DOTALL))
                                  for name, pattern in self.token_patterns]
-    
-    def tokenize(self, content: str, filename: str) -> Dict[str, Any]:
+
+    def tokenize(self, content: str, filename: str, deadline: Optional[float] = None) -> Dict[str, Any]:
         try:
             tokens = []
             token_types = {}
             pos = 0
+            steps = 0
             
             while pos < len(content):
+                steps += 1
+                if deadline is not None and steps % DEADLINE_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+                    raise TokenizationTimeout(f"Tokenizing {filename} exceeded its time budget")
+
                 matched = False
                 
                 for token_type, pattern in self.compiled_patterns:
@@ -103,61 +81,40 @@ class JavaTokenizer(CodeTokenizer):
                 'filename': filename
             }
             
+        except TokenizationTimeout:
+            raise
         except Exception as e:
-            logger.error(f"Error tokenizing Java file {filename}: {str(e)}")
+            kind = f"{self.language} file" if self.language else "file"
+            logger.error(f"Error tokenizing {kind} {filename}: {str(e)}")
             return {
                 'success': False,
                 'error': str(e),
                 'filename': filename
             }
 
-class JavaScriptTokenizer(CodeTokenizer):
-    """JavaScript code tokenizer using regex patterns"""
-    
-    def __init__(self):
-        # JavaScript token patterns
-        self.token_patterns = [
-            ('COMMENT', r'//.*?$|/\*.*?\*/'),
-            ('REGEX', r'/(?:[^/\\\n]|\\.)+/[gimuy]*'),
-            ('STRING', r'"([^"\\]|\\.)*"|\'([^\'\\]|\\.)*\'|`([^`\\]|\\.)*`'),
-            ('NUMBER', r'\b\d+\.?\d*([eE][+-]?\d+)?\b'),
-            ('KEYWORD', r'\b(async|await|break|case|catch|class|const|continue|debugger|default|delete|do|else|export|extends|finally|for|function|if|import|in|instanceof|let|new|return|super|switch|this|throw|try|typeof|var|void|while|with|yield)\b'),
-            ('BOOLEAN', r'\b(true|false)\b'),
-            ('NULL', r'\bnull\b'),
-            ('UNDEFINED', r'\bundefined\b'),
-            ('IDENTIFIER', r'\b[a-zA-Z_$]\w*\b'),
-            ('OPERATOR', r'[+\-*/%=<>!&|^~?:]+|===|!==|==|!=|<=|>=|&&|\|\||<<|>>|>>>|\+\+|--|\+=|-=|\*=|/=|%=|&=|\|=|\^=|<<=|>>=|>>>='),
-            ('DELIMITER', r'[(){}\[\];,.@]'),
-            ('WHITESPACE', r'\s+'),
-        ]
-        
-        self.compiled_patterns = [(name, re.compile(pattern, re.MULTILINE | re.DOTALL)) 
-                                 for name, pattern in self.token_patterns]
+class PythonTokenizer(CodeTokenizer):
+    """Python code tokenizer using built-in tokenize module"""
     
-    def tokenize(self, content: str, filename: str) -> Dict[str, Any]:
+    def tokenize(self, content: str, filename: str, deadline: Optional[float] = None) -> Dict[str, Any]:
         try:
             tokens = []
             token_types = {}
-            pos = 0
             
-            while pos < len(content):
-                matched = False
-                
-                for token_type, pattern in self.compiled_patterns:
-                    match = pattern.match(content, pos)
-                    if match:
-                        token_string = match.group(0)
-                        
-                        if token_type != 'WHITESPACE' and token_string.strip():
-                            tokens.append(token_string)
-                            token_types[token_type] = token_types.get(token_type, 0) + 1
-                        
-                        pos = match.end()
-                        matched = True
-                        break
+            # Create a StringIO object from the content
+            content_io = io.StringIO(content)
+            
+            # Tokenize the Python code
+            for steps, tok in enumerate(tokenize.generate_tokens(content_io.readline), 1):
+                if deadline is not None and steps % DEADLINE_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+                    raise TokenizationTimeout(f"Tokenizing {filename} exceeded its time budget")
+
+                # Only keep the actual token string, not the type
+                if tok.string.strip():  # Skip empty/whitespace-only tokens
+                    tokens.append(tok.string)
                 
-                if not matched:
-                    pos += 1
+                # Count token types for statistics
+                token_type = tokenize.tok_name[tok.type]
+                token_types[token_type] = token_types.get(token_type, 0) + 1
             
             return {
                 'success': True,
@@ -167,211 +124,415 @@ class JavaScriptTokenizer(CodeTokenizer):
                 'filename': filename
             }
             
+        except TokenizationTimeout:
+            raise
         except Exception as e:
-            logger.error(f"Error tokenizing JavaScript file {filename}: {str(e)}")
+            logger.error(f"Error tokenizing Python file {filename}: {str(e)}")
             return {
                 'success': False,
                 'error': str(e),
                 'filename': filename
             }
 
-class HTMLTokenizer(CodeTokenizer):
-    """HTML tokenizer using regex patterns"""
-    
-    def __init__(self):
-        self.token_patterns = [
-            ('COMMENT', r'<!--.*?-->'),
-            ('DOCTYPE', r'<!DOCTYPE[^>]*>'),
-            ('TAG_OPEN', r'<[a-zA-Z][^>]*>'),
-            ('TAG_CLOSE', r'</[a-zA-Z][^>]*>'),
-            ('TAG_SELF_CLOSE', r'<[a-zA-Z][^>]*/\s*>'),
-            ('ATTRIBUTE', r'\b[a-zA-Z-]+\s*=\s*["\'][^"\']*["\']'),
-            ('TEXT', r'>[^<]+<'),
-            ('WHITESPACE', r'\s+'),
-        ]
-        
-        self.compiled_patterns = [(name, re.compile(pattern, re.MULTILINE | re.DOTALL)) 
-                                 for name, pattern in self.token_patterns]
+class JavaTokenizer(RegexTokenizer):
+    """Java code tokenizer using regex patterns"""
     
-    def tokenize(self, content: str, filename: str) -> Dict[str, Any]:
+    language = 'Java'
+
+    # Comments, strings and chars match to end of input/line when unterminated,
+    # so a stray delimiter cannot trigger a rescan from every later position
+    token_patterns = [
+        ('COMMENT', r'//[^\n]*|/\*.*?(?:\*/|\Z)'),
+        ('STRING', r'"(?:[^"\\\n]|\\.)*"?'),
+        ('CHAR', r"'(?:[^'\\\n]|\\.)*'?"),
+        ('NUMBER', r'\b\d+\.?\d*\b'),
+        ('KEYWORD', r'\b(abstract|assert|boolean|break|byte|case|catch|char|class|const|continue|default|do|double|else|enum|extends|final|finally|float|for|goto|if|implements|import|instanceof|int|interface|long|native|new|null|package|private|protected|public|return|short|static|strictfp|super|switch|synchronized|this|throw|throws|transient|try|void|volatile|while)\b'),
+        ('IDENTIFIER', r'\b[a-zA-Z_]\w*\b'),
+        ('OPERATOR', r'[+\-*/%=<>!&|^~?:]+'),
+        ('DELIMITER', r'[(){}\[\];,.@]'),
+        ('WHITESPACE', r'\s+'),
+    ]
+
+class JavaScriptTokenizer(CodeTokenizer):
+    """JavaScript/TypeScript tokenizer driven by a small lexer state machine.
+
+    A single master pattern is tried per token, and the ambiguous cases are
+    resolved from lexer state instead of pattern order:
+
+    * ``/`` starts a regex literal only where an expression may begin,
+      decided from the previous significant token.
+    * Template literals are split at ``${`` / ``}`` and the substitutions
+      are lexed as code, so nesting is unbounded.
+    * When ``jsx`` is enabled, ``<`` in expression position opens a JSX
+      element whose children are emitted as JSX_TEXT tokens.
+
+    Every pattern consumes input without backtracking across tokens, so
+    tokenization runs in linear time on minified bundles.
+    """
+
+    KEYWORDS = frozenset((
+        'async', 'await', 'break', 'case', 'catch', 'class', 'const', 'continue',
+        'debugger', 'default', 'delete', 'do', 'else', 'export', 'extends',
+        'finally', 'for', 'function', 'if', 'import', 'in', 'instanceof', 'let',
+        'new', 'return', 'super', 'switch', 'this', 'throw', 'try', 'typeof',
+        'var', 'void', 'while', 'with', 'yield',
+    ))
+
+    # Keywords after which an expression is not expected, so ``/`` divides
+    VALUE_KEYWORDS = frozenset(('this', 'super'))
+
+    WORD_TYPES = dict.fromkeys(KEYWORDS, 'KEYWORD')
+    WORD_TYPES.update({'true': 'BOOLEAN', 'false': 'BOOLEAN', 'null': 'NULL', 'undefined': 'UNDEFINED'})
+
+    CODE_PATTERN = re.compile(r'''
+        (?P<WHITESPACE>\s+)
+      | (?P<COMMENT>//[^\n]*|/\*[\s\S]*?(?:\*/|\Z))
+      | (?P<STRING>"(?:[^"\\\n]|\\[\s\S])*"?|'(?:[^'\\\n]|\\[\s\S])*'?)
+      | (?P<NUMBER>0[xX][\da-fA-F_]+n?|0[bB][01_]+n?|0[oO][0-7_]+n?
+          |(?:\d[\d_]*(?:\.[\d_]*)?|\.\d[\d_]*)(?:[eE][+-]?\d+)?n?)
+      | (?P<WORD>[A-Za-z_$\u0080-\uffff][\w$\u0080-\uffff]*)
+      | (?P<OPERATOR>>>>=|\.\.\.|===|!==|\*\*=|<<=|>>=|>>>|&&=|\|\|=|\?\?=
+          |=>|==|!=|<=|>=|&&|\|\||\?\?|\?\.(?!\d)|\+\+|--|\+=|-=|\*=|/=|%=
+          |&=|\|=|\^=|\*\*|<<|>>|[+\-*/%=<>!&|^~?:])
+      | (?P<DELIMITER>[(){}\[\];,.@\#])
+    ''', re.VERBOSE)
+
+    REGEX_PATTERN = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*')
+
+    TEMPLATE_PATTERN = re.compile(r'[`}](?:[^`\\$]|\\[\s\S]|\$(?!\{))*(?P<end>`|\$\{)?')
+
+    JSX_TAG_PATTERN = re.compile(r'''
+        (?P<WHITESPACE>\s+)
+      | (?P<IDENTIFIER>[A-Za-z_$][\w$.:\-]*)
+      | (?P<STRING>"[^"]*"?|'[^']*'?)
+      | (?P<OPERATOR>=)
+    ''', re.VERBOSE)
+
+    JSX_TEXT_PATTERN = re.compile(r'[^<{]+')
+
+    def __init__(self, jsx: bool = True):
+        # Plain TypeScript uses ``<T>`` for generics, so JSX is opt-in per extension
+        self.jsx = jsx
+
+    def tokenize(self, content: str, filename: str, deadline: Optional[float] = None) -> Dict[str, Any]:
         try:
             tokens = []
-            token_types = {}
+            kinds = []
+            add_token = tokens.append
+            add_kind = kinds.append
+
+            def emit(token_type, token_string):
+                add_token(token_string)
+                add_kind(token_type)
+
+            code_match = self.CODE_PATTERN.match
+            word_types = self.WORD_TYPES
+            value_keywords = self.VALUE_KEYWORDS
+            value_delimiters = (')', ']', '.')
+
+            # Each frame is [mode, state]: 'code' tracks its brace depth, 'jsx_tag'
+            # records whether it is a closing tag, the others carry no state.
+            stack = [['code', 0]]
+            regex_allowed = True
+            regex_blocked_until = 0
             pos = 0
-            
-            while pos < len(content):
-                matched = False
-                
-                for token_type, pattern in self.compiled_patterns:
-                    match = pattern.match(content, pos)
-                    if match:
-                        token_string = match.group(0)
-                        
-                        if token_type != 'WHITESPACE' and token_string.strip():
-                            tokens.append(token_string)
-                            token_types[token_type] = token_types.get(token_type, 0) + 1
-                        
+            steps = 0
+            length = len(content)
+
+            while pos < length:
+                steps += 1
+                if deadline is not None and steps % DEADLINE_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+                    raise TokenizationTimeout(f"Tokenizing {filename} exceeded its time budget")
+
+                frame = stack[-1]
+                mode = frame[0]
+
+                if mode == 'template':
+                    match = self.TEMPLATE_PATTERN.match(content, pos)
+                    emit('TEMPLATE', match.group(0))
+                    pos = match.end()
+                    if match.group('end') == '${':
+                        stack.append(['code', 0])
+                        regex_allowed = True
+                    else:
+                        stack.pop()
+                        regex_allowed = False
+                    continue
+
+                if mode == 'jsx_children':
+                    if content.startswith('</', pos):
+                        stack[-1] = ['jsx_tag', True]
+                        emit('DELIMITER', '</')
+                        pos += 2
+                    elif content[pos] == '<':
+                        stack.append(['jsx_tag', False])
+                        emit('DELIMITER', '<')
+                        pos += 1
+                    elif content[pos] == '{':
+                        stack.append(['code', 0])
+                        emit('DELIMITER', '{')
+                        regex_allowed = True
+                        pos += 1
+                    else:
+                        match = self.JSX_TEXT_PATTERN.match(content, pos)
+                        text = match.group(0).strip()
+                        if text:
+                            emit('JSX_TEXT', text)
                         pos = match.end()
-                        matched = True
-                        break
-                
-                if not matched:
+                    continue
+
+                if mode == 'jsx_tag':
+                    char = content[pos]
+                    if content.startswith('/>', pos) or char == '>':
+                        closing = frame[1]
+                        stack.pop()
+                        if char == '>' and not closing:
+                            stack.append(['jsx_children', None])
+                        width = 1 if char == '>' else 2
+                        emit('DELIMITER', content[pos:pos + width])
+                        pos += width
+                        regex_allowed = False
+                    elif char == '{':
+                        stack.append(['code', 0])
+                        emit('DELIMITER', '{')
+                        regex_allowed = True
+                        pos += 1
+                    else:
+                        match = self.JSX_TAG_PATTERN.match(content, pos)
+                        if match:
+                            if match.lastgroup != 'WHITESPACE':
+                                emit(match.lastgroup, match.group(0))
+                            pos = match.end()
+                        else:
+                            pos += 1
+                    continue
+
+                char = content[pos]
+
+                if char in '`}/<':
+                    if char == '`':
+                        stack.append(['template', None])
+                        continue
+
+                    if char == '}' and frame[1] == 0 and len(stack) > 1:
+                        stack.pop()
+                        if stack[-1][0] == 'template':
+                            # The closing brace starts the next template chunk
+                            continue
+                        emit('DELIMITER', '}')
+                        pos += 1
+                        regex_allowed = False
+                        continue
+
+                    if char == '/' and regex_allowed and pos >= regex_blocked_until:
+                        match = self.REGEX_PATTERN.match(content, pos)
+                        if match:
+                            emit('REGEX', match.group(0))
+                            pos = match.end()
+                            regex_allowed = False
+                            continue
+                        # Regex literals cannot span lines: after a failed scan the
+                        # line is invalid anyway, so don't rescan it from every '/'
+                        regex_blocked_until = content.find('\n', pos) % (length + 1)
+
+                    if (char == '<' and regex_allowed and self.jsx and pos + 1 < length
+                            and (content[pos + 1].isalpha() or content[pos + 1] == '>')):
+                        stack.append(['jsx_tag', False])
+                        emit('DELIMITER', '<')
+                        pos += 1
+                        continue
+
+                match = code_match(content, pos)
+                if not match:
                     pos += 1
-            
+                    continue
+
+                token_type = match.lastgroup
+                token_string = match.group(0)
+                pos = match.end()
+
+                if token_type == 'WHITESPACE':
+                    continue
+
+                if token_type == 'WORD':
+                    token_type = word_types.get(token_string, 'IDENTIFIER')
+                    regex_allowed = token_type == 'KEYWORD' and token_string not in value_keywords
+                elif token_type == 'OPERATOR':
+                    regex_allowed = token_string != '++' and token_string != '--'
+                elif token_type == 'DELIMITER':
+                    if token_string == '{':
+                        frame[1] += 1
+                    elif token_string == '}' and frame[1] > 0:
+                        frame[1] -= 1
+                    regex_allowed = token_string not in value_delimiters
+                elif token_type != 'COMMENT':
+                    regex_allowed = False
+
+                add_token(token_string)
+                add_kind(token_type)
+
             return {
                 'success': True,
                 'tokens': tokens,
-                'token_types': token_types,
+                'token_types': dict(Counter(kinds)),
                 'total_tokens': len(tokens),
                 'filename': filename
             }
-            
+
+        except TokenizationTimeout:
+            raise
         except Exception as e:
-            logger.error(f"Error tokenizing HTML file {filename}: {str(e)}")
+            logger.error(f"Error tokenizing JavaScript file {filename}: {str(e)}")
             return {
                 'success': False,
                 'error': str(e),
                 'filename': filename
             }
 
-class CSSTokenizer(CodeTokenizer):
-    """CSS tokenizer using regex patterns"""
+class HTMLTokenizer(RegexTokenizer):
+    """HTML tokenizer using regex patterns"""
     
-    def __init__(self):
-        self.token_patterns = [
-            ('COMMENT', r'/\*.*?\*/'),
-            ('SELECTOR', r'[a-zA-Z0-9_.-]+(?:\s*,\s*[a-zA-Z0-9_.-]+)*\s*(?=\{)'),
-            ('PROPERTY', r'[a-zA-Z-]+\s*:'),
-            ('VALUE', r':\s*[^;{}]+'),
-            ('BRACE_OPEN', r'\{'),
-            ('BRACE_CLOSE', r'\}'),
-            ('SEMICOLON', r';'),
-            ('AT_RULE', r'@[a-zA-Z-]+'),
-            ('STRING', r'"[^"]*"|\'[^\']*\''),
-            ('NUMBER', r'\b\d+(?:\.\d+)?(?:px|em|rem|%|vh|vw|pt|pc|in|cm|mm)?\b'),
-            ('COLOR', r'#[0-9A-Fa-f]{3,8}'),
-            ('WHITESPACE', r'\s+'),
-        ]
-        
-        self.compiled_patterns = [(name, re.compile(pattern, re.MULTILINE | re.DOTALL)) 
-                                 for name, pattern in self.token_patterns]
+    language = 'HTML'
+
+    # Tags stop at the next '<' so an unclosed tag is rejected without scanning
+    # the rest of the document; text between tags is consumed word by word
+    token_patterns = [
+        ('COMMENT', r'<!--.*?(?:-->|\Z)'),
+        ('DOCTYPE', r'<!DOCTYPE[^<>]*>?'),
+        ('TAG_OPEN', r'<[a-zA-Z][^<>]*>'),
+        ('TAG_CLOSE', r'</[a-zA-Z][^<>]*>'),
+        ('TAG_SELF_CLOSE', r'<[a-zA-Z][^<>]*/\s*>'),
+        ('ATTRIBUTE', r'\b[a-zA-Z-]+\s*=\s*["\'][^"\'<>]*["\']'),
+        ('TEXT', r'[^<\s]+'),
+        ('WHITESPACE', r'\s+'),
+    ]
+
+class CSSTokenizer(RegexTokenizer):
+    """CSS tokenizer using regex patterns"""
     
-    def tokenize(self, content: str, filename: str) -> Dict[str, Any]:
-        try:
-            tokens = []
-            token_types = {}
-            pos = 0
-            
-            while pos < len(content):
-                matched = False
-                
-                for token_type, pattern in self.compiled_patterns:
-                    match = pattern.match(content, pos)
-                    if match:
-                        token_string = match.group(0)
-                        
-                        if token_type != 'WHITESPACE' and token_string.strip():
-                            tokens.append(token_string)
-                            token_types[token_type] = token_types.get(token_type, 0) + 1
-                        
-                        pos = match.end()
-                        matched = True
-                        break
-                
-                if not matched:
-                    pos += 1
-            
-            return {
-                'success': True,
-                'tokens': tokens,
-                'token_types': token_types,
-                'total_tokens': len(tokens),
-                'filename': filename
-            }
-            
-        except Exception as e:
-            logger.error(f"Error tokenizing CSS file {filename}: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'filename': filename
-            }
+    language = 'CSS'
+
+    # Selectors are matched one compound at a time (looking ahead only across
+    # whitespace) and bare words fall through to IDENTIFIER, so long runs
+    # without a '{' are consumed once instead of rescanned per character
+    token_patterns = [
+        ('COMMENT', r'/\*.*?(?:\*/|\Z)'),
+        ('SELECTOR', r'[a-zA-Z0-9_.-]+(?=\s*[{,])'),
+        ('PROPERTY', r'[a-zA-Z-]+\s*:'),
+        ('VALUE', r':\s*[^;{}]+'),
+        ('BRACE_OPEN', r'\{'),
+        ('BRACE_CLOSE', r'\}'),
+        ('SEMICOLON', r';'),
+        ('AT_RULE', r'@[a-zA-Z-]+'),
+        ('STRING', r'"[^"\n]*"?|\'[^\'\n]*\'?'),
+        ('NUMBER', r'\b\d+(?:\.\d+)?(?:px|em|rem|%|vh|vw|pt|pc|in|cm|mm)?\b'),
+        ('COLOR', r'#[0-9A-Fa-f]{3,8}'),
+        ('IDENTIFIER', r'[\w.#-]+'),
+        ('DELIMITER', r'[,>+~*()\[\]=]'),
+        ('WHITESPACE', r'\s+'),
+    ]
 
-class GenericTokenizer(CodeTokenizer):
+class GenericTokenizer(RegexTokenizer):
     """Generic tokenizer for other file types"""
     
-    def tokenize(self, content: str, filename: str) -> Dict[str, Any]:
-        try:
-            tokens = []
-            token_types = {}
-            
-            # Enhanced tokenization patterns
-            patterns = [
-                ('KEYWORD', r'\b(?:if|else|for|while|function|class|def|return|import|export|var|let|const|public|private|static|void|int|string|boolean|true|false|null|undefined)\b'),
-                ('STRING', r'"[^"]*"|\'[^\']*\'|`[^`]*`'),
-                ('NUMBER', r'\b\d+(?:\.\d+)?\b'),
-                ('COMMENT', r'//.*?$|/\*.*?\*/|#.*?$'),
-                ('OPERATOR', r'[+\-*/%=<>!&|^~?:]+'),
-                ('DELIMITER', r'[(){}\[\];,.@]'),
-                ('IDENTIFIER', r'\b[a-zA-Z_]\w*\b'),
-                ('WHITESPACE', r'\s+'),
-            ]
-            
-            compiled_patterns = [(name, re.compile(pattern, re.MULTILINE | re.DOTALL)) 
-                               for name, pattern in patterns]
-            
-            pos = 0
-            
-            while pos < len(content):
-                matched = False
-                
-                for token_type, pattern in compiled_patterns:
-                    match = pattern.match(content, pos)
-                    if match:
-                        token_string = match.group(0)
-                        
-                        if token_type != 'WHITESPACE' and token_string.strip():
-                            tokens.append(token_string)
-                            token_types[token_type] = token_types.get(token_type, 0) + 1
-                        
-                        pos = match.end()
-                        matched = True
-                        break
-                
-                if not matched:
-                    pos += 1
-            
-            return {
-                'success': True,
-                'tokens': tokens,
-                'token_types': token_types,
-                'total_tokens': len(tokens),
-                'filename': filename
-            }
-            
-        except Exception as e:
-            logger.error(f"Error tokenizing file {filename}: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e),
-                'filename': filename
-            }
+    # Enhanced tokenization patterns
+    token_patterns = [
+        ('KEYWORD', r'\b(?:if|else|for|while|function|class|def|return|import|export|var|let|const|public|private|static|void|int|string|boolean|true|false|null|undefined)\b'),
+        ('STRING', r'"[^"\n]*"?|\'[^\'\n]*\'?|`[^`]*`?'),
+        ('NUMBER', r'\b\d+(?:\.\d+)?\b'),
+        ('COMMENT', r'//.*?$|/\*.*?(?:\*/|\Z)|#.*?$'),
+        ('OPERATOR', r'[+\-*/%=<>!&|^~?:]+'),
+        ('DELIMITER', r'[(){}\[\];,.@]'),
+        ('IDENTIFIER', r'\b[a-zA-Z_]\w*\b'),
+        ('WHITESPACE', r'\s+'),
+    ]
 
-def get_tokenizer(file_extension: str) -> CodeTokenizer:
-    """Get appropriate tokenizer based on file extension"""
-    tokenizer_map = {
+class FallbackTokenizer(CodeTokenizer):
+    """Single-pass word/symbol lexer used when a tokenizer exceeds its budget
+
+    One ``finditer`` over a pattern with no alternatives that can overlap,
+    so it is linear in the input regardless of content.
+    """
+
+    TOKEN_PATTERN = re.compile(r'(?P<WORD>\w+)|(?P<SYMBOL>[^\w\s])')
+
+    def tokenize(self, content: str, filename: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        tokens = []
+        kinds = []
+        for match in self.TOKEN_PATTERN.finditer(content):
+            tokens.append(match.group(0))
+            kinds.append(match.lastgroup)
+
+        return {
+            'success': True,
+            'tokens': tokens,
+            'token_types': dict(Counter(kinds)),
+            'total_tokens': len(tokens),
+            'filename': filename
+        }
+
+# Tokenizers hold only compiled patterns, so one instance per extension is
+# shared by every thread; they are built on first use or by warm_up()
+_tokenizers: Dict[str, CodeTokenizer] = {}
+_generic_tokenizer: Optional[CodeTokenizer] = None
+
+def _build_tokenizers() -> Dict[str, CodeTokenizer]:
+    javascript, typescript = JavaScriptTokenizer(), JavaScriptTokenizer(jsx=False)
+    html, css = HTMLTokenizer(), CSSTokenizer()
+    return {
         '.py': PythonTokenizer(),
         '.java': JavaTokenizer(),
-        '.js': JavaScriptTokenizer(),
-        '.jsx': JavaScriptTokenizer(),
-        '.ts': JavaScriptTokenizer(),
-        '.tsx': JavaScriptTokenizer(),
-        '.html': HTMLTokenizer(),
-        '.htm': HTMLTokenizer(),
-        '.css': CSSTokenizer(),
-        '.scss': CSSTokenizer(),
-        '.sass': CSSTokenizer(),
-        '.less': CSSTokenizer(),
+        '.js': javascript,
+        '.jsx': javascript,
+        '.ts': typescript,
+        '.tsx': javascript,
+        '.html': html,
+        '.htm': html,
+        '.css': css,
+        '.scss': css,
+        '.sass': css,
+        '.less': css,
     }
-    
-    return tokenizer_map.get(file_extension.lower(), GenericTokenizer())
\ No newline at end of file
+
+def get_tokenizer(file_extension: str) -> CodeTokenizer:
+    """Get appropriate tokenizer based on file extension"""
+    global _tokenizers, _generic_tokenizer
+    if _generic_tokenizer is None:
+        # Two threads may both build the map; either result is equivalent
+        _tokenizers = _build_tokenizers()
+        _generic_tokenizer = GenericTokenizer()
+    return _tokenizers.get(file_extension.lower(), _generic_tokenizer)
+
+# Tokenized once per tokenizer by warm_up() so lazily compiled state (the
+# standard tokenize module's patterns, regex caches) exists before the first job
+WARM_UP_SAMPLE = 'def f(x):\n    return x + 1  # c\n<a href="/">{{ "s" }}</a> .c { color: red; }\n'
+
+def warm_up():
+    """Build every tokenizer and run each once, ahead of the first file"""
+    get_tokenizer('.py')
+    for tokenizer in set(_tokenizers.values()) | {_generic_tokenizer, FallbackTokenizer()}:
+        try:
+            tokenizer.tokenize(WARM_UP_SAMPLE, 'warm-up')
+        except Exception as e:
+            logger.warning(f"Warming up {type(tokenizer).__name__} failed: {str(e)}")
+
+def time_budget_for(content: str) -> float:
+    """Default watchdog budget in seconds for tokenizing ``content``"""
+    return DEFAULT_TIME_BUDGET + TIME_BUDGET_PER_MB * len(content) / (1024 * 1024)
+
+def tokenize_with_watchdog(tokenizer: CodeTokenizer, content: str, filename: str,
+                           budget: Optional[float] = None) -> Dict[str, Any]:
+    """Tokenize under a time budget, falling back to FallbackTokenizer on overrun
+
+    The result of a fallback run carries ``'fallback': True``.
+    """
+    if budget is None:
+        budget = time_budget_for(content)
+
+    try:
+        return tokenizer.tokenize(content, filename, deadline=time.monotonic() + budget)
+    except TokenizationTimeout:
+        logger.warning(f"Tokenizing {filename} took over {budget:.1f}s, using fallback lexer")
+        result = FallbackTokenizer().tokenize(content, filename)
+        result['fallback'] = True
+        return result
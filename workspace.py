@@ -0,0 +1,352 @@
+import os
+import time
+import uuid
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Any, Optional
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock, a workspace's owner is judged live from its pid alone
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# tmpfs is only used when it has at least this much free space
+MIN_TMPFS_BYTES = 1024 * 1024 * 1024
+
+# Scratch space one job may use by default
+DEFAULT_JOB_QUOTA = 2 * 1024 * 1024 * 1024
+
+# Share of the scratch filesystem's free space used as the default global quota
+DEFAULT_TOTAL_SHARE = 0.5
+
+# Bytes always left free on the scratch filesystem, whatever the quotas say
+MIN_FREE_BYTES = 256 * 1024 * 1024
+
+# Reserved for a new workspace before anything is written, so a burst of
+# jobs queues for space instead of all starting at once
+INITIAL_RESERVE = 64 * 1024 * 1024
+
+# How long a job waits for other jobs' scratch space to be freed
+DEFAULT_WAIT_SECONDS = 60
+
+# How often a running command's workspace is measured against the quotas
+POLL_SECONDS = 0.25
+
+# Workspace directories are named <prefix><owner>-<id>; deleted ones are
+# renamed to <trash prefix><owner>-<id> until the reaper removes them. The
+# owner is <pid>_<random id> of the manager, which holds an flock on
+# <owner prefix><owner>.lock for as long as its process lives, so a reused
+# pid doesn't keep a dead process's directories alive
+WORKSPACE_PREFIX = 'job-'
+TRASH_PREFIX = 'trash-'
+OWNER_PREFIX = 'owner-'
+
+class WorkspaceError(Exception):
+    """A job would exceed its own or the global scratch quota"""
+
+def filesystem_type(path: str) -> Optional[str]:
+    """Type of the filesystem ``path`` is on, from /proc/mounts"""
+    path = os.path.realpath(path)
+    best, best_type = '', None
+    try:
+        with open('/proc/mounts', 'r') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                mount_point = fields[1]
+                inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+                if inside and len(mount_point) > len(best):
+                    best, best_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return best_type
+
+def default_root(fallback: Optional[str] = None, tmpfs: str = '/dev/shm') -> str:
+    """A scratch directory on tmpfs if one with room is mounted, else on disk"""
+    if os.path.isdir(tmpfs) and filesystem_type(tmpfs) == 'tmpfs' and os.access(tmpfs, os.W_OK):
+        stats = os.statvfs(tmpfs)
+        if stats.f_bavail * stats.f_frsize >= MIN_TMPFS_BYTES:
+            return os.path.join(tmpfs, 'fileextractor-scratch')
+    return os.path.abspath(fallback or os.path.join(tempfile.gettempdir(), 'fileextractor-scratch'))
+
+def disk_usage(path: str) -> int:
+    """Bytes allocated to a directory tree, from block counts"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        total += entry.stat(follow_symlinks=False).st_blocks * 512
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class Workspace:
+    """A job's scratch directory and the bytes reserved for it"""
+
+    def __init__(self, manager: 'WorkspaceManager', path: str, label: str):
+        self.manager = manager
+        self.path = path
+        self.label = label
+        self.reserved = 0
+        self.released = False
+
+    def reserve(self, size: int, wait: bool = True):
+        """Make sure ``size`` bytes are reserved; raises WorkspaceError if they don't fit"""
+        self.manager._reserve(self, size, wait)
+
+    def run(self, args: List[str], timeout: float,
+            cancelled: Optional[threading.Event] = None) -> subprocess.CompletedProcess:
+        """Run a command that writes into the workspace, killing it if it outgrows the quotas
+
+        Raises subprocess.TimeoutExpired after ``timeout`` seconds, and
+        WorkspaceError if ``cancelled`` is set while the command runs.
+        """
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        waited = 0.0
+        try:
+            while True:
+                try:
+                    stdout, stderr = process.communicate(timeout=POLL_SECONDS)
+                    break
+                except subprocess.TimeoutExpired:
+                    waited += POLL_SECONDS
+                    if waited >= timeout:
+                        raise
+                    if cancelled is not None and cancelled.is_set():
+                        raise WorkspaceError(f"Cancelled: {' '.join(args[:2])}")
+                    # Growing past a quota mid-command can't wait for space
+                    self.reserve(disk_usage(self.path), wait=False)
+        except BaseException:
+            process.kill()
+            process.communicate()
+            raise
+        return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+    def release(self):
+        """Hand the directory to the reaper; its reservation ends once it is deleted"""
+        self.manager._release(self)
+
+class WorkspaceManager:
+    """Allocate job scratch directories under one root with byte quotas
+
+    Each workspace reserves the bytes it expects to use, or has been
+    measured using, and a reservation that would take it past
+    ``job_quota`` or the total past ``total_quota`` fails, after waiting up
+    to ``wait_seconds`` for other workspaces to be deleted when the job can
+    wait. Released workspaces are renamed aside and deleted by a background
+    reaper thread, so a large tree is never removed on a job's thread.
+    Workspaces left behind by processes that have exited, whose owner lock
+    is no longer held, are reaped when a manager starts.
+    """
+
+    def __init__(self, root: Optional[str] = None, job_quota: int = DEFAULT_JOB_QUOTA,
+                 total_quota: Optional[int] = None, wait_seconds: float = DEFAULT_WAIT_SECONDS):
+        self.root = os.path.abspath(root or default_root())
+        os.makedirs(self.root, exist_ok=True)
+        self.tmpfs = filesystem_type(self.root) == 'tmpfs'
+        self.job_quota = job_quota
+        if total_quota is None:
+            stats = os.statvfs(self.root)
+            total_quota = int(stats.f_bavail * stats.f_frsize * DEFAULT_TOTAL_SHARE)
+        self.total_quota = total_quota
+        self.wait_seconds = wait_seconds
+
+        self._cond = threading.Condition()
+        self._workspaces: Dict[str, Workspace] = {}
+        self._reserved = 0
+        self._trash = queue.Queue()
+        self._pending = 0
+        self._reaper = None
+        self.reaped = 0
+        self.owner, self._owner_lock = self._hold_owner_lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+        self._reap_orphans()
+
+    def allocate(self, label: str = '', reserve: int = INITIAL_RESERVE) -> Workspace:
+        """Create a workspace directory, reserving ``reserve`` bytes for it"""
+        name = f"{WORKSPACE_PREFIX}{self.owner}-{uuid.uuid4().hex[:12]}"
+        path = os.path.join(self.root, name)
+        workspace = Workspace(self, path, label)
+        with self._cond:
+            self._workspaces[path] = workspace
+        try:
+            workspace.reserve(min(reserve, self.job_quota))
+            os.mkdir(path)
+        except BaseException:
+            with self._cond:
+                self._forget(workspace)
+            raise
+        return workspace
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'root': self.root,
+                'tmpfs': self.tmpfs,
+                'job_quota': self.job_quota,
+                'total_quota': self.total_quota,
+                'reserved': self._reserved,
+                'workspaces': sum(1 for workspace in self._workspaces.values() if not workspace.released),
+                'pending_deletes': self._pending,
+                'reaped': self.reaped
+            }
+
+    def _reserve(self, workspace: Workspace, size: int, wait: bool):
+        if size > self.job_quota:
+            raise WorkspaceError(
+                f"Needs {size / 1048576:.0f} MB of scratch space; the limit per job is {self.job_quota / 1048576:.0f} MB")
+
+        with self._cond:
+            growth = size - workspace.reserved
+            if growth <= 0:
+                return
+            deadline = time.monotonic() + self.wait_seconds
+            while not self._fits(growth):
+                remaining = deadline - time.monotonic()
+                if not wait or remaining <= 0:
+                    raise WorkspaceError("Scratch space is full; please try again later")
+                # Re-checked every second, since other processes free space without notifying us
+                self._cond.wait(min(remaining, 1.0))
+            workspace.reserved += growth
+            self._reserved += growth
+
+    def _fits(self, growth: int) -> bool:
+        if self._reserved + growth > self.total_quota:
+            return False
+        # Other processes share the filesystem, so check what is really free too
+        stats = os.statvfs(self.root)
+        return stats.f_bavail * stats.f_frsize - growth >= MIN_FREE_BYTES
+
+    def _release(self, workspace: Workspace):
+        with self._cond:
+            if workspace.released:
+                return
+            workspace.released = True
+
+        trash = os.path.join(self.root, TRASH_PREFIX + os.path.basename(workspace.path)[len(WORKSPACE_PREFIX):])
+        try:
+            # A rename is instant, so the job's thread never waits on the delete
+            os.rename(workspace.path, trash)
+        except FileNotFoundError:
+            with self._cond:
+                self._forget(workspace)
+                self._cond.notify_all()
+            return
+        except OSError:
+            trash = workspace.path
+        self._enqueue(trash, workspace)
+
+    def _enqueue(self, path: str, workspace: Optional[Workspace]):
+        with self._cond:
+            self._pending += 1
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name='workspace-reaper', daemon=True)
+                self._reaper.start()
+        self._trash.put((path, workspace))
+
+    def _reap(self):
+        while True:
+            path, workspace = self._trash.get()
+            shutil.rmtree(path, ignore_errors=True)
+            with self._cond:
+                self._pending -= 1
+                self.reaped += 1
+                if workspace is not None:
+                    self._forget(workspace)
+                self._cond.notify_all()
+
+    def _forget(self, workspace: Workspace):
+        if self._workspaces.pop(workspace.path, None) is not None:
+            self._reserved -= workspace.reserved
+
+    def _hold_owner_lock(self):
+        """A new owner id and the descriptor of its held lock file (None without flock)"""
+        owner = f"{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        if fcntl is None:
+            return owner, None
+        fd = os.open(os.path.join(self.root, f"{OWNER_PREFIX}{owner}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return owner, fd
+
+    def _owner_alive(self, owner: str) -> bool:
+        if owner == self.owner:
+            return True
+        if fcntl is not None and '_' in owner:
+            try:
+                fd = os.open(os.path.join(self.root, f"{OWNER_PREFIX}{owner}.lock"), os.O_RDWR)
+            except FileNotFoundError:
+                return False
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            finally:
+                os.close(fd)
+            return False
+        # Directories named before owner locks, or where there is no flock
+        pid = owner.split('_', 1)[0]
+        return pid.isdigit() and pid_alive(int(pid))
+
+    def _reap_orphans(self):
+        """Queue workspaces whose owner has exited, and unfinished deletes, for the reaper"""
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(OWNER_PREFIX) and name.endswith('.lock'):
+                if not self._owner_alive(name[len(OWNER_PREFIX):-len('.lock')]):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                continue
+            if name.startswith(TRASH_PREFIX):
+                owner = name[len(TRASH_PREFIX):].split('-', 1)[0]
+            elif name.startswith(WORKSPACE_PREFIX):
+                owner = name[len(WORKSPACE_PREFIX):].split('-', 1)[0]
+            else:
+                continue
+            if not self._owner_alive(owner):
+                logger.info(f"Removing orphaned scratch directory {path}")
+                self._enqueue(path, None)
+
+    def _after_fork(self):
+        # A forked child (a preloaded gunicorn worker) has no reaper thread and
+        # may have inherited a held lock; the parent still deletes what it queued.
+        # The child takes its own owner id; closing the inherited lock
+        # descriptor leaves the parent's lock held
+        self._cond = threading.Condition()
+        self._trash = queue.Queue()
+        self._pending = 0
+        self._reaper = None
+        if self._owner_lock is not None:
+            os.close(self._owner_lock)
+        self.owner, self._owner_lock = self._hold_owner_lock()
+
+    def wait_for_reaper(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every released workspace has been deleted"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)